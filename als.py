@@ -0,0 +1,350 @@
+"""
+Factorizare matriceală pentru feedback implicit (ALS), antrenată offline
+Citește istoricul interacțiunilor din users_data.json, antrenează factorii latenți ai
+utilizatorilor și pieselor cu NumPy și îi salvează ca fișiere .npy, încărcate apoi
+memory-mapped (doar citire) de SpotifyRecommendationSystem.als_recommend: scorul tuturor
+pieselor pentru un utilizator este un singur produs matrice-vector.
+
+Modelul (Hu, Koren, Volinsky - "Collaborative Filtering for Implicit Feedback Datasets"):
+    r[u, i] = suma ponderilor interacțiunilor (like, ascultări, ... ; dislike negativ)
+    p[u, i] = 1 dacă r[u, i] > 0, altfel 0
+    c[u, i] = 1 + alpha * |r[u, i]|
+    minimizează  sum c[u, i] * (p[u, i] - x_u . y_i)^2 + reg * (|X|^2 + |Y|^2)
+
+Rulare:
+    python als.py train --users users_data.json --out .als_factors
+    python als.py benchmark --users-scale 1000,10000,50000
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Versiunea formatului fișierelor de factori
+FACTORS_FORMAT_VERSION = 1
+
+# Directorul implicit al factorilor antrenați
+DEFAULT_FACTORS_DIR = '.als_factors'
+
+# Ponderea fiecărui tip de interacțiune în r[u, i] (ascultările repetate se adună)
+INTERACTION_WEIGHTS = {
+    'like': 1.0,
+    'playlist_add': 0.8,
+    'bookmark': 0.6,
+    'listen': 0.3,
+    'skip': -0.3,
+    'dislike': -1.0
+}
+
+# Hiperparametrii impliciți
+DEFAULT_FACTORS = 32
+DEFAULT_ITERATIONS = 15
+DEFAULT_REGULARIZATION = 0.1
+DEFAULT_ALPHA = 20.0
+
+# Mărimea unui bloc de rânduri rezolvate deodată: cel mult CHUNK_ROWS rânduri (sistemele au
+# rânduri x factori² valori) și cel mult CHUNK_PAIRS perechi observate (factorii lor copiați)
+CHUNK_ROWS = 4096
+CHUNK_PAIRS = 262144
+
+
+def interaction_matrix(users: Dict[str, Dict],
+                       weights: Optional[Dict[str, float]] = None) -> Tuple[List[str], List[str], np.ndarray,
+                                                                           np.ndarray, np.ndarray]:
+    """
+    Transformă înregistrările utilizatorilor în matricea rară r (format coordonate)
+    Returnează (user_ids, track_ids, rânduri, coloane, valori), fără valorile nule
+
+    liked_tracks / disliked_tracks fixează r la cel puțin ponderea unui like, respectiv la
+    cel mult ponderea unui dislike, chiar dacă interacțiunea a ieșit din istoricul păstrat
+    """
+    weights = weights or INTERACTION_WEIGHTS
+    user_ids: List[str] = []
+    track_index: Dict[str, int] = {}
+    rows, cols, values = [], [], []
+
+    for user_id, user_data in users.items():
+        ratings: Dict[str, float] = {}
+        for interaction in user_data.get('interactions', []):
+            track_id = interaction.get('track_id')
+            weight = weights.get(interaction.get('type'), 0.0)
+            if track_id and weight:
+                ratings[track_id] = ratings.get(track_id, 0.0) + weight
+        for track_id in user_data.get('liked_tracks', []):
+            ratings[track_id] = max(ratings.get(track_id, 0.0), weights.get('like', 1.0))
+        for track_id in user_data.get('disliked_tracks', []):
+            ratings[track_id] = min(ratings.get(track_id, 0.0), weights.get('dislike', -1.0))
+
+        ratings = {track_id: value for track_id, value in ratings.items() if value}
+        if not ratings:
+            continue
+        row = len(user_ids)
+        user_ids.append(user_id)
+        for track_id, value in ratings.items():
+            rows.append(row)
+            cols.append(track_index.setdefault(track_id, len(track_index)))
+            values.append(value)
+
+    return (user_ids, list(track_index), np.asarray(rows, dtype=np.int64),
+            np.asarray(cols, dtype=np.int64), np.asarray(values, dtype=np.float64))
+
+
+def _least_squares(rows: np.ndarray, cols: np.ndarray, confidence: np.ndarray, preference: np.ndarray,
+                   row_count: int, fixed: np.ndarray, regularization: float) -> np.ndarray:
+    """
+    Un pas ALS: rezolvă exact factorii tuturor rândurilor, cu factorii `fixed` ai coloanelor
+
+    Pentru rândul u:  (YᵀY + Yᵤᵀ (Cᵤ - I) Yᵤ + reg·I) xᵤ = Yᵤᵀ Cᵤ pᵤ
+    YᵀY este comun tuturor rândurilor; termenul de corecție folosește doar perechile observate
+    (un produs BLAS per rând), iar sistemele unui bloc de rânduri sunt rezolvate într-un singur apel.
+    """
+    factors = fixed.shape[1]
+    result = np.zeros((row_count, factors))
+    if len(rows) == 0:
+        return result
+
+    order = np.argsort(rows, kind='stable')
+    rows, cols = rows[order], cols[order]
+    extra = confidence[order] - 1.0
+    target = confidence[order] * preference[order]
+
+    base = fixed.T @ fixed + regularization * np.eye(factors)
+    present, starts = np.unique(rows, return_index=True)
+    ends = np.append(starts[1:], len(rows))
+
+    first = 0
+    while first < len(present):
+        # Un rând cu mai multe perechi decât CHUNK_PAIRS formează singur un bloc
+        last = int(np.searchsorted(ends, starts[first] + CHUNK_PAIRS, side='right'))
+        last = min(max(last, first + 1), first + CHUNK_ROWS)
+        block = slice(first, last)
+        block_starts, block_ends = starts[block], ends[block]
+        segment = slice(block_starts[0], block_ends[-1])
+        observed = fixed[cols[segment]]
+        weighted = observed * extra[segment, None]
+        local_starts = block_starts - block_starts[0]
+
+        systems = np.empty((len(block_starts), factors, factors))
+        for position, (start, end) in enumerate(zip(local_starts, block_ends - block_starts[0])):
+            np.matmul(weighted[start:end].T, observed[start:end], out=systems[position])
+        systems += base
+        rhs = np.add.reduceat(observed * target[segment, None], local_starts, axis=0)
+        result[present[block]] = np.linalg.solve(systems, rhs[..., None])[..., 0]
+        first = last
+
+    return result
+
+
+def train(rows: np.ndarray, cols: np.ndarray, values: np.ndarray, user_count: int, item_count: int,
+          factors: int = DEFAULT_FACTORS, iterations: int = DEFAULT_ITERATIONS,
+          regularization: float = DEFAULT_REGULARIZATION, alpha: float = DEFAULT_ALPHA,
+          seed: int = 0, verbose: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """Antrenează factorii (user_factors, item_factors) prin pași alternanți de cele mai mici pătrate"""
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(scale=0.01, size=(user_count, factors))
+    item_factors = rng.normal(scale=0.01, size=(item_count, factors))
+    confidence = 1.0 + alpha * np.abs(values)
+    preference = (values > 0).astype(np.float64)
+
+    for iteration in range(iterations):
+        started = time.perf_counter()
+        user_factors = _least_squares(rows, cols, confidence, preference, user_count,
+                                      item_factors, regularization)
+        item_factors = _least_squares(cols, rows, confidence, preference, item_count,
+                                      user_factors, regularization)
+        if verbose:
+            print(f"  iterația {iteration + 1}/{iterations}: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    return user_factors, item_factors
+
+
+def save_factors(out_dir: str, user_ids: List[str], track_ids: List[str],
+                 user_factors: np.ndarray, item_factors: np.ndarray, params: Dict):
+    """Salvează factorii ca fișiere .npy (scriere într-un director temporar, apoi redenumire)"""
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    tmp_dir = tempfile.mkdtemp(prefix='.als_tmp_', dir=parent)
+    try:
+        np.save(os.path.join(tmp_dir, 'user_factors.npy'), user_factors.astype(np.float32))
+        np.save(os.path.join(tmp_dir, 'item_factors.npy'), item_factors.astype(np.float32))
+        np.save(os.path.join(tmp_dir, 'user_ids.npy'), np.asarray(user_ids, dtype=str))
+        np.save(os.path.join(tmp_dir, 'track_ids.npy'), np.asarray(track_ids, dtype=str))
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'format_version': FACTORS_FORMAT_VERSION,
+                'trained_at': datetime.now().isoformat(),
+                'users': len(user_ids),
+                'tracks': len(track_ids),
+                **params
+            }, f, ensure_ascii=False)
+
+        if os.path.isdir(out_dir):
+            shutil.rmtree(out_dir)
+        os.replace(tmp_dir, out_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+class ALSFactors:
+    """Factorii antrenați, încărcați memory-mapped (doar citire)"""
+
+    def __init__(self, user_ids: np.ndarray, track_ids: np.ndarray,
+                 user_factors: np.ndarray, item_factors: np.ndarray, meta: Dict):
+        self.user_ids = user_ids
+        self.track_ids = track_ids
+        self.user_factors = user_factors    # (U, k)
+        self.item_factors = item_factors    # (I, k)
+        self.meta = meta
+        self.user_row: Dict[str, int] = {user_id: row for row, user_id in enumerate(user_ids.tolist())}
+        self.item_row: Dict[str, int] = {track_id: row for row, track_id in enumerate(track_ids.tolist())}
+
+    @classmethod
+    def load(cls, factors_dir: str = DEFAULT_FACTORS_DIR) -> Optional['ALSFactors']:
+        """Încarcă factorii, sau None dacă lipsesc ori au alt format"""
+        meta_file = os.path.join(factors_dir, 'meta.json')
+        if not os.path.exists(meta_file):
+            return None
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('format_version') != FACTORS_FORMAT_VERSION:
+                return None
+
+            def load(name):
+                return np.load(os.path.join(factors_dir, name), mmap_mode='r')
+
+            meta['mtime_ns'] = os.stat(meta_file).st_mtime_ns
+            return cls(load('user_ids.npy'), load('track_ids.npy'),
+                       load('user_factors.npy'), load('item_factors.npy'), meta)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Factorii ALS din {factors_dir} nu pot fi folosiți: {e}")
+            return None
+
+    def scores(self, user_id: str) -> Optional[np.ndarray]:
+        """Scorurile tuturor pieselor pentru utilizator (un produs matrice-vector), sau None"""
+        row = self.user_row.get(user_id)
+        if row is None:
+            return None
+        return self.item_factors @ self.user_factors[row]
+
+
+# ==================== LINIE DE COMANDĂ ====================
+
+def train_from_file(users_file: str, out_dir: str, factors: int, iterations: int,
+                    regularization: float, alpha: float):
+    with open(users_file, 'r', encoding='utf-8') as f:
+        users = json.load(f)
+
+    started = time.perf_counter()
+    user_ids, track_ids, rows, cols, values = interaction_matrix(users)
+    print(f"📊 Matricea de interacțiuni: {len(user_ids)} utilizatori x {len(track_ids)} piese, "
+          f"{len(values)} valori ({(time.perf_counter() - started) * 1000:.0f} ms)")
+    if not len(values):
+        print("Nu există interacțiuni de antrenat")
+        return
+
+    started = time.perf_counter()
+    user_factors, item_factors = train(rows, cols, values, len(user_ids), len(track_ids),
+                                       factors=factors, iterations=iterations,
+                                       regularization=regularization, alpha=alpha)
+    print(f"✅ Antrenare în {time.perf_counter() - started:.2f} s")
+
+    save_factors(out_dir, user_ids, track_ids, user_factors, item_factors, {
+        'source': os.path.abspath(users_file),
+        'factors': factors,
+        'iterations': iterations,
+        'regularization': regularization,
+        'alpha': alpha,
+        'interaction_weights': INTERACTION_WEIGHTS
+    })
+    print(f"💾 Factori salvați în {out_dir}")
+
+
+def _synthetic_interactions(user_count: int, item_count: int, per_user: int,
+                            rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Interacțiuni sintetice cu popularitate Zipf (puține piese foarte ascultate, coadă lungă)"""
+    popularity = 1.0 / np.arange(1, item_count + 1)
+    popularity /= popularity.sum()
+    rows = np.repeat(np.arange(user_count), per_user)
+    cols = rng.choice(item_count, size=user_count * per_user, p=popularity)
+    kinds = np.array(list(INTERACTION_WEIGHTS.values()))
+    values = kinds[rng.integers(0, len(kinds), size=len(rows))]
+    # Perechile duplicate se adună, ca în interaction_matrix
+    keys, inverse = np.unique(rows * item_count + cols, return_inverse=True)
+    summed = np.bincount(inverse, weights=values)
+    keep = summed != 0
+    return keys[keep] // item_count, keys[keep] % item_count, summed[keep]
+
+
+def benchmark(user_scales: List[int], item_count: int, per_user: int, factors: int,
+              iterations: int, serving_requests: int = 1000, top_k: int = 10):
+    """Timpul de antrenare, memoria de vârf și latența de servire pe date sintetice de mărimi crescătoare"""
+    rng = np.random.default_rng(0)
+    print(f"{'utilizatori':>11} {'valori':>9} {'antrenare':>10} {'/iterație':>10} {'memorie':>9} "
+          f"{'factori':>9} {'servire p50':>12} {'servire p99':>12}")
+    for user_count in user_scales:
+        rows, cols, values = _synthetic_interactions(user_count, item_count, per_user, rng)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        user_factors, item_factors = train(rows, cols, values, user_count, item_count,
+                                           factors=factors, iterations=iterations, verbose=False)
+        train_seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        user_factors = user_factors.astype(np.float32)
+        item_factors = item_factors.astype(np.float32)
+        factor_bytes = user_factors.nbytes + item_factors.nbytes
+        latencies = []
+        for row in rng.integers(0, user_count, size=serving_requests):
+            started = time.perf_counter()
+            scores = item_factors @ user_factors[row]
+            top = np.argpartition(-scores, top_k)[:top_k]
+            top[np.argsort(-scores[top])]
+            latencies.append(time.perf_counter() - started)
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+
+        print(f"{user_count:>11} {len(values):>9} {train_seconds:>9.2f}s "
+              f"{train_seconds / iterations * 1000:>8.0f}ms {peak / 2 ** 20:>7.1f}MB "
+              f"{factor_bytes / 2 ** 20:>7.1f}MB {p50:>10.1f}µs {p99:>10.1f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Antrenarea offline a factorilor ALS (feedback implicit)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = commands.add_parser('train', help='Antrenează factorii din users_data.json')
+    train_parser.add_argument('--users', default='users_data.json')
+    train_parser.add_argument('--out', default=DEFAULT_FACTORS_DIR)
+
+    bench_parser = commands.add_parser('benchmark', help='Măsoară antrenarea și servirea pe date sintetice')
+    bench_parser.add_argument('--users-scale', default='1000,10000,50000',
+                              help='Numerele de utilizatori, separate prin virgulă')
+    bench_parser.add_argument('--items', type=int, default=1000)
+    bench_parser.add_argument('--per-user', type=int, default=30, help='Interacțiuni per utilizator')
+
+    for sub in (train_parser, bench_parser):
+        sub.add_argument('--factors', type=int, default=DEFAULT_FACTORS)
+        sub.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    train_parser.add_argument('--regularization', type=float, default=DEFAULT_REGULARIZATION)
+    train_parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA)
+
+    args = parser.parse_args()
+    if args.command == 'train':
+        train_from_file(args.users, args.out, args.factors, args.iterations, args.regularization, args.alpha)
+    else:
+        scales = [int(value) for value in args.users_scale.split(',') if value.strip()]
+        benchmark(scales, args.items, args.per_user, args.factors, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
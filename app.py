@@ -3,11 +3,20 @@ Interfață Web Demo pentru Sistemul de Recomandare
 Flask Application
 """
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from recommendation_system import SpotifyRecommendationSystem
-from user_storage import UserStorage
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, make_response, g
+from user_storage import UserStorage, get_recommendation_type, DURABILITY_GROUP
+from metrics import registry as metrics_registry
+from startup import LazyService, WarmUp, report as startup_report
+import tracing
 import os
+import gc
 import secrets
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import wraps
+from itertools import islice
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)  # Pentru sesiuni
@@ -34,18 +43,216 @@ except ImportError:
     if recombee_db:
         print(f"✓ Configurație Recombee din variabile de mediu: Database ID = {recombee_db}")
 
-# Inițializează sistemul de recomandare
-# Dacă Recombee este configurat, îl folosește; altfel folosește implementarea locală
-system = SpotifyRecommendationSystem(
-    'spotify_dataset.csv',
-    recombee_db=recombee_db,
-    recombee_private_token=recombee_private_token,
-    recombee_public_token=recombee_public_token,
-    recombee_region=recombee_region
-)
+# Modul de inițializare a componentelor scumpe (catalog, client Recombee, stocarea utilizatorilor):
+#   lazy   - la prima cerere care le folosește (implicit)
+#   warmup - într-un fir de fundal pornit la import; /api/health/ready răspunde 503 până termină
+#   eager  - la import (pentru servere pre-fork cu aplicația încărcată în master, ex. gunicorn --preload)
+APP_INIT_MODE = os.getenv('APP_INIT_MODE', 'lazy').lower()
+
+# Durabilitatea salvării datelor utilizatorilor:
+#   fsync       - scriere sincronă + fsync la fiecare modificare
+#   group       - modificările sunt scrise grupat, cel mult o dată la USER_STORAGE_FLUSH_INTERVAL_MS (implicit)
+#   best_effort - scrieri grupate, fără fsync
+USER_STORAGE_DURABILITY = os.getenv('USER_STORAGE_DURABILITY', DURABILITY_GROUP).lower()
+USER_STORAGE_FLUSH_INTERVAL_MS = int(os.getenv('USER_STORAGE_FLUSH_INTERVAL_MS', '200'))
+
+def _create_system():
+    # Importul aduce SDK-ul Recombee și NumPy, deci este amânat până la prima utilizare
+    started = time.perf_counter()
+    from recommendation_system import SpotifyRecommendationSystem
+    startup_report.record('import_recommendation_system', time.perf_counter() - started)
+    
+    # Dacă Recombee este configurat, îl folosește; altfel folosește implementarea locală
+    instance = SpotifyRecommendationSystem(
+        'spotify_dataset.csv',
+        recombee_db=recombee_db,
+        recombee_private_token=recombee_private_token,
+        recombee_public_token=recombee_public_token,
+        recombee_region=recombee_region
+    )
+    # Profilurile de gust ale utilizatorilor (proxy leneș, nu încarcă stocarea acum)
+    instance.user_storage = user_storage
+    return instance
+
+def _create_user_storage():
+    # Referința către sistem rămâne leneșă: încărcarea utilizatorilor nu încarcă și catalogul
+    return UserStorage(recommendation_system=system, durability=USER_STORAGE_DURABILITY,
+                       flush_interval_ms=USER_STORAGE_FLUSH_INTERVAL_MS)
+
+# Inițializează sistemul de recomandare (catalogul) și stocarea utilizatorilor la prima utilizare
+system = LazyService('dataset_load', _create_system)
+user_storage = LazyService('user_store_load', _create_user_storage)
+
+warm_up = None
+if APP_INIT_MODE == 'eager':
+    user_storage.get()
+    system.get()
+    system.recombee_client
+    user_storage.cooccurrence
+    # Sub un server pre-fork cu aplicația încărcată în master (ex. gunicorn --preload),
+    # obiectele create până aici sunt mutate în generația permanentă a GC-ului,
+    # ca workerii să nu le mai atingă (și copieze) paginile la fiecare colectare
+    gc.freeze()
+elif APP_INIT_MODE == 'warmup':
+    warm_up = WarmUp([user_storage, system], warmers=[
+        lambda: system.recombee_client,
+        lambda: user_storage.cooccurrence
+    ]).start()
+
+# ==================== HTTP CACHING ====================
+
+# Politici Cache-Control pentru endpoint-urile care se citesc des și se schimbă rar
+CACHE_PUBLIC = 'public, max-age=300'   # Date de catalog, identice pentru toți utilizatorii
+CACHE_PRIVATE = 'private, no-cache'    # Date per utilizator: revalidate la fiecare cerere (304)
+
+def http_cached(etag_func, cache_control: str):
+    """
+    Adaugă ETag și Cache-Control la un endpoint JSON și răspunde cu 304 la cererile
+    condiționale (If-None-Match) fără a mai executa endpoint-ul
+    
+    etag_func primește aceleași argumente ca endpoint-ul și returnează validatorul
+    (construit din contoare de versiune, deci ieftin de calculat)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = etag_func(*args, **kwargs)
+            if etag and request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            if etag:
+                response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
+
+# ==================== METRICI ====================
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    """Latența și codul de stare per rută (șablonul rutei, nu URL-ul concret)"""
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        metrics_registry.record_request(route, request.method, response.status_code,
+                                        time.perf_counter() - started)
+    return response
+
+# ==================== TRASARE ====================
+
+@app.before_request
+def _start_trace():
+    """Trasează cererea dacă este cerut explicit (X-Debug-Trace / ?debug=trace) sau eșantionată"""
+    debug = request.headers.get('X-Debug-Trace') == '1' or request.args.get('debug') == 'trace'
+    sampled = tracing.should_sample()
+    if debug or sampled:
+        g.trace = tracing.start_trace(f'{request.method} {request.path}', sampled=sampled)
+        g.trace_debug = debug
+
+@app.after_request
+def _finish_trace(response):
+    trace = g.pop('trace', None)
+    if trace is not None:
+        trace.finish()
+        if g.get('trace_debug'):
+            response.headers['Server-Timing'] = trace.server_timing()
+            response.headers['X-Trace-Id'] = trace.trace_id
+        if trace.sampled:
+            trace.write()
+    return response
+
+@app.teardown_request
+def _discard_trace(exc):
+    # Cererea s-a terminat cu excepție înainte de after_request
+    trace = g.pop('trace', None)
+    if trace is not None:
+        trace.finish()
+
+# ==================== HEALTH ====================
+
+def _components_status():
+    return {
+        'dataset': system.initialized,
+        'user_store': user_storage.initialized
+    }
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Liveness: răspunde imediat, fără a inițializa componentele; include raportul de pornire"""
+    return jsonify({
+        'status': 'ok',
+        'init_mode': APP_INIT_MODE,
+        'components': _components_status(),
+        'startup': startup_report.as_dict()
+    })
+
+@app.route('/api/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness: în modul warmup răspunde 503 până când firul de încălzire a terminat"""
+    if warm_up is not None and not warm_up.done.is_set():
+        return jsonify({'ready': False, 'status': 'warming_up', 'components': _components_status()}), 503
+    if warm_up is not None and warm_up.errors:
+        return jsonify({'ready': False, 'status': 'error', 'errors': warm_up.errors}), 503
+    return jsonify({'ready': True, 'components': _components_status()})
+
+# ==================== BOOTSTRAP ====================
+
+# Termenul comun pentru toate apelurile paralele ale unui bootstrap
+BOOTSTRAP_DEADLINE_SECONDS = 2.5
+BOOTSTRAP_PAGE_SIZE = 10
+ANONYMOUS_USER_ID = 'test_user_anonymous'
+
+# Pool partajat pentru apelurile independente către Recombee (firele pornesc la prima cerere)
+fanout_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='fanout')
+
+def _user_stats_payload(user_id, user_profile):
+    """Corpul răspunsului /api/user/<id>/stats"""
+    return {
+        'stats': user_storage.get_user_stats(user_id),
+        'preferred_genres': user_profile.get('preferred_genres', []),
+        'preferred_artists': user_profile.get('preferred_artists', []),
+        'total_interactions': user_profile.get('stats', {}).get('total_interactions', len(user_profile.get('interactions', []))),
+        'liked_tracks_count': len(user_profile.get('liked_tracks', []))
+    }
+
+def _recommendation_source_label(liked_tracks_count):
+    """Eticheta pusă de endpoint-ul pe care pagina l-ar fi ales după numărul de aprecieri"""
+    if get_recommendation_type(liked_tracks_count) == 'mixed':
+        return 'Recombee recommendations (learning)'
+    return 'Recombee recommendations'
+
+def _run_with_deadline(tasks, deadline):
+    """
+    Rulează în paralel funcțiile din `tasks` (nume -> callable) și așteaptă cel mult până la
+    `deadline` (time.monotonic()); returnează (rezultate, nume expirate, erori)
+    """
+    futures = {name: fanout_executor.submit(func) for name, func in tasks.items()}
+    wait(futures.values(), timeout=max(0.0, deadline - time.monotonic()))
+    
+    results, timed_out, errors = {}, [], {}
+    for name, future in futures.items():
+        if not future.done():
+            # Apelurile deja pornite se termină în fundal; rezultatul lor este ignorat
+            future.cancel()
+            timed_out.append(name)
+        elif future.exception() is not None:
+            errors[name] = str(future.exception())
+        else:
+            results[name] = future.result()
+    return results, timed_out, errors
 
-# Inițializează stocarea utilizatorilor cu referință la sistemul de recomandări
-user_storage = UserStorage(recommendation_system=system)
+def _dataset_examples_include():
+    """Statisticile suplimentare cerute prin ?include=... la /api/dataset-examples"""
+    return [name.strip() for name in request.args.get('include', '').split(',') if name.strip()]
 
 @app.route('/')
 def index():
@@ -96,10 +303,11 @@ def user_profile():
     return render_template('user_profile.html')
 
 @app.route('/api/tracks', methods=['GET'])
+@http_cached(lambda: system.catalog_etag, CACHE_PUBLIC)
 def get_tracks():
     """Returnează lista de piese pentru selectare"""
     tracks = []
-    for track_id, track in list(system.tracks.items())[:100]:  # Limitează pentru performanță
+    for track_id, track in islice(system.tracks.items(), 100):  # Limitează pentru performanță
         tracks.append({
             'id': track_id,
             'name': track.track_name,
@@ -108,6 +316,17 @@ def get_tracks():
         })
     return jsonify(tracks)
 
+# Fracțiunea implicită a recomandărilor locale rezervată pieselor de nișă (long tail);
+# poate fi suprascrisă per cerere prin câmpul long_tail_quota
+RECOMMEND_LONG_TAIL_QUOTA = 0.2
+
+def _long_tail_quota(data, default):
+    """Cota long tail din corpul cererii, limitată la [0, 1]"""
+    try:
+        return max(0.0, min(1.0, float(data.get('long_tail_quota', default))))
+    except (TypeError, ValueError):
+        return default
+
 @app.route('/api/recommend', methods=['POST'])
 def recommend():
     """Endpoint pentru obținerea recomandărilor"""
@@ -132,30 +351,67 @@ def recommend():
         danceability=danceability
     )
     
+    # Un pipeline local numit (ex. 'hybrid', 'discovery') înlocuiește calea implicită
+    pipeline_name = data.get('pipeline')
+    if pipeline_name:
+        if pipeline_name not in system.pipelines:
+            return jsonify({'error': f'Pipeline necunoscut: {pipeline_name}',
+                            'pipelines': sorted(system.pipelines)}), 400
+        result = system.pipeline_recommend(pipeline_name, user_id, seed_track_id, num_recommendations)
+        with tracing.span('json_encode'):
+            return jsonify({
+                'recommendations': result.recommendations,
+                'pipeline': {
+                    'name': pipeline_name,
+                    'timings_ms': result.timings_ms,
+                    'candidate_counts': result.candidate_counts
+                },
+                'user_profile': {
+                    'preferred_genres': preferred_genres,
+                    'mood': mood,
+                    'listening_time': listening_time
+                }
+            })
+    
     # Obține recomandări (folosește Recombee dacă este disponibil)
     use_recombee = data.get('use_recombee', True)  # Default: folosește Recombee dacă este disponibil
     recommendations = system.hybrid_recommend(
         user_id=user_id,
         seed_track_id=seed_track_id,
         num_recommendations=num_recommendations,
-        use_recombee=use_recombee
+        use_recombee=use_recombee,
+        long_tail_quota=_long_tail_quota(data, RECOMMEND_LONG_TAIL_QUOTA)
     )
     
     # Aplică diversificare pentru long tail
     diversified_recommendations = system.solve_long_tail_problem(recommendations)
     
-    return jsonify({
-        'recommendations': diversified_recommendations,
-        'user_profile': {
-            'preferred_genres': preferred_genres,
-            'mood': mood,
-            'listening_time': listening_time
-        }
-    })
+    with tracing.span('json_encode'):
+        return jsonify({
+            'recommendations': diversified_recommendations,
+            'user_profile': {
+                'preferred_genres': preferred_genres,
+                'mood': mood,
+                'listening_time': listening_time
+            }
+        })
 
 @app.route('/api/dataset-examples', methods=['GET'])
+@http_cached(
+    # Rezumatul se schimbă doar odată cu catalogul, deci versiunea catalogului este validatorul
+    lambda: system.catalog_etag + ''.join(f'-{name}' for name in _dataset_examples_include()),
+    CACHE_PUBLIC
+)
 def get_dataset_examples():
-    """Returnează exemple specifice din dataset"""
+    """
+    Returnează exemple specifice din dataset
+    Opțional, ?include=percentiles,histograms,genre_extremes adaugă statistici precalculate
+    """
+    include = _dataset_examples_include()
+    unknown = [name for name in include if name not in system.dataset_summary.statistic_names]
+    if unknown:
+        return jsonify({'error': f'Statistici necunoscute: {", ".join(unknown)}'}), 400
+    
     examples = system.get_dataset_examples()
     
     result = {}
@@ -171,6 +427,9 @@ def get_dataset_examples():
                 'danceability': track.danceability
             }
     
+    if include:
+        result['summary'] = {name: system.dataset_summary.get(name) for name in include}
+    
     return jsonify(result)
 
 @app.route('/api/sync-users-to-recombee', methods=['POST'])
@@ -199,21 +458,23 @@ def sync_users_to_recombee():
 def get_admin_users():
     """Returnează lista utilizatorilor pentru administrare"""
     try:
-        users_data = user_storage.load_users_data()
+        # Folosește datele din memorie (fișierul poate fi în urmă față de salvarea în fundal)
+        users_data = user_storage.users
         
         # Format users for admin display
         formatted_users = []
-        for user_id, user_data in users_data.items():
+        for user_id, user_data in list(users_data.items()):
+            liked_tracks_count = len(user_data.get('liked_tracks', []))
             formatted_users.append({
                 'user_id': user_id,
                 'email': user_data.get('email', 'N/A'),
                 'name': user_data.get('name', 'N/A'),
                 'registered_at': user_data.get('registered_at', 'N/A'),
                 'preferred_genres': user_data.get('preferred_genres', []),
-                'liked_tracks_count': len(user_data.get('liked_tracks', [])),
-                'interactions_count': len(user_data.get('interactions', [])),
+                'liked_tracks_count': liked_tracks_count,
+                'interactions_count': user_storage.get_user_interaction_count(user_id),
                 'total_likes': user_data.get('stats', {}).get('total_likes', 0),
-                'recommendation_type': 'knowledge-based' if len(user_data.get('liked_tracks', [])) < 10 else 'mixed' if len(user_data.get('liked_tracks', [])) < 25 else 'content-based'
+                'recommendation_type': get_recommendation_type(liked_tracks_count)
             })
         
         return jsonify({
@@ -227,43 +488,36 @@ def get_admin_users():
             'error': str(e)
         }), 500
 
+# Câte interacțiuni recente returnează cel mult /api/admin/interactions
+MAX_RECENT_INTERACTIONS = 100
+
 @app.route('/api/admin/interactions', methods=['GET'])
 def get_admin_interactions():
     """Returnează statistici despre interacțiunile trimise către Recombee"""
     try:
-        users_data = user_storage.load_users_data()
-        
-        total_interactions = 0
-        interaction_types = {}
-        recent_interactions = []
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit trebuie să fie un număr întreg'}), 400
+    limit = max(1, min(limit, MAX_RECENT_INTERACTIONS))
+    
+    try:
+        # Contoarele sunt ținute la zi de user_storage la fiecare interacțiune
+        summary = user_storage.get_admin_summary()
         
-        for user_id, user_data in users_data.items():
-            interactions = user_data.get('interactions', [])
-            total_interactions += len(interactions)
-            
-            for interaction in interactions:
-                interaction_type = interaction.get('type', 'unknown')
-                interaction_types[interaction_type] = interaction_types.get(interaction_type, 0) + 1
-                
-                # Adaugă la interacțiunile recente (ultimele 10)
-                if len(recent_interactions) < 10:
-                    recent_interactions.append({
-                        'user_id': user_id,
-                        'track_id': interaction.get('track_id'),
-                        'type': interaction_type,
-                        'timestamp': interaction.get('timestamp'),
-                        'recomm_id': interaction.get('recomm_id'),
-                        'has_recomm_id': bool(interaction.get('recomm_id'))
-                    })
-        
-        # Sortează interacțiunile recente după timestamp
-        recent_interactions.sort(key=lambda x: x['timestamp'], reverse=True)
+        # Cele mai noi interacțiuni din indexul global (opțional: ?limit=N&since=ISO&user_id=...)
+        recent_interactions = user_storage.get_recent_interactions(
+            limit=limit,
+            since=request.args.get('since'),
+            user_id=request.args.get('user_id')
+        )
         
         return jsonify({
             'success': True,
-            'total_interactions': total_interactions,
-            'interaction_types': interaction_types,
-            'recent_interactions': recent_interactions[:10],
+            'total_interactions': summary['total_interactions'],
+            'interaction_types': summary['interaction_types'],
+            'recommendation_types': summary['recommendation_types'],
+            'total_users': summary['total_users'],
+            'recent_interactions': recent_interactions,
             'recombee_tracking_enabled': system.recombee_client is not None
         })
     except Exception as e:
@@ -272,6 +526,17 @@ def get_admin_interactions():
             'error': str(e)
         }), 500
 
+@app.route('/api/admin/metrics', methods=['GET'])
+def get_admin_metrics():
+    """
+    Metricile de performanță: format text Prometheus (implicit, pentru scraping)
+    sau rezumat JSON cu ?format=json (pentru pagina de administrare)
+    """
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, **metrics_registry.summary()})
+    return app.response_class(metrics_registry.render_prometheus(),
+                              content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/test-recommendations', methods=['GET'])
 def get_test_recommendations():
     """Test endpoint for recommendations using ONLY Recombee"""
@@ -417,6 +682,68 @@ def auth_check():
         })
     return jsonify({'authenticated': False}), 401
 
+@app.route('/api/bootstrap', methods=['GET'])
+def bootstrap():
+    """
+    Tot ce are nevoie pagina de recomandări la încărcare, într-un singur răspuns:
+    sesiunea, statisticile, prima pagină de recomandări și buffer-ul de prefetch.
+    Apelurile către Recombee rulează în paralel, cu un termen comun
+    """
+    started = time.monotonic()
+    deadline = started + BOOTSTRAP_DEADLINE_SECONDS
+    
+    user_id = session.get('user_id')
+    user_profile = user_storage.get_user_profile(user_id) if user_id else None
+    authenticated = user_id is not None
+    
+    if authenticated:
+        target_user_id = user_id
+        liked_tracks_count = len(user_profile.get('liked_tracks', [])) if user_profile else 0
+        source_label = _recommendation_source_label(liked_tracks_count)
+        source = 'recombee'
+    else:
+        target_user_id = ANONYMOUS_USER_ID
+        liked_tracks_count = 0
+        source_label = 'Recombee test recommendations'
+        source = 'recombee_test'
+    
+    def fetch_recommendations():
+        # Prima pagină și buffer-ul vin din aceeași cerere Recombee, deci nu se repetă piese
+        return system.recombee_recommend(
+            user_id=target_user_id,
+            num_recommendations=2 * BOOTSTRAP_PAGE_SIZE,
+            scenario='homepage',
+            return_properties=True
+        )
+    
+    def fetch_stats():
+        return _user_stats_payload(user_id, user_profile) if user_profile else None
+    
+    tasks = {'stats': fetch_stats}
+    if system.recombee_client:
+        tasks['recommendations'] = fetch_recommendations
+    results, timed_out, errors = _run_with_deadline(tasks, deadline)
+    if not system.recombee_client:
+        errors['recommendations'] = 'Recombee nu este disponibil'
+    
+    recommendations = results.get('recommendations') or []
+    for rec in recommendations:
+        rec['source_label'] = source_label
+        rec['source'] = source
+    
+    return jsonify({
+        'authenticated': authenticated,
+        'user_id': user_id,
+        'username': session.get('username'),
+        'stats': results.get('stats'),
+        'liked_tracks_count': liked_tracks_count,
+        'recommendations': recommendations[:BOOTSTRAP_PAGE_SIZE],
+        'buffer': recommendations[BOOTSTRAP_PAGE_SIZE:],
+        'timed_out': timed_out,
+        'errors': errors,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+    })
+
 # ==================== API ENDPOINTS PENTRU UTILIZATORI ====================
 
 @app.route('/api/user/register', methods=['POST'])
@@ -462,6 +789,28 @@ def register_user():
         'message': 'Utilizator înregistrat cu succes'
     })
 
+# Etichetele recomandărilor colaborative locale (fără Recombee)
+LOCAL_CF_SOURCE_LABEL = 'Local collaborative recommendations'
+ALS_SOURCE_LABEL = 'Local matrix factorization recommendations'
+
+def _collaborative_fallback(user_id, reason):
+    """
+    Recomandări colaborative locale când Recombee nu este disponibil sau nu returnează nimic:
+    factorii ALS antrenați offline, apoi indexul de co-apariții (pentru utilizatorii noi)
+    Returnează payload-ul răspunsului sau None dacă niciuna nu are semnal
+    """
+    recommendations = system.als_recommend(user_id, num_recommendations=10)
+    source, source_label = 'als', ALS_SOURCE_LABEL
+    if not recommendations:
+        recommendations = system.collaborative_recommend(user_id, num_recommendations=10)
+        source, source_label = 'local-cf', LOCAL_CF_SOURCE_LABEL
+    if not recommendations:
+        return None
+    for rec in recommendations:
+        rec['source_label'] = source_label
+    print(f"🔁 Recomandări colaborative locale ({source}) pentru {user_id} ({reason})")
+    return {'recommendations': recommendations, 'source': source, 'fallback_reason': reason}
+
 @app.route('/api/user/<user_id>/recommendations/content-based', methods=['GET'])
 def get_content_based_recommendations(user_id):
     """Get recommendations using ONLY Recombee"""
@@ -473,8 +822,11 @@ def get_content_based_recommendations(user_id):
     if session_user_id != user_id:
         return jsonify({'error': f'Neautorizat - session: {session_user_id}, requested: {user_id}'}), 401
     
-    # Folosește DOAR Recombee pentru recomandări
+    # Folosește Recombee pentru recomandări; fără el, filtrarea colaborativă locală
     if not system.recombee_client:
+        fallback = _collaborative_fallback(user_id, 'Recombee nu este disponibil')
+        if fallback:
+            return jsonify(fallback)
         return jsonify({'error': 'Recombee nu este disponibil'}), 503
     
     try:
@@ -486,6 +838,9 @@ def get_content_based_recommendations(user_id):
         )
         
         if not recommendations:
+            fallback = _collaborative_fallback(user_id, 'Recombee nu a returnat recomandări')
+            if fallback:
+                return jsonify(fallback)
             return jsonify({'error': 'Nu s-au putut obține recomandări de la Recombee'}), 503
         
         # Add source labels
@@ -514,8 +869,11 @@ def get_knowledge_based_recommendations(user_id):
     if session_user_id != user_id:
         return jsonify({'error': f'Neautorizat - session: {session_user_id}, requested: {user_id}'}), 401
     
-    # Folosește DOAR Recombee pentru recomandări
+    # Folosește Recombee pentru recomandări; fără el, filtrarea colaborativă locală
     if not system.recombee_client:
+        fallback = _collaborative_fallback(user_id, 'Recombee nu este disponibil')
+        if fallback:
+            return jsonify(fallback)
         return jsonify({'error': 'Recombee nu este disponibil'}), 503
     
     try:
@@ -527,6 +885,9 @@ def get_knowledge_based_recommendations(user_id):
         )
         
         if not recommendations:
+            fallback = _collaborative_fallback(user_id, 'Recombee nu a returnat recomandări')
+            if fallback:
+                return jsonify(fallback)
             return jsonify({'error': 'Nu s-au putut obține recomandări de la Recombee'}), 503
         
         # Add source labels
@@ -572,6 +933,7 @@ def add_interaction(user_id):
     return jsonify({'success': True, 'message': 'Interacțiune adăugată'})
 
 @app.route('/api/user/<user_id>/stats', methods=['GET'])
+@http_cached(lambda user_id: f'user-{user_id}-{user_storage.get_user_version(user_id)}', CACHE_PRIVATE)
 def get_user_stats(user_id):
     """Obține statisticile utilizatorului"""
     user_profile = user_storage.get_user_profile(user_id)
@@ -579,13 +941,7 @@ def get_user_stats(user_id):
     if not user_profile:
         return jsonify({'error': 'Utilizator nu există'}), 404
     
-    return jsonify({
-        'stats': user_storage.get_user_stats(user_id),
-        'preferred_genres': user_profile.get('preferred_genres', []),
-        'preferred_artists': user_profile.get('preferred_artists', []),
-        'total_interactions': len(user_profile.get('interactions', [])),
-        'liked_tracks_count': len(user_profile.get('liked_tracks', []))
-    })
+    return jsonify(_user_stats_payload(user_id, user_profile))
 
 # ==================== NEW API ENDPOINTS FOR IMPROVED FLOW ====================
 
@@ -642,8 +998,11 @@ def get_mixed_recommendations(user_id):
     # Get user stats
     liked_tracks_count = len(user_profile.get('liked_tracks', []))
     
-    # Folosește DOAR Recombee pentru recomandări
+    # Folosește Recombee pentru recomandări; fără el, filtrarea colaborativă locală
     if not system.recombee_client:
+        fallback = _collaborative_fallback(user_id, 'Recombee nu este disponibil')
+        if fallback:
+            return jsonify({**fallback, 'liked_tracks_count': liked_tracks_count})
         return jsonify({'error': 'Recombee nu este disponibil'}), 503
     
     print(f"🎯 Folosind DOAR Recombee pentru recomandări către {user_id}")
@@ -668,6 +1027,9 @@ def get_mixed_recommendations(user_id):
     )
     
     if not recommendations:
+        fallback = _collaborative_fallback(user_id, 'Recombee nu a returnat recomandări')
+        if fallback:
+            return jsonify({**fallback, 'liked_tracks_count': liked_tracks_count})
         return jsonify({'error': 'Nu s-au putut obține recomandări de la Recombee'}), 503
     
     # Adaugă label-ul pentru sursa recomandării
@@ -720,6 +1082,65 @@ def add_user_interaction(user_id):
         'recomm_id': recomm_id
     })
 
+# Tipurile de interacțiuni acceptate în loturi și dimensiunea maximă a unui lot
+BATCH_INTERACTION_TYPES = {'listen', 'like', 'dislike', 'bookmark', 'skip', 'playlist_add'}
+MAX_INTERACTIONS_PER_BATCH = 200
+
+def _validate_interaction_batch(data):
+    """
+    Validează corpul cererii și toate elementele lotului din `interactions`;
+    returnează (interacțiuni, None) sau (None, eroare)
+    """
+    if not isinstance(data, dict):
+        return None, 'Corpul cererii trebuie să fie un obiect JSON'
+    items = data.get('interactions')
+    if not isinstance(items, list) or not items:
+        return None, 'interactions trebuie să fie o listă nevidă'
+    if len(items) > MAX_INTERACTIONS_PER_BATCH:
+        return None, f'Maxim {MAX_INTERACTIONS_PER_BATCH} interacțiuni per lot'
+    
+    interactions = []
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            return None, f'Interacțiunea {position} nu este un obiect'
+        track_id = item.get('track_id')
+        if not track_id or not isinstance(track_id, str):
+            return None, f'Interacțiunea {position}: track_id este necesar'
+        interaction_type = item.get('interaction_type', 'listen')
+        if interaction_type not in BATCH_INTERACTION_TYPES:
+            return None, f'Interacțiunea {position}: tip necunoscut {interaction_type!r}'
+        metadata = item.get('metadata') or {}
+        if not isinstance(metadata, dict):
+            return None, f'Interacțiunea {position}: metadata trebuie să fie un obiect'
+        interactions.append({
+            'track_id': track_id,
+            'interaction_type': interaction_type,
+            'metadata': metadata,
+            'recomm_id': item.get('recomm_id')
+        })
+    return interactions, None
+
+@app.route('/api/user/<user_id>/interactions/batch', methods=['POST'])
+def add_user_interactions_batch(user_id):
+    """Adaugă un lot de interacțiuni (listen/like/dislike...) într-o singură cerere"""
+    # Verifică autentificarea
+    if session.get('user_id') != user_id:
+        return jsonify({'error': 'Neautorizat'}), 401
+    
+    # navigator.sendBeacon poate trimite corpul fără Content-Type JSON
+    data = request.get_json(force=True, silent=True)
+    interactions, error = _validate_interaction_batch({} if data is None else data)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    applied = user_storage.add_interactions_batch(user_id, interactions)
+    
+    return jsonify({
+        'success': True,
+        'message': 'Lot de interacțiuni adăugat și trimis către Recombee',
+        'count': applied
+    })
+
 @app.route('/api/user/<user_id>/recommendations/similar/<track_id>', methods=['GET'])
 def get_similar_track_recommendations(user_id, track_id):
     """Get recommendations similar to a specific track using Recombee"""
@@ -753,6 +1174,106 @@ def get_similar_track_recommendations(user_id, track_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Numărul maxim de piese sursă acceptate de endpoint-ul de recomandări similare multiple
+MAX_SIMILAR_SEEDS = 10
+
+@app.route('/api/user/<user_id>/recommendations/similar', methods=['GET'])
+def get_similar_to_tracks_recommendations(user_id):
+    """Recomandări similare cu mai multe piese (?seeds=id1,id2,...), într-un singur apel Recombee"""
+    # Verifică autentificarea
+    session_user_id = session.get('user_id')
+    if not session_user_id:
+        return jsonify({'error': 'Nu ești autentificat'}), 401
+    if session_user_id != user_id:
+        return jsonify({'error': f'Neautorizat - session: {session_user_id}, requested: {user_id}'}), 401
+    
+    seeds = [seed.strip() for seed in request.args.get('seeds', '').split(',') if seed.strip()]
+    if not seeds:
+        return jsonify({'error': 'seeds este necesar'}), 400
+    if len(seeds) > MAX_SIMILAR_SEEDS:
+        return jsonify({'error': f'Maxim {MAX_SIMILAR_SEEDS} piese sursă'}), 400
+    
+    try:
+        num_recommendations = int(request.args.get('count', 5))
+        
+        recommendations = system.recombee_recommend_similar_to_tracks(
+            track_ids=seeds,
+            user_id=user_id,
+            num_recommendations=num_recommendations,
+            scenario='similar-tracks'
+        )
+        
+        return jsonify({
+            'recommendations': recommendations,
+            'based_on_tracks': seeds,
+            'source': 'recombee_similar',
+            'count': len(recommendations)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Limitele endpoint-ului de autoplay (piese returnate și piese excluse explicit per cerere)
+MAX_NEXT_TRACKS = 50
+MAX_NEXT_EXCLUDE = 200
+SESSION_SOURCE_LABEL = 'Autoplay (sesiunea curentă)'
+
+def _next_tracks_payload(user_id, args):
+    """
+    Răspunsul endpoint-ului de autoplay ca (payload, status): recomandările de sesiune sau,
+    fără ascultări recente, recomandările Content-Based din profilul de gust
+    """
+    try:
+        num_recommendations = int(args.get('count', 5))
+    except ValueError:
+        return {'error': 'count trebuie să fie un număr întreg'}, 400
+    if not 1 <= num_recommendations <= MAX_NEXT_TRACKS:
+        return {'error': f'count trebuie să fie între 1 și {MAX_NEXT_TRACKS}'}, 400
+    
+    current_track_id = args.get('current') or None
+    exclude = {track_id.strip() for track_id in args.get('exclude', '').split(',') if track_id.strip()}
+    if len(exclude) > MAX_NEXT_EXCLUDE:
+        return {'error': f'Maxim {MAX_NEXT_EXCLUDE} piese excluse'}, 400
+    
+    recommendations = system.session_recommend(user_id, num_recommendations, current_track_id, exclude)
+    source, source_label = 'session', SESSION_SOURCE_LABEL
+    if not recommendations:
+        skipped = exclude | ({current_track_id} if current_track_id else set())
+        recommendations = [
+            recommendation
+            for recommendation in system.content_based_recommend_for_user(user_id, num_recommendations + len(skipped))
+            if recommendation['track_id'] not in skipped
+        ][:num_recommendations]
+        source, source_label = 'content-based', 'Content-based (profil de gust)'
+        for recommendation in recommendations:
+            recommendation['source'] = source
+    
+    for recommendation in recommendations:
+        recommendation['source_label'] = source_label
+    
+    return {
+        'recommendations': recommendations,
+        'current_track': current_track_id,
+        'source': source,
+        'count': len(recommendations)
+    }, 200
+
+@app.route('/api/user/<user_id>/recommendations/next', methods=['GET'])
+def get_next_track_recommendations(user_id):
+    """
+    Următoarele piese pentru autoplay (?current=<track_id>&count=5&exclude=id1,id2), din
+    ascultările recente cu pondere descrescătoare în timp; apelat la fiecare schimbare de piesă
+    """
+    # Verifică autentificarea
+    session_user_id = session.get('user_id')
+    if not session_user_id:
+        return jsonify({'error': 'Nu ești autentificat'}), 401
+    if session_user_id != user_id:
+        return jsonify({'error': f'Neautorizat - session: {session_user_id}, requested: {user_id}'}), 401
+    
+    payload, status = _next_tracks_payload(user_id, request.args)
+    return jsonify(payload), status
+
 @app.route('/api/test-recombee-direct', methods=['GET'])
 def test_recombee_direct():
     """Test direct Recombee recommendations"""
@@ -821,6 +1342,8 @@ def test_similar_tracks(track_id):
             'recombee_available': system.recombee_client is not None
         }), 500
 
+startup_report.record('app_import', time.perf_counter() - _IMPORT_STARTED)
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
 
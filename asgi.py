@@ -0,0 +1,491 @@
+"""
+Mod de servire asincron (ASGI)
+Rutele dominate de apeluri către Recombee rulează nativ asincron (client HTTP non-blocant),
+iar restul aplicației Flask este servit neschimbat prin adaptorul WSGI.
+Un singur proces poate astfel ține multe cereri în curs fără a bloca un fir per cerere.
+
+Rulare:
+    uvicorn asgi:application --port 5001
+"""
+
+import re
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Match, Mount, Route
+
+from app import (
+    app as flask_app, system, user_storage, _validate_interaction_batch, _user_stats_payload,
+    _recommendation_source_label, BOOTSTRAP_DEADLINE_SECONDS, BOOTSTRAP_PAGE_SIZE,
+    ANONYMOUS_USER_ID, MAX_SIMILAR_SEEDS, RECOMMEND_LONG_TAIL_QUOTA, _long_tail_quota,
+    _collaborative_fallback, _next_tracks_payload
+)
+from metrics import registry as metrics_registry
+import tracing
+
+
+def _session(request) -> dict:
+    """Citește sesiunea Flask (cookie semnat) fără a trece prin stiva WSGI"""
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return {}
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        return serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+def _check_user(request, user_id):
+    """Returnează un răspuns de eroare dacă sesiunea nu aparține utilizatorului, altfel None"""
+    session_user_id = _session(request).get('user_id')
+    if not session_user_id:
+        return JSONResponse({'error': 'Nu ești autentificat'}, status_code=401)
+    if session_user_id != user_id:
+        return JSONResponse({'error': f'Neautorizat - session: {session_user_id}, requested: {user_id}'},
+                            status_code=401)
+    return None
+
+
+def _initialize_services():
+    """
+    Construiește serviciile leneșe (catalogul, stocarea utilizatorilor, clientul Recombee);
+    rulează într-un executor, ca prima cerere să nu blocheze bucla de evenimente
+    """
+    user_storage.get()
+    system.get()
+    system.recombee_client
+
+
+# Rutele /recommendations/<kind> care folosesc RecommendItemsToUser
+USER_RECOMMENDATION_KINDS = {'knowledge-based', 'content-based', 'mixed'}
+
+
+def _recombee_unavailable():
+    return JSONResponse({'error': 'Recombee nu este disponibil'}, status_code=503)
+
+
+def _no_recommendations():
+    return JSONResponse({'error': 'Nu s-au putut obține recomandări de la Recombee'}, status_code=503)
+
+
+async def _local_fallback(user_id, user_profile, kind, reason, error_response):
+    """Recomandările colaborative locale (scorate într-un executor) sau răspunsul de eroare"""
+    fallback = await run_in_threadpool(_collaborative_fallback, user_id, reason)
+    if not fallback:
+        return error_response()
+    if kind == 'mixed':
+        fallback['liked_tracks_count'] = len(user_profile.get('liked_tracks', []))
+    return JSONResponse(fallback)
+
+
+# ==================== RECOMANDĂRI ====================
+
+async def user_recommendations(request):
+    """Variantele asincrone pentru /recommendations/knowledge-based, content-based și mixed"""
+    user_id = request.path_params['user_id']
+    kind = request.path_params['kind']
+    if kind not in USER_RECOMMENDATION_KINDS:
+        return JSONResponse({'error': 'Not Found'}, status_code=404)
+    error = _check_user(request, user_id)
+    if error:
+        return error
+
+    user_profile = user_storage.get_user_profile(user_id)
+    if kind == 'mixed' and not user_profile:
+        return JSONResponse({'error': 'Utilizator nu există'}, status_code=404)
+    if not system.recombee_client:
+        return await _local_fallback(user_id, user_profile, kind, 'Recombee nu este disponibil',
+                                     _recombee_unavailable)
+
+    recommendations = await system.recombee_recommend_async(
+        user_id=user_id,
+        num_recommendations=10,
+        scenario='homepage',
+        return_properties=True
+    )
+    if not recommendations:
+        return await _local_fallback(user_id, user_profile, kind, 'Recombee nu a returnat recomandări',
+                                     _no_recommendations)
+
+    if kind != 'mixed':
+        for rec in recommendations:
+            rec['source_label'] = 'Recombee recommendations'
+            rec['source'] = 'recombee'
+        return JSONResponse({'recommendations': recommendations})
+
+    liked_tracks_count = len(user_profile.get('liked_tracks', []))
+    if liked_tracks_count < 5:
+        recommendation_type = "Recombee recommendations (new user)"
+    elif liked_tracks_count < 25:
+        recommendation_type = "Recombee recommendations (learning)"
+    else:
+        recommendation_type = "Recombee recommendations (personalized)"
+    for rec in recommendations:
+        rec['source_label'] = recommendation_type
+        rec['source'] = 'recombee'
+
+    return JSONResponse({
+        'recommendations': recommendations,
+        'source': 'recombee',
+        'scenario': 'homepage',
+        'liked_tracks_count': liked_tracks_count
+    })
+
+
+async def test_recommendations(request):
+    """Varianta asincronă pentru /api/test-recommendations"""
+    if not system.recombee_client:
+        return _recombee_unavailable()
+
+    recommendations = await system.recombee_recommend_async(
+        user_id=ANONYMOUS_USER_ID,
+        num_recommendations=10,
+        scenario='homepage',
+        return_properties=True
+    )
+    if not recommendations:
+        return _no_recommendations()
+
+    for rec in recommendations:
+        rec['source_label'] = 'Recombee test recommendations'
+        rec['source'] = 'recombee_test'
+
+    return JSONResponse({
+        'recommendations': recommendations,
+        'source': 'recombee_test',
+        'message': 'Test recommendations from Recombee only'
+    })
+
+
+async def similar_track_recommendations(request):
+    """Varianta asincronă pentru /recommendations/similar/<track_id>"""
+    user_id = request.path_params['user_id']
+    track_id = request.path_params['track_id']
+    error = _check_user(request, user_id)
+    if error:
+        return error
+
+    try:
+        num_recommendations = int(request.query_params.get('count', 5))
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+    recommendations = await system.recombee_recommend_similar_tracks_async(
+        track_id=track_id,
+        user_id=user_id,
+        num_recommendations=num_recommendations,
+        scenario='similar-tracks'
+    )
+
+    return JSONResponse({
+        'recommendations': recommendations,
+        'based_on_track': track_id,
+        'source': 'recombee_similar',
+        'count': len(recommendations)
+    })
+
+
+async def similar_to_tracks_recommendations(request):
+    """Varianta asincronă pentru /recommendations/similar?seeds=..."""
+    user_id = request.path_params['user_id']
+    error = _check_user(request, user_id)
+    if error:
+        return error
+
+    seeds = [seed.strip() for seed in request.query_params.get('seeds', '').split(',') if seed.strip()]
+    if not seeds:
+        return JSONResponse({'error': 'seeds este necesar'}, status_code=400)
+    if len(seeds) > MAX_SIMILAR_SEEDS:
+        return JSONResponse({'error': f'Maxim {MAX_SIMILAR_SEEDS} piese sursă'}, status_code=400)
+
+    try:
+        num_recommendations = int(request.query_params.get('count', 5))
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+    recommendations = await system.recombee_recommend_similar_to_tracks_async(
+        track_ids=seeds,
+        user_id=user_id,
+        num_recommendations=num_recommendations,
+        scenario='similar-tracks'
+    )
+
+    return JSONResponse({
+        'recommendations': recommendations,
+        'based_on_tracks': seeds,
+        'source': 'recombee_similar',
+        'count': len(recommendations)
+    })
+
+
+async def next_track_recommendations(request):
+    """
+    Varianta asincronă pentru /recommendations/next (autoplay); scorarea locală rulează într-un
+    executor, ca bucla de evenimente să nu fie blocată la rate mari de cereri
+    """
+    user_id = request.path_params['user_id']
+    error = _check_user(request, user_id)
+    if error:
+        return error
+
+    payload, status = await run_in_threadpool(_next_tracks_payload, user_id, request.query_params)
+    return JSONResponse(payload, status_code=status)
+
+
+async def recommend(request):
+    """Varianta asincronă pentru /api/recommend (scorarea locală rulează într-un executor)"""
+    data = await request.json()
+
+    user_id = data.get('user_id', 'demo_user')
+    preferred_genres = data.get('preferred_genres', [])
+    mood = data.get('mood', 'happy')
+    listening_time = data.get('listening_time', 'medium')
+
+    # Crearea profilului trimite AddUser/SetUserValues prin clientul sincron
+    await run_in_threadpool(
+        system.create_user_profile,
+        user_id=user_id,
+        preferred_genres=preferred_genres,
+        mood=mood,
+        listening_time=listening_time,
+        energy_level=float(data.get('energy_level', 0.5)),
+        danceability=float(data.get('danceability', 0.5))
+    )
+
+    # Un pipeline local numit înlocuiește calea implicită (scorarea rulează într-un executor)
+    pipeline_name = data.get('pipeline')
+    if pipeline_name:
+        if pipeline_name not in system.pipelines:
+            return JSONResponse({'error': f'Pipeline necunoscut: {pipeline_name}',
+                                 'pipelines': sorted(system.pipelines)}, status_code=400)
+        result = await run_in_threadpool(
+            system.pipeline_recommend, pipeline_name, user_id, data.get('seed_track_id'),
+            int(data.get('num_recommendations', 10))
+        )
+        return JSONResponse({
+            'recommendations': result.recommendations,
+            'pipeline': {
+                'name': pipeline_name,
+                'timings_ms': result.timings_ms,
+                'candidate_counts': result.candidate_counts
+            },
+            'user_profile': {
+                'preferred_genres': preferred_genres,
+                'mood': mood,
+                'listening_time': listening_time
+            }
+        })
+
+    recommendations = await system.hybrid_recommend_async(
+        user_id=user_id,
+        seed_track_id=data.get('seed_track_id'),
+        num_recommendations=int(data.get('num_recommendations', 10)),
+        use_recombee=data.get('use_recombee', True),
+        long_tail_quota=_long_tail_quota(data, RECOMMEND_LONG_TAIL_QUOTA)
+    )
+
+    # Aplică diversificare pentru long tail
+    diversified_recommendations = await run_in_threadpool(system.solve_long_tail_problem, recommendations)
+
+    return JSONResponse({
+        'recommendations': diversified_recommendations,
+        'user_profile': {
+            'preferred_genres': preferred_genres,
+            'mood': mood,
+            'listening_time': listening_time
+        }
+    })
+
+
+async def bootstrap(request):
+    """
+    Varianta asincronă pentru /api/bootstrap; la depășirea termenului cererea către
+    Recombee este anulată efectiv (nu mai ocupă un fir)
+    """
+    started = time.monotonic()
+    session = _session(request)
+    user_id = session.get('user_id')
+    user_profile = user_storage.get_user_profile(user_id) if user_id else None
+    authenticated = user_id is not None
+
+    if authenticated:
+        target_user_id = user_id
+        liked_tracks_count = len(user_profile.get('liked_tracks', [])) if user_profile else 0
+        source_label = _recommendation_source_label(liked_tracks_count)
+        source = 'recombee'
+    else:
+        target_user_id = ANONYMOUS_USER_ID
+        liked_tracks_count = 0
+        source_label = 'Recombee test recommendations'
+        source = 'recombee_test'
+
+    recommendations, timed_out, errors = [], [], {}
+    if system.recombee_client:
+        try:
+            recommendations = await asyncio.wait_for(system.recombee_recommend_async(
+                user_id=target_user_id,
+                num_recommendations=2 * BOOTSTRAP_PAGE_SIZE,
+                scenario='homepage',
+                return_properties=True
+            ), timeout=BOOTSTRAP_DEADLINE_SECONDS)
+        except asyncio.TimeoutError:
+            timed_out.append('recommendations')
+    else:
+        errors['recommendations'] = 'Recombee nu este disponibil'
+
+    for rec in recommendations:
+        rec['source_label'] = source_label
+        rec['source'] = source
+
+    return JSONResponse({
+        'authenticated': authenticated,
+        'user_id': user_id,
+        'username': session.get('username'),
+        'stats': _user_stats_payload(user_id, user_profile) if user_profile else None,
+        'liked_tracks_count': liked_tracks_count,
+        'recommendations': recommendations[:BOOTSTRAP_PAGE_SIZE],
+        'buffer': recommendations[BOOTSTRAP_PAGE_SIZE:],
+        'timed_out': timed_out,
+        'errors': errors,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+    })
+
+
+# ==================== INTERACȚIUNI ====================
+
+async def interactions_batch(request):
+    """
+    Varianta asincronă pentru /interactions/batch: lotul se salvează local, iar trimiterea
+    către Recombee are loc după răspuns, fără a bloca un fir
+    """
+    user_id = request.path_params['user_id']
+    if _session(request).get('user_id') != user_id:
+        return JSONResponse({'error': 'Neautorizat'}, status_code=401)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    interactions, error = _validate_interaction_batch({} if data is None else data)
+    if error:
+        return JSONResponse({'success': False, 'error': error}, status_code=400)
+
+    # Salvarea poate face fsync, deci rulează în afara buclei de evenimente
+    applied = await run_in_threadpool(
+        user_storage.add_interactions_batch, user_id, interactions, send_to_recombee=False
+    )
+
+    return JSONResponse({
+        'success': True,
+        'message': 'Lot de interacțiuni adăugat și trimis către Recombee',
+        'count': applied
+    }, background=BackgroundTask(system.send_interactions_batch_async, user_id, interactions))
+
+
+# ==================== METRICI ȘI TRASARE ====================
+
+class NativeRouteMiddleware:
+    """
+    Metricile și trasarea pentru rutele asincrone native; rutele montate din Flask sunt deja
+    acoperite de hook-urile aplicației Flask. Ruta este raportată după șablon, în aceeași
+    formă ca în Flask (/api/user/<user_id>/...), ca seriile să fie comune ambelor moduri.
+    Trasarea se activează la fel (X-Debug-Trace / ?debug=trace sau eșantionare).
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = [route for route in routes if isinstance(route, Route)]
+        self.services_ready = False
+
+    def _route_template(self, scope):
+        for route in self.routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return re.sub(r'\{(\w+)(:\w+)?\}', r'<\1>', route.path)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        route = self._route_template(scope) if scope['type'] == 'http' else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        started = time.perf_counter()
+        recorded = False
+
+        request = Request(scope)
+        debug = request.headers.get('X-Debug-Trace') == '1' or request.query_params.get('debug') == 'trace'
+        sampled = tracing.should_sample()
+        trace = tracing.start_trace(f'{method} {request.url.path}', sampled=sampled) if debug or sampled else None
+
+        async def send_with_metrics(message):
+            nonlocal recorded
+            if message['type'] == 'http.response.start' and not recorded:
+                recorded = True
+                metrics_registry.record_request(route, method, message['status'],
+                                                time.perf_counter() - started)
+                if trace is not None:
+                    trace.finish()
+                    if debug:
+                        headers = MutableHeaders(scope=message)
+                        headers['Server-Timing'] = trace.server_timing()
+                        headers['X-Trace-Id'] = trace.trace_id
+            await send(message)
+
+        try:
+            # Handler-ele native folosesc serviciile direct pe bucla de evenimente: în modurile
+            # lazy și warmup, construcția lor (sau așteptarea firului de încălzire) are loc
+            # într-un executor
+            if not self.services_ready:
+                await run_in_threadpool(_initialize_services)
+                self.services_ready = True
+            await self.app(scope, receive, send_with_metrics)
+        except Exception:
+            if not recorded:
+                metrics_registry.record_request(route, method, 500, time.perf_counter() - started)
+            raise
+        finally:
+            if trace is not None:
+                trace.finish()
+        # Scrierea pe disc a trasării eșantionate nu blochează bucla de evenimente
+        if trace is not None and trace.sampled:
+            await run_in_threadpool(trace.write)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    if system.initialized and system.async_recombee_client is not None:
+        await system.async_recombee_client.aclose()
+
+
+routes = [
+    Route('/api/bootstrap', bootstrap, methods=['GET']),
+    Route('/api/recommend', recommend, methods=['POST']),
+    Route('/api/test-recommendations', test_recommendations, methods=['GET']),
+    Route('/api/user/{user_id}/recommendations/similar', similar_to_tracks_recommendations, methods=['GET']),
+    Route('/api/user/{user_id}/recommendations/similar/{track_id}', similar_track_recommendations,
+          methods=['GET']),
+    Route('/api/user/{user_id}/recommendations/next', next_track_recommendations, methods=['GET']),
+    Route('/api/user/{user_id}/recommendations/{kind}', user_recommendations, methods=['GET']),
+    Route('/api/user/{user_id}/interactions/batch', interactions_batch, methods=['POST']),
+    # Toate celelalte rute sunt servite de aplicația Flask
+    Mount('/', app=WSGIMiddleware(flask_app))
+]
+
+application = Starlette(
+    routes=routes,
+    middleware=[Middleware(NativeRouteMiddleware, routes=routes)],
+    lifespan=lifespan
+)
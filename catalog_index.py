@@ -0,0 +1,369 @@
+"""
+Index numeric al catalogului de piese
+Păstrează caracteristicile pieselor ca matrice NumPy, tabela de ID-uri (cu indexul sortat pentru
+căutarea rândului unei piese), coloanele text (UTF-8 concatenat + offset-uri) și indexul pe genuri.
+Datele sunt salvate ca fișiere .npy și încărcate memory-mapped (doar citire), astfel încât
+toți workerii unui server pre-fork citesc aceleași pagini din cache-ul sistemului de operare,
+fără copii private per proces: nu există obiecte Python per piesă, ale căror contoare de
+referințe ar murdări (și copia) paginile în fiecare worker.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Versiunea formatului din cache; se incrementează când se schimbă structura fișierelor
+CACHE_FORMAT_VERSION = 3
+
+# Numărul de bucket-uri de popularitate per gen (decile: bucket-ul 0 = cele mai puțin populare 10%)
+POPULARITY_BUCKETS = 10
+
+# Coloanele numerice brute, în ordinea din matricea `raw`
+RAW_COLUMNS = [
+    'popularity', 'duration_ms', 'danceability', 'energy', 'key', 'loudness', 'mode',
+    'speechiness', 'acousticness', 'instrumentalness', 'liveness', 'valence', 'tempo',
+    'time_signature'
+]
+
+# Coloanele de tip întreg din RAW_COLUMNS (restul sunt float)
+INTEGER_COLUMNS = {'popularity', 'duration_ms', 'key', 'mode', 'time_signature'}
+
+# Coloanele text păstrate ca tabele de șiruri (genul este păstrat ca cod, în genre_codes)
+STRING_COLUMNS = ['track_name', 'artists', 'album_name']
+
+# Caracteristicile normalizate folosite pentru similaritate (aceeași ordine și normalizare
+# ca în SpotifyRecommendationSystem._calculate_acoustic_similarity)
+FEATURE_NAMES = [
+    'energy', 'danceability', 'valence', 'speechiness', 'acousticness', 'instrumentalness',
+    'liveness', 'tempo', 'loudness', 'key', 'mode', 'time_signature', 'popularity'
+]
+
+
+def normalize_features(raw: np.ndarray) -> np.ndarray:
+    """Transformă coloanele brute (RAW_COLUMNS) în vectorii normalizați (FEATURE_NAMES)"""
+    col = {name: raw[:, idx] for idx, name in enumerate(RAW_COLUMNS)}
+    return np.column_stack([
+        col['energy'],                    # [0, 1]
+        col['danceability'],              # [0, 1]
+        col['valence'],                   # [0, 1]
+        col['speechiness'],               # [0, 1]
+        col['acousticness'],              # [0, 1]
+        col['instrumentalness'],          # [0, 1]
+        col['liveness'],                  # [0, 1]
+        col['tempo'] / 200.0,             # Normalizare tempo [0, 1] (max ~200 BPM)
+        (col['loudness'] + 60) / 60.0,    # Normalizare loudness [-60, 0] -> [0, 1]
+        col['key'] / 11.0,                # Normalizare key [0, 11] -> [0, 1]
+        col['mode'] / 1.0,                # Mode [0, 1]
+        col['time_signature'] / 5.0,      # Normalizare time_signature [3, 5] -> [0, 1]
+        col['popularity'] / 100.0         # Normalizare popularity [0, 100] -> [0, 1]
+    ])
+
+
+def encode_strings(values: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Tabela de șiruri: octeții UTF-8 concatenați și offset-urile (șirul i = blob[off[i]:off[i + 1]])"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+class RowLookup(Mapping):
+    """
+    ID piesă -> rând, prin căutare binară în ID-urile sortate (fără dicționar per proces)
+    Se folosește ca un dicționar (`in`, [], get); rows_of caută vectorizat un lot de ID-uri.
+    """
+
+    def __init__(self, track_ids: np.ndarray, sorted_ids: np.ndarray, id_order: np.ndarray):
+        self._track_ids = track_ids
+        self._sorted_ids = sorted_ids
+        self._id_order = id_order
+
+    def _position(self, track_id) -> int:
+        if not isinstance(track_id, str) or not len(self._sorted_ids):
+            return -1
+        position = int(np.searchsorted(self._sorted_ids, track_id))
+        if position < len(self._sorted_ids) and self._sorted_ids[position] == track_id:
+            return position
+        return -1
+
+    def __getitem__(self, track_id) -> int:
+        position = self._position(track_id)
+        if position < 0:
+            raise KeyError(track_id)
+        return int(self._id_order[position])
+
+    def __contains__(self, track_id) -> bool:
+        return self._position(track_id) >= 0
+
+    def __len__(self) -> int:
+        return len(self._track_ids)
+
+    def __iter__(self):
+        return (str(track_id) for track_id in self._track_ids)
+
+    def rows_of(self, track_ids: List[str]) -> np.ndarray:
+        """Rândurile unui lot de ID-uri (-1 pentru cele care lipsesc din catalog)"""
+        if not len(track_ids) or not len(self._sorted_ids):
+            return np.full(len(track_ids), -1, dtype=np.int64)
+        keys = np.asarray(track_ids, dtype=str)
+        positions = np.minimum(np.searchsorted(self._sorted_ids, keys), len(self._sorted_ids) - 1)
+        found = self._sorted_ids[positions] == keys
+        return np.where(found, self._id_order[positions], -1).astype(np.int64)
+
+
+class GenreTracks(Mapping):
+    """Gen -> lista ID-urilor pieselor din gen (în ordinea din catalog), citită din indexul pe genuri"""
+
+    def __init__(self, catalog: 'CatalogIndex'):
+        self._catalog = catalog
+
+    def __getitem__(self, genre: str) -> List[str]:
+        if genre not in self._catalog.genre_code_of:
+            raise KeyError(genre)
+        return self._catalog.track_ids[self._catalog.genre_rows(genre)].tolist()
+
+    def __contains__(self, genre) -> bool:
+        return genre in self._catalog.genre_code_of
+
+    def __len__(self) -> int:
+        return len(self._catalog.genre_names)
+
+    def __iter__(self):
+        return iter(self._catalog.genre_names)
+
+
+class CatalogIndex:
+    """Matricea de caracteristici, tabela de ID-uri, coloanele text și indexul pe genuri ale catalogului"""
+
+    def __init__(self, track_ids: np.ndarray, raw: np.ndarray, features: np.ndarray,
+                 norms: np.ndarray, genre_codes: np.ndarray, genre_names: List[str],
+                 genre_order: np.ndarray, genre_offsets: List[int],
+                 popularity_order: np.ndarray, popularity_offsets: np.ndarray,
+                 sorted_ids: np.ndarray, id_order: np.ndarray, explicit: np.ndarray,
+                 strings: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        self.track_ids = track_ids          # (N,) ID-urile pieselor, rândul i = piesa i
+        self.raw = raw                      # (N, len(RAW_COLUMNS)) valori brute
+        self.features = features            # (N, 13) caracteristici normalizate
+        self.norms = norms                  # (N,) norma euclidiană a fiecărui rând
+        self.genre_codes = genre_codes      # (N,) indexul genului în genre_names
+        self.genre_names = genre_names
+        self.genre_order = genre_order      # rândurile sortate (stabil) după gen
+        self.genre_offsets = genre_offsets  # genul g ocupă genre_order[off[g]:off[g + 1]]
+        # Rândurile grupate pe gen și sortate crescător după popularitate în interiorul genului;
+        # bucket-ul b al genului g ocupă popularity_order[pop_off[g, b]:pop_off[g, b + 1]]
+        self.popularity_order = popularity_order
+        self.popularity_offsets = popularity_offsets
+        self.explicit = explicit            # (N,) bool
+        self.strings = strings              # coloană -> (octeți UTF-8, offset-uri), vezi encode_strings
+
+        self.row_of = RowLookup(track_ids, sorted_ids, id_order)
+        self.genre_code_of: Dict[str, int] = {genre: code for code, genre in enumerate(genre_names)}
+
+    def __len__(self) -> int:
+        return len(self.track_ids)
+
+    @classmethod
+    def build(cls, tracks: Dict) -> 'CatalogIndex':
+        """Construiește indexul din dicționarul de piese (ordinea rândurilor = ordinea din dicționar)"""
+        track_list = list(tracks.values())
+        raw = np.array(
+            [[float(getattr(track, name)) for name in RAW_COLUMNS] for track in track_list],
+            dtype=np.float64
+        ).reshape(len(track_list), len(RAW_COLUMNS))
+        features = normalize_features(raw) if len(track_list) else np.zeros((0, len(FEATURE_NAMES)))
+        norms = np.linalg.norm(features, axis=1)
+
+        genre_names = sorted({track.track_genre for track in track_list})
+        code_of = {genre: code for code, genre in enumerate(genre_names)}
+        genre_codes = np.array([code_of[track.track_genre] for track in track_list], dtype=np.int32)
+        genre_order = np.argsort(genre_codes, kind='stable').astype(np.int32)
+        genre_offsets = np.searchsorted(
+            genre_codes[genre_order], np.arange(len(genre_names) + 1)
+        ).tolist()
+
+        popularity_order, popularity_offsets = cls._popularity_buckets(
+            raw[:, RAW_COLUMNS.index('popularity')], genre_codes, genre_offsets
+        )
+
+        track_ids = np.array([track.track_id for track in track_list], dtype=str)
+        id_order = np.argsort(track_ids, kind='stable').astype(np.int64)
+        explicit = np.array([bool(track.explicit) for track in track_list], dtype=bool)
+        strings = {column: encode_strings(getattr(track, column) for track in track_list)
+                   for column in STRING_COLUMNS}
+        return cls(track_ids, raw, features, norms, genre_codes, genre_names,
+                   genre_order, genre_offsets, popularity_order, popularity_offsets,
+                   track_ids[id_order], id_order, explicit, strings)
+
+    @staticmethod
+    def _popularity_buckets(popularity: np.ndarray, genre_codes: np.ndarray, genre_offsets: List[int]):
+        """
+        Ordinea pe (gen, popularitate, rând) și limitele bucket-urilor de popularitate per gen
+        (cuantile după rang: fiecare bucket are aceeași mărime, ±1 piesă)
+        """
+        popularity_order = np.lexsort(
+            (np.arange(len(popularity)), popularity, genre_codes)
+        ).astype(np.int32)
+        starts = np.asarray(genre_offsets[:-1], dtype=np.int64)
+        sizes = np.diff(np.asarray(genre_offsets, dtype=np.int64))
+        popularity_offsets = starts[:, None] + (sizes[:, None] * np.arange(POPULARITY_BUCKETS + 1)) // POPULARITY_BUCKETS
+        return popularity_order, popularity_offsets
+
+    @classmethod
+    def load_or_build(cls, read_tracks: Callable[[], Dict], csv_file: str,
+                      cache_dir: Optional[str] = '.catalog_cache') -> 'CatalogIndex':
+        """
+        Încarcă indexul memory-mapped din cache dacă acesta corespunde fișierului CSV,
+        altfel citește piesele (`read_tracks`, doar în acest caz), construiește indexul
+        și îl salvează în cache
+        """
+        if not cache_dir:
+            return cls.build(read_tracks())
+
+        source_key = cls._source_key(csv_file)
+        cached = cls._load_cache(cache_dir, source_key)
+        if cached is not None:
+            return cached
+
+        index = cls.build(read_tracks())
+        try:
+            index.save(cache_dir, source_key)
+            cached = cls._load_cache(cache_dir, source_key)
+            if cached is not None:
+                return cached
+        except OSError as e:
+            print(f"Nu s-a putut salva cache-ul catalogului în {cache_dir}: {e}")
+        return index
+
+    @staticmethod
+    def _source_key(csv_file: str) -> Dict:
+        """Identifică versiunea fișierului CSV din care provine indexul"""
+        stat = os.stat(csv_file)
+        return {
+            'format_version': CACHE_FORMAT_VERSION,
+            'csv_file': os.path.abspath(csv_file),
+            'csv_size': stat.st_size,
+            'csv_mtime_ns': stat.st_mtime_ns
+        }
+
+    def save(self, cache_dir: str, source_key: Dict):
+        """Salvează indexul ca fișiere .npy (scriere într-un director temporar, apoi redenumire)"""
+        parent = os.path.dirname(os.path.abspath(cache_dir))
+        tmp_dir = tempfile.mkdtemp(prefix='.catalog_tmp_', dir=parent)
+        try:
+            np.save(os.path.join(tmp_dir, 'track_ids.npy'), self.track_ids)
+            np.save(os.path.join(tmp_dir, 'raw.npy'), self.raw)
+            np.save(os.path.join(tmp_dir, 'features.npy'), self.features)
+            np.save(os.path.join(tmp_dir, 'norms.npy'), self.norms)
+            np.save(os.path.join(tmp_dir, 'genre_codes.npy'), self.genre_codes)
+            np.save(os.path.join(tmp_dir, 'genre_order.npy'), self.genre_order)
+            np.save(os.path.join(tmp_dir, 'popularity_order.npy'), self.popularity_order)
+            np.save(os.path.join(tmp_dir, 'popularity_offsets.npy'), self.popularity_offsets)
+            np.save(os.path.join(tmp_dir, 'sorted_ids.npy'), self.row_of._sorted_ids)
+            np.save(os.path.join(tmp_dir, 'id_order.npy'), self.row_of._id_order)
+            np.save(os.path.join(tmp_dir, 'explicit.npy'), self.explicit)
+            for column, (blob, offsets) in self.strings.items():
+                np.save(os.path.join(tmp_dir, f'{column}.npy'), blob)
+                np.save(os.path.join(tmp_dir, f'{column}_offsets.npy'), offsets)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    **source_key,
+                    'genre_names': self.genre_names,
+                    'genre_offsets': self.genre_offsets
+                }, f, ensure_ascii=False)
+
+            if os.path.isdir(cache_dir):
+                shutil.rmtree(cache_dir)
+            os.replace(tmp_dir, cache_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @classmethod
+    def _load_cache(cls, cache_dir: str, source_key: Dict) -> Optional['CatalogIndex']:
+        """Încarcă indexul memory-mapped, sau None dacă cache-ul lipsește ori este învechit"""
+        meta_file = os.path.join(cache_dir, 'meta.json')
+        if not os.path.exists(meta_file):
+            return None
+
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if any(meta.get(key) != value for key, value in source_key.items()):
+                return None
+
+            def load(name):
+                return np.load(os.path.join(cache_dir, name), mmap_mode='r')
+
+            return cls(load('track_ids.npy'), load('raw.npy'), load('features.npy'),
+                       load('norms.npy'), load('genre_codes.npy'), meta['genre_names'],
+                       load('genre_order.npy'), meta['genre_offsets'],
+                       load('popularity_order.npy'), load('popularity_offsets.npy'),
+                       load('sorted_ids.npy'), load('id_order.npy'), load('explicit.npy'),
+                       {column: (load(f'{column}.npy'), load(f'{column}_offsets.npy'))
+                        for column in STRING_COLUMNS})
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Cache-ul catalogului din {cache_dir} nu poate fi folosit: {e}")
+            return None
+
+    def string(self, column: str, row: int) -> str:
+        """Valoarea unei coloane text (STRING_COLUMNS) pentru un rând"""
+        blob, offsets = self.strings[column]
+        return blob[offsets[row]:offsets[row + 1]].tobytes().decode('utf-8')
+
+    def record(self, row: int) -> Dict:
+        """Toate câmpurile piesei de pe un rând (aceleași nume și tipuri ca în CSV)"""
+        values = self.raw[row].tolist()
+        record = {
+            name: int(value) if name in INTEGER_COLUMNS else value
+            for name, value in zip(RAW_COLUMNS, values)
+        }
+        record.update({column: self.string(column, row) for column in STRING_COLUMNS})
+        record['track_id'] = str(self.track_ids[row])
+        record['track_genre'] = self.genre_names[self.genre_codes[row]]
+        record['explicit'] = bool(self.explicit[row])
+        return record
+
+    def column(self, name: str) -> np.ndarray:
+        """Returnează o coloană brută (ex. 'popularity', 'duration_ms') pentru toate piesele"""
+        return self.raw[:, RAW_COLUMNS.index(name)]
+
+    def genre_rows(self, genre: str) -> np.ndarray:
+        """Rândurile pieselor dintr-un gen, în ordinea din catalog"""
+        code = self.genre_code_of.get(genre)
+        if code is None:
+            return np.zeros(0, dtype=np.int32)
+        return self.genre_order[self.genre_offsets[code]:self.genre_offsets[code + 1]]
+
+    def popularity_bucket_rows(self, genre: str, first_bucket: int = 0,
+                               last_bucket: int = POPULARITY_BUCKETS) -> np.ndarray:
+        """
+        Rândurile unui gen din bucket-urile de popularitate [first_bucket, last_bucket),
+        sortate crescător după popularitate (o felie din indexul precalculat, fără copiere)
+        """
+        code = self.genre_code_of.get(genre)
+        if code is None:
+            return np.zeros(0, dtype=np.int32)
+        offsets = self.popularity_offsets[code]
+        return self.popularity_order[offsets[first_bucket]:offsets[last_bucket]]
+
+    def cosine_similarities(self, vector: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Cosine similarity între un vector de caracteristici normalizate și piesele catalogului
+        (toate, sau doar `rows`), limitată inferior la 0 ca în implementarea scalară
+        """
+        features = self.features if rows is None else self.features[rows]
+        norms = self.norms if rows is None else self.norms[rows]
+        vector_norm = float(np.linalg.norm(vector))
+
+        similarities = np.zeros(len(features))
+        if vector_norm == 0:
+            return similarities
+
+        valid = norms > 0
+        similarities[valid] = (features[valid] @ vector) / (norms[valid] * vector_norm)
+        return np.maximum(similarities, 0.0)
@@ -0,0 +1,191 @@
+"""
+Filtrare colaborativă item-item locală (matrice de co-apariții rară)
+Construită din `liked_tracks` și `interactions` ale utilizatorilor și ținută la zi incremental
+la fiecare interacțiune nouă; servește recomandări colaborative în proces atunci când
+Recombee nu este disponibil sau nu răspunde la timp.
+
+Matricea este păstrată ca dicționar de dicționare (doar perechile care apar efectiv),
+deci memoria crește cu numărul de co-apariții, nu cu pătratul catalogului.
+"""
+
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Ponderea implicită a fiecărui tip de interacțiune (semnal pozitiv); dislike/skip nu contează
+INTERACTION_WEIGHTS = {
+    'like': 1.0,
+    'playlist_add': 0.8,
+    'bookmark': 0.6,
+    'listen': 0.3
+}
+
+# Câți vecini sunt păstrați pentru fiecare piesă
+DEFAULT_NEIGHBOURS = 50
+
+
+class CooccurrenceIndex:
+    """
+    Matricea de co-apariții item-item și listele de vecini top-K (sigur pentru mai multe fire)
+
+    Fiecare utilizator contribuie cu ponderea maximă văzută pentru o piesă (like > playlist >
+    bookmark > ascultare). Co-apariția a două piese este suma, pe utilizatori, a minimului
+    celor două ponderi, iar similaritatea este co-apariția normalizată:
+        sim(i, j) = C[i][j] / sqrt(n[i] * n[j]),   n[i] = suma ponderilor piesei i
+    """
+
+    def __init__(self, neighbours: int = DEFAULT_NEIGHBOURS,
+                 weights: Optional[Dict[str, float]] = None):
+        self.neighbour_count = neighbours
+        self.weights = dict(weights or INTERACTION_WEIGHTS)
+        self._lock = threading.Lock()
+        self._user_items: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._cooccurrence: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._item_weight: Dict[str, float] = defaultdict(float)
+        # Listele de vecini calculate la cerere și invalidate doar pentru piesele atinse
+        self._neighbour_cache: Dict[str, List[Tuple[str, float]]] = {}
+
+    @classmethod
+    def from_users(cls, users: Dict[str, Dict], **kwargs) -> 'CooccurrenceIndex':
+        """Construiește indexul din înregistrările utilizatorilor (formatul din UserStorage)"""
+        index = cls(**kwargs)
+        for user_id, user_data in users.items():
+            items: Dict[str, float] = {}
+            like_weight = index.weights.get('like', 0.0)
+            for track_id in user_data.get('liked_tracks', []):
+                items[track_id] = max(items.get(track_id, 0.0), like_weight)
+            for interaction in user_data.get('interactions', []):
+                weight = index.weights.get(interaction.get('type'), 0.0)
+                track_id = interaction.get('track_id')
+                if weight > 0 and track_id:
+                    items[track_id] = max(items.get(track_id, 0.0), weight)
+            for track_id in user_data.get('disliked_tracks', []):
+                items.pop(track_id, None)
+            index._add_user_items(user_id, items)
+        return index
+
+    def _add_user_items(self, user_id: str, items: Dict[str, float]):
+        """Adaugă toate piesele unui utilizator deodată (folosit la construcție)"""
+        if not items:
+            return
+        self._user_items[user_id] = dict(items)
+        entries = list(items.items())
+        for position, (item, weight) in enumerate(entries):
+            self._item_weight[item] += weight
+            row = self._cooccurrence[item]
+            for other, other_weight in entries[position + 1:]:
+                shared = min(weight, other_weight)
+                row[other] = row.get(other, 0.0) + shared
+                self._cooccurrence[other][item] = self._cooccurrence[other].get(item, 0.0) + shared
+
+    def add(self, user_id: str, item: str, interaction_type: str) -> bool:
+        """
+        Înregistrează o interacțiune; actualizarea costă O(numărul pieselor utilizatorului)
+        Returnează True dacă matricea s-a schimbat (ponderea piesei pentru utilizator a crescut)
+        """
+        weight = self.weights.get(interaction_type, 0.0)
+        if weight <= 0:
+            return False
+        with self._lock:
+            items = self._user_items[user_id]
+            previous = items.get(item, 0.0)
+            if weight <= previous:
+                return False
+            items[item] = weight
+            self._item_weight[item] += weight - previous
+            row = self._cooccurrence[item]
+            touched = [item]
+            for other, other_weight in items.items():
+                if other == item:
+                    continue
+                delta = min(weight, other_weight) - min(previous, other_weight)
+                if delta:
+                    row[other] = row.get(other, 0.0) + delta
+                    self._cooccurrence[other][item] = self._cooccurrence[other].get(item, 0.0) + delta
+                    touched.append(other)
+            self._invalidate(touched)
+            return True
+
+    def remove(self, user_id: str, item: str) -> bool:
+        """Scoate piesa din contribuția utilizatorului (ex. după un dislike)"""
+        with self._lock:
+            items = self._user_items.get(user_id)
+            if not items or item not in items:
+                return False
+            weight = items.pop(item)
+            self._item_weight[item] -= weight
+            row = self._cooccurrence[item]
+            touched = [item]
+            for other, other_weight in items.items():
+                shared = min(weight, other_weight)
+                row[other] = row.get(other, 0.0) - shared
+                self._cooccurrence[other][item] = self._cooccurrence[other].get(item, 0.0) - shared
+                if row[other] <= 1e-12:
+                    del row[other]
+                    del self._cooccurrence[other][item]
+                touched.append(other)
+            self._invalidate(touched)
+            return True
+
+    def _invalidate(self, items: Iterable[str]):
+        """
+        Invalidează vecinii pieselor atinse; schimbarea lui n[i] modifică similaritatea lui i
+        cu toți vecinii săi, deci și listele acestora (apelantul deține lock-ul)
+        """
+        cache = self._neighbour_cache
+        for item in items:
+            cache.pop(item, None)
+            for other in self._cooccurrence.get(item, ()):
+                cache.pop(other, None)
+
+    def _compute_neighbours(self, item: str) -> List[Tuple[str, float]]:
+        row = self._cooccurrence.get(item)
+        norm = self._item_weight.get(item, 0.0)
+        if not row or norm <= 0:
+            return []
+        item_weight = self._item_weight
+        scored = [(other, shared / math.sqrt(norm * item_weight[other]))
+                  for other, shared in row.items() if item_weight.get(other, 0.0) > 0]
+        # Rotunjirea face ordinea egalităților aceeași indiferent de ordinea actualizărilor
+        scored.sort(key=lambda pair: (-round(pair[1], 12), pair[0]))
+        return scored[:self.neighbour_count]
+
+    def neighbours(self, item: str, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Cele mai similare piese (piesă, similaritate), descrescător"""
+        with self._lock:
+            cached = self._neighbour_cache.get(item)
+            if cached is None:
+                cached = self._neighbour_cache[item] = self._compute_neighbours(item)
+        return cached if k is None else cached[:k]
+
+    def user_items(self, user_id: str) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._user_items.get(user_id, {}))
+
+    def recommend(self, user_id: str, k: int = 10,
+                  exclude: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Scorul unei piese candidat = suma, pe piesele utilizatorului, a ponderii piesei
+        înmulțită cu similaritatea dintre ele (doar din listele de vecini top-K)
+        """
+        items = self.user_items(user_id)
+        if not items or k <= 0:
+            return []
+        excluded = set(exclude or ()) | set(items)
+        scores: Dict[str, float] = defaultdict(float)
+        for item, weight in items.items():
+            for other, similarity in self.neighbours(item):
+                if other not in excluded:
+                    scores[other] += weight * similarity
+        ranked = sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+        return ranked[:k]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'users': sum(1 for items in self._user_items.values() if items),
+                'items': sum(1 for weight in self._item_weight.values() if weight > 0),
+                'pairs': sum(len(row) for row in self._cooccurrence.values()) // 2,
+                'cached_neighbour_lists': len(self._neighbour_cache)
+            }
@@ -0,0 +1,127 @@
+"""
+Rezumatul precalculat al dataset-ului
+Extremele (cea mai scurtă/lungă piesă, cea mai energetică etc.) sunt calculate o singură dată
+la încărcare și actualizate incremental la adăugarea de piese. Statisticile suplimentare
+(percentile, extreme pe genuri, histograme) sunt înregistrate ca funcții și calculate la cerere,
+apoi păstrate până la următoarea modificare a catalogului.
+"""
+
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from catalog_index import CatalogIndex
+
+# Exemplele din dataset: cheie -> (coloană, 'min' sau 'max')
+EXTREME_EXAMPLES = {
+    'short_description_track': ('duration_ms', 'min'),
+    'long_description_track': ('duration_ms', 'max'),
+    'high_energy_track': ('energy', 'max'),
+    'low_energy_track': ('energy', 'min'),
+    'popular_track': ('popularity', 'max'),
+    'niche_track': ('popularity', 'min')
+}
+
+# Coloanele pentru care se calculează percentile și histograme
+SUMMARY_COLUMNS = ['duration_ms', 'energy', 'popularity', 'danceability']
+PERCENTILES = [5, 25, 50, 75, 95]
+HISTOGRAM_BINS = 10
+
+
+def _percentiles(catalog: CatalogIndex) -> Dict:
+    """Percentilele coloanelor din SUMMARY_COLUMNS"""
+    if not len(catalog):
+        return {}
+    return {
+        column: dict(zip(
+            (f'p{p}' for p in PERCENTILES),
+            np.percentile(catalog.column(column), PERCENTILES).tolist()
+        ))
+        for column in SUMMARY_COLUMNS
+    }
+
+
+def _genre_extremes(catalog: CatalogIndex) -> Dict:
+    """Piesele extreme (ID-uri) pentru fiecare gen"""
+    result = {}
+    for genre in catalog.genre_names:
+        rows = catalog.genre_rows(genre)
+        if not len(rows):
+            continue
+        genre_result = {}
+        for key, (column, kind) in EXTREME_EXAMPLES.items():
+            values = catalog.column(column)[rows]
+            position = np.argmin(values) if kind == 'min' else np.argmax(values)
+            genre_result[key] = str(catalog.track_ids[rows[position]])
+        result[genre] = genre_result
+    return result
+
+
+def _histograms(catalog: CatalogIndex) -> Dict:
+    """Histogramele coloanelor din SUMMARY_COLUMNS"""
+    if not len(catalog):
+        return {}
+    result = {}
+    for column in SUMMARY_COLUMNS:
+        counts, edges = np.histogram(catalog.column(column), bins=HISTOGRAM_BINS)
+        result[column] = {'counts': counts.tolist(), 'edges': edges.tolist()}
+    return result
+
+
+class DatasetSummary:
+    """Statistici precalculate ale catalogului"""
+
+    def __init__(self):
+        self.extremes: Dict[str, Optional[str]] = {key: None for key in EXTREME_EXAMPLES}
+        self._extreme_values: Dict[str, float] = {}
+        self._statistics: Dict[str, Callable[[CatalogIndex], object]] = {}
+        self._computed: Dict[str, object] = {}
+        self._catalog: Optional[CatalogIndex] = None
+
+        self.register_statistic('percentiles', _percentiles)
+        self.register_statistic('genre_extremes', _genre_extremes)
+        self.register_statistic('histograms', _histograms)
+
+    def register_statistic(self, name: str, compute: Callable[[CatalogIndex], object]):
+        """Înregistrează o statistică nouă, calculată la cerere din indexul catalogului"""
+        self._statistics[name] = compute
+        self._computed.pop(name, None)
+
+    @property
+    def statistic_names(self):
+        return list(self._statistics)
+
+    def rebuild(self, catalog: CatalogIndex):
+        """Recalculează extremele pentru tot catalogul (o singură trecere vectorizată per coloană)"""
+        self._catalog = catalog
+        self._computed.clear()
+        self.extremes = {key: None for key in EXTREME_EXAMPLES}
+        self._extreme_values = {}
+        if not len(catalog):
+            return
+
+        for key, (column, kind) in EXTREME_EXAMPLES.items():
+            values = catalog.column(column)
+            # argmin/argmax returnează prima apariție, ca parcurgerea cu comparații stricte
+            row = int(np.argmin(values) if kind == 'min' else np.argmax(values))
+            self.extremes[key] = str(catalog.track_ids[row])
+            self._extreme_values[key] = float(values[row])
+
+    def add_track(self, track, catalog: CatalogIndex):
+        """Actualizează extremele în O(1) pentru o piesă nou adăugată"""
+        self._catalog = catalog
+        self._computed.clear()
+        for key, (column, kind) in EXTREME_EXAMPLES.items():
+            value = float(getattr(track, column))
+            current = self._extreme_values.get(key)
+            if current is None or (value < current if kind == 'min' else value > current):
+                self.extremes[key] = track.track_id
+                self._extreme_values[key] = value
+
+    def get(self, name: str):
+        """Returnează o statistică înregistrată (calculată la prima cerere după o modificare)"""
+        if name not in self._statistics:
+            raise KeyError(f'Statistică necunoscută: {name}')
+        if name not in self._computed:
+            self._computed[name] = self._statistics[name](self._catalog)
+        return self._computed[name]
@@ -0,0 +1,248 @@
+"""
+Metrici de performanță în proces
+Contoare și histograme de latență (per rută HTTP și per tip de cerere Recombee), expuse
+în formatul text Prometheus și ca rezumat JSON pentru pagina de administrare.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Limitele superioare ale bucket-urilor de latență (secunde)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Etapele pipeline-urilor durează de obicei sub o milisecundă: bucket-uri de la 50 µs, ca
+# cuantilele să nu fie toate egale cu primul bucket implicit (5 ms)
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Bucket-urile specifice unor histograme (celelalte folosesc bucket-urile registrului)
+METRIC_BUCKETS = {
+    'pipeline_stage_duration_seconds': STAGE_BUCKETS
+}
+
+# Descrierile metricilor expuse (liniile # HELP)
+METRIC_HELP = {
+    'http_requests_total': 'Cereri HTTP servite, per rută, metodă și cod de stare',
+    'http_request_errors_total': 'Cereri HTTP terminate cu eroare (cod >= 500), per rută',
+    'http_request_duration_seconds': 'Latența cererilor HTTP, per rută',
+    'recombee_requests_total': 'Apeluri către Recombee, per tip de cerere',
+    'recombee_request_errors_total': 'Apeluri către Recombee terminate cu excepție, per tip de cerere',
+    'recombee_request_duration_seconds': 'Latența apelurilor către Recombee, per tip de cerere',
+    'pipeline_stage_duration_seconds': 'Durata etapelor pipeline-urilor de recomandare, per pipeline și etapă'
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    escaped = (f'{name}="{_escape(value)}"' for name, value in items)
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Histogram:
+    """Histogramă cumulativă cu bucket-uri fixe (ca în Prometheus)"""
+
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, bucket_count: int):
+        self.counts = [0] * (bucket_count + 1)  # ultimul bucket = +Inf
+        self.total = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    """Registrul de contoare și histograme (sigur pentru mai multe fire)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+                 metric_buckets: Optional[Dict[str, Tuple[float, ...]]] = None):
+        self.buckets = tuple(buckets)
+        self.metric_buckets = {
+            name: tuple(bounds)
+            for name, bounds in (METRIC_BUCKETS if metric_buckets is None else metric_buckets).items()
+        }
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = defaultdict(dict)
+        self.started_at = time.time()
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1.0):
+        """Incrementează un contor"""
+        key = _labels(labels)
+        with self._lock:
+            self._counters[name][key] += value
+
+    def buckets_for(self, name: str) -> Tuple[float, ...]:
+        """Limitele bucket-urilor histogramei `name`"""
+        return self.metric_buckets.get(name, self.buckets)
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        """Înregistrează o valoare (ex. durata în secunde) într-o histogramă"""
+        key = _labels(labels)
+        buckets = self.buckets_for(name)
+        position = bisect_left(buckets, value)
+        with self._lock:
+            histogram = self._histograms[name].get(key)
+            if histogram is None:
+                histogram = self._histograms[name][key] = _Histogram(len(buckets))
+            histogram.counts[position] += 1
+            histogram.total += value
+            histogram.count += 1
+
+    @contextmanager
+    def track_upstream(self, request_type: str):
+        """Măsoară un apel către Recombee: număr de apeluri, erori și latență"""
+        labels = {'request_type': request_type}
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc('recombee_request_errors_total', labels)
+            raise
+        finally:
+            self.inc('recombee_requests_total', labels)
+            self.observe('recombee_request_duration_seconds', time.perf_counter() - started, labels)
+
+    def record_request(self, route: str, method: str, status: int, duration: float):
+        """Înregistrează o cerere HTTP servită"""
+        self.inc('http_requests_total', {'route': route, 'method': method, 'status': str(status)})
+        if status >= 500:
+            self.inc('http_request_errors_total', {'route': route, 'method': method})
+        self.observe('http_request_duration_seconds', duration, {'route': route, 'method': method})
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+    def render_prometheus(self) -> str:
+        """Toate metricile în formatul text de expunere Prometheus (versiunea 0.0.4)"""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {key: (list(h.counts), h.total, h.count) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+
+        lines: List[str] = []
+        for name in sorted(counters):
+            lines.append(f'# HELP {name} {METRIC_HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} counter')
+            for key, value in sorted(counters[name].items()):
+                lines.append(f'{name}{_format_labels(key)} {value:g}')
+
+        for name in sorted(histograms):
+            lines.append(f'# HELP {name} {METRIC_HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} histogram')
+            bounds = self.buckets_for(name) + (float('inf'),)
+            for key, (counts, total, count) in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, bucket_count in zip(bounds, counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f'{name}_bucket{_format_labels(key, ("le", le))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(key)} {total:.6f}')
+                lines.append(f'{name}_count{_format_labels(key)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _quantile(buckets: Tuple[float, ...], counts: List[int], count: int, q: float) -> Optional[float]:
+        """Estimarea unei cuantile din bucket-uri (limita superioară a bucket-ului care o conține)"""
+        if not count:
+            return None
+        rank = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return None  # peste ultimul bucket finit
+
+    def _summarize(self, counter_name: str, error_name: str, histogram_name: str,
+                   group_by: Tuple[str, ...]) -> List[Dict]:
+        with self._lock:
+            counters = dict(self._counters.get(counter_name, {}))
+            errors = dict(self._counters.get(error_name, {}))
+            histograms = {key: (list(h.counts), h.total, h.count)
+                          for key, h in self._histograms.get(histogram_name, {}).items()}
+
+        def group(key: Labels) -> Tuple:
+            values = dict(key)
+            return tuple(values.get(name, '') for name in group_by)
+
+        error_totals: Dict[Tuple, float] = defaultdict(float)
+        for key, value in errors.items():
+            error_totals[group(key)] += value
+        call_totals: Dict[Tuple, float] = defaultdict(float)
+        for key, value in counters.items():
+            call_totals[group(key)] += value
+
+        buckets = self.buckets_for(histogram_name)
+        rows = []
+        for key, (counts, total, count) in histograms.items():
+            grouped = group(key)
+            calls = int(call_totals.get(grouped, count))
+            rows.append({
+                **dict(zip(group_by, grouped)),
+                'count': calls,
+                'errors': int(error_totals.get(grouped, 0)),
+                'error_rate': round(error_totals.get(grouped, 0) / calls, 4) if calls else 0.0,
+                'avg_ms': round(total / count * 1000, 2) if count else None,
+                'p50_ms': self._ms(self._quantile(buckets, counts, count, 0.5)),
+                'p95_ms': self._ms(self._quantile(buckets, counts, count, 0.95)),
+                'p99_ms': self._ms(self._quantile(buckets, counts, count, 0.99))
+            })
+        rows.sort(key=lambda row: row['count'], reverse=True)
+        return rows
+
+    @staticmethod
+    def _ms(seconds: Optional[float]) -> Optional[float]:
+        return None if seconds is None else round(seconds * 1000, 2)
+
+    def summary(self) -> Dict:
+        """Rezumat JSON: per rută, per tip de cerere Recombee și per etapă de pipeline (cuantile estimate din bucket-uri)"""
+        return {
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'routes': self._summarize('http_requests_total', 'http_request_errors_total',
+                                      'http_request_duration_seconds', ('route', 'method')),
+            'recombee': self._summarize('recombee_requests_total', 'recombee_request_errors_total',
+                                        'recombee_request_duration_seconds', ('request_type',)),
+            'pipelines': self._summarize('', '', 'pipeline_stage_duration_seconds', ('pipeline', 'stage'))
+        }
+
+
+class InstrumentedRecombeeClient:
+    """
+    Învelește un RecombeeClient și măsoară fiecare apel send() (număr, erori, latență per
+    tip de cerere); celelalte atribute sunt delegate clientului original
+    """
+
+    def __init__(self, client, registry: 'MetricsRegistry'):
+        self._client = client
+        self._registry = registry
+
+    def send(self, request):
+        with self._registry.track_upstream(type(request).__name__):
+            return self._client.send(request)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+# Registrul folosit de aplicație
+registry = MetricsRegistry()
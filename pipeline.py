@@ -0,0 +1,524 @@
+"""
+Pipeline de recomandare în două etape: generarea candidaților și re-ordonarea
+Masca pieselor excluse se calculează o singură dată; sursele de candidați (indexul pe genuri,
+vecinii acustici, filtrarea colaborativă, factorii ALS, sesiunea curentă, Recombee,
+bucket-urile de popularitate) produc fiecare cel mult `budget` rânduri neexcluse din catalog
+cu un scor, iar etapele comune (re-ordonare vectorizată, diversificare MMR, cota long tail,
+construirea rezultatelor) rulează o singură dată pe reuniunea lor.
+
+Fiecare endpoint își alege sursele, ponderile și bugetele, deci raportul cost/calitate se
+reglează fără a duplica buclele de scorare; și căile implicite (hibridul local, ALS,
+sesiunea) sunt pipeline-uri, definite în SpotifyRecommendationSystem. Durata fiecărei etape apare în rezultat, în
+span-urile de trasare și în metricile `pipeline_stage_duration_seconds`.
+"""
+
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+import metrics
+from tracing import span
+
+# Pragul de popularitate al diversificării (aceeași valoare ca în solve_long_tail_problem)
+POPULAR_THRESHOLD = 70
+
+_EMPTY = (np.zeros(0, dtype=np.int64), np.zeros(0))
+
+
+@dataclass
+class PipelineRequest:
+    """Parametrii unei cereri prin pipeline"""
+    user_id: str
+    seed_track_id: Optional[str] = None
+    num_results: int = 10
+    exclude: Set[str] = field(default_factory=set)  # ID-uri de piese excluse explicit
+    long_tail_quota: float = 0.0  # fracțiunea rezervată pieselor de nișă (pipeline-uri cu long_tail_buckets)
+
+
+@dataclass
+class PipelineResult:
+    recommendations: List[Dict]
+    timings_ms: Dict[str, float]
+    candidate_counts: Dict[str, int]
+
+
+def _top_rows(rows: np.ndarray, scores: np.ndarray, budget: Optional[int],
+              excluded: Optional[np.ndarray] = None,
+              priority: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cele mai bune `budget` rânduri neexcluse, ordonate după scor descrescător (la egalitate:
+    `priority` crescător, apoi ordinea din catalog); cu budget None se returnează toate
+    rândurile neexcluse, neordonate
+    """
+    if excluded is not None:
+        keep = ~excluded[rows]
+        rows, scores = rows[keep], scores[keep]
+        if priority is not None:
+            priority = priority[keep]
+    if budget is None:
+        return rows, scores
+    if budget <= 0:
+        return _EMPTY
+    if len(rows) > budget:
+        # Pragul celui de-al `budget`-lea scor (fără ordonare completă); egalitățile de la prag
+        # se păstrează și sunt departajate determinist mai jos
+        threshold = np.partition(scores, len(rows) - budget)[len(rows) - budget]
+        keep = scores >= threshold
+        rows, scores = rows[keep], scores[keep]
+        if priority is not None:
+            priority = priority[keep]
+    keys = (rows, -scores) if priority is None else (rows, priority, -scores)
+    order = np.lexsort(keys)[:budget]
+    return rows[order], scores[order]
+
+
+def _normalize(scores: np.ndarray, mode: Optional[str]) -> np.ndarray:
+    """Normalizarea scorurilor unei surse: 'minmax' la [0, 1], 'max' (împărțire la maxim) sau None (brute)"""
+    if mode is None:
+        return scores
+    if mode == 'max':
+        peak = scores.max()
+        return scores / peak if peak > 0 else np.ones(len(scores))
+    spread = scores.max() - scores.min()
+    return (scores - scores.min()) / spread if spread > 0 else np.ones(len(scores))
+
+
+class CandidateSource(ABC):
+    """
+    Sursă de candidați: returnează (rânduri din catalog, scoruri brute, mai mare = mai bun)
+    
+    Scorurile sunt normalizate de pipeline, per sursă, înainte de ponderare (`normalize`:
+    'minmax', 'max' sau None); cu `score_field`, scorul normalizat apare și în recomandare
+    sub acest nume. `budget` None înseamnă fără limită (ex. scorarea întregului catalog).
+    """
+
+    name = 'source'
+
+    def __init__(self, budget: Optional[int] = 200, weight: float = 1.0, normalize: Optional[str] = 'minmax',
+                 name: Optional[str] = None, score_field: Optional[str] = None):
+        if normalize not in (None, 'minmax', 'max'):
+            raise ValueError(f'Normalizare necunoscută: {normalize}')
+        self.budget = budget
+        self.weight = weight
+        self.normalize = normalize
+        self.score_field = score_field
+        if name:
+            self.name = name
+
+    @abstractmethod
+    def generate(self, system, request: PipelineRequest,
+                 excluded: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Candidații sursei; `excluded` este masca (pe rândurile catalogului) pieselor care nu pot fi recomandate"""
+
+
+class GenreSource(CandidateSource):
+    """Piesele din genurile preferate care respectă dispoziția și durata (scorul Knowledge-Based)"""
+
+    name = 'genre'
+
+    def generate(self, system, request, excluded):
+        user = system.users.get(request.user_id)
+        if not user or not user.preferred_genres:
+            return _EMPTY
+        rows, scores, _ = system.knowledge_candidates(user)
+        return _top_rows(rows, scores, self.budget, excluded)
+
+
+class SimilarTracksSource(CandidateSource):
+    """
+    Vecinii acustici ai piesei seed sau, fără seed, ai profilului de gust al utilizatorului
+    (căutare exactă: un singur produs matrice-vector pe catalogul memory-mapped);
+    cu use_taste=False sursa este goală fără seed
+    """
+
+    name = 'similar'
+
+    def __init__(self, budget: Optional[int] = 200, weight: float = 1.0, use_taste: bool = True, **options):
+        super().__init__(budget, weight, **options)
+        self.use_taste = use_taste
+
+    def generate(self, system, request, excluded):
+        catalog = system.catalog
+        seed_row = catalog.row_of.get(request.seed_track_id) if request.seed_track_id else None
+        if seed_row is not None:
+            query = np.asarray(catalog.features[seed_row])
+        elif self.use_taste and system.user_storage is not None:
+            liked = (system.user_storage.get_taste(request.user_id) or {}).get('liked') or {}
+            if not liked.get('count'):
+                return _EMPTY
+            query = np.asarray(liked['mean'], dtype=np.float64)
+        else:
+            return _EMPTY
+        scores = catalog.cosine_similarities(query)
+        return _top_rows(np.arange(len(scores)), scores, self.budget, excluded)
+
+
+class SessionSource(CandidateSource):
+    """
+    Continuarea sesiunii curente de ascultare (autoplay)
+    
+    Ultimele `history_length` ascultări (plus piesa seed, care tocmai rulează, ca cea mai
+    recentă) sunt combinate într-un singur vector de interogare: media caracteristicilor
+    normalizate, ponderată cu 0.5 ** (vechime / half_life_seconds). Catalogul este scorat o
+    singură dată față de acest vector; piesele din interogare nu sunt candidați.
+    """
+
+    name = 'session'
+
+    def __init__(self, history_length: int, half_life_seconds: float, budget: Optional[int] = 200,
+                 weight: float = 1.0, **options):
+        super().__init__(budget, weight, **options)
+        self.history_length = history_length
+        self.half_life_seconds = half_life_seconds
+
+    def generate(self, system, request, excluded):
+        catalog = system.catalog
+        now = time.time()
+        listens = system.user_storage.get_recent_listens(request.user_id, self.history_length) \
+            if system.user_storage is not None else []
+        if request.seed_track_id:
+            listens.append((request.seed_track_id, now))
+        listens = [(catalog.row_of[track_id], timestamp) for track_id, timestamp in listens
+                   if track_id in catalog.row_of]
+        if not listens:
+            return _EMPTY
+        
+        rows = np.fromiter((row for row, _ in listens), dtype=np.int64, count=len(listens))
+        ages = np.maximum(0.0, now - np.fromiter((timestamp for _, timestamp in listens),
+                                                 dtype=np.float64, count=len(listens)))
+        weights = 0.5 ** (ages / self.half_life_seconds)
+        norms = catalog.norms[rows]
+        weights = np.divide(weights, norms, out=np.zeros_like(weights), where=norms > 0)
+        query = weights @ catalog.features[rows]
+        
+        scores = catalog.cosine_similarities(query)
+        excluded = excluded.copy()
+        excluded[rows] = True
+        return _top_rows(np.arange(len(scores)), scores, self.budget, excluded)
+
+
+class CollaborativeSource(CandidateSource):
+    """Vecinii item-item din indexul local de co-apariții"""
+
+    name = 'collaborative'
+
+    def generate(self, system, request, excluded):
+        if system.user_storage is None:
+            return _EMPTY
+        ranked = system.user_storage.collaborative_scores(request.user_id, self.budget)
+        pairs = [(system.catalog.row_of[track_id], score) for track_id, score in ranked
+                 if track_id in system.catalog.row_of]
+        if not pairs:
+            return _EMPTY
+        rows, scores = zip(*pairs)
+        return np.asarray(rows, dtype=np.int64), np.asarray(scores, dtype=np.float64)
+
+
+class FactorizationSource(CandidateSource):
+    """Scorurile din factorii ALS antrenați offline (un produs matrice-vector)"""
+
+    name = 'als'
+
+    def generate(self, system, request, excluded):
+        model = system.als_model()
+        if model is None:
+            return _EMPTY
+        factors, catalog_rows = model
+        scores = factors.scores(request.user_id)
+        if scores is None:
+            return _EMPTY
+        known = catalog_rows >= 0
+        return _top_rows(catalog_rows[known], np.asarray(scores[known], dtype=np.float64), self.budget, excluded)
+
+
+class RecombeeSource(CandidateSource):
+    """Recomandările Recombee pentru utilizator; scorul descrește liniar cu poziția"""
+
+    name = 'recombee'
+
+    def generate(self, system, request, excluded):
+        if not system.recombee_client:
+            return _EMPTY
+        recommendations = system.recombee_recommend(request.user_id, self.budget)
+        rows = [system.catalog.row_of[rec['track_id']] for rec in recommendations
+                if rec.get('track_id') in system.catalog.row_of]
+        if not rows:
+            return _EMPTY
+        return np.asarray(rows, dtype=np.int64), 1.0 - np.arange(len(rows)) / len(rows)
+
+
+class PopularitySource(CandidateSource):
+    """
+    Piesele din bucket-urile de popularitate [first_bucket, last_bucket) ale genurilor relevante
+    (genurile preferate sau genul piesei seed); scor constant, deci ordinea lor finală este
+    decisă de celelalte semnale, iar ponderea este bonusul de a fi în bucket
+    """
+
+    name = 'popularity'
+
+    def __init__(self, budget: Optional[int] = 200, weight: float = 1.0, first_bucket: int = 0,
+                 last_bucket: int = 3, **options):
+        super().__init__(budget, weight, **options)
+        self.first_bucket = first_bucket
+        self.last_bucket = last_bucket
+
+    def generate(self, system, request, excluded):
+        user = system.users.get(request.user_id)
+        genres = list(user.preferred_genres) if user and user.preferred_genres else []
+        if not genres and request.seed_track_id in system.tracks:
+            genres = [system.tracks[request.seed_track_id].track_genre]
+        segments = [system.catalog.popularity_bucket_rows(genre, self.first_bucket, self.last_bucket)
+                    for genre in dict.fromkeys(genres) if genre in system.catalog.genre_code_of]
+        segments = [segment[~excluded[segment]] for segment in segments]
+        if not segments:
+            return _EMPTY
+        # Bugetul se împarte egal pe genuri; fiecare segment este sortat crescător după
+        # popularitate, deci se iau cele mai populare piese din bucket-urile cerute
+        if self.budget is None:
+            rows = np.concatenate(segments)
+        else:
+            per_genre = -(-self.budget // len(segments))
+            rows = np.concatenate([segment[::-1][:per_genre] for segment in segments])[:self.budget]
+        return rows.astype(np.int64), np.ones(len(rows))
+
+
+class Diversifier:
+    """Re-ordonarea MMR comună (SpotifyRecommendationSystem.mmr_select) pe rânduri din catalog"""
+
+    def __init__(self, diversity_weight: float = 0.3, max_genre_share: float = 0.4,
+                 max_popular_share: float = 0.5, popular_threshold: int = POPULAR_THRESHOLD):
+        self.diversity_weight = diversity_weight
+        self.max_genre_share = max_genre_share
+        self.max_popular_share = max_popular_share
+        self.popular_threshold = popular_threshold
+
+    def order(self, system, rows: np.ndarray, relevance: np.ndarray, k: int) -> np.ndarray:
+        catalog = system.catalog
+        vectors = system.diversity_vectors()[rows]
+        _, genre_codes = np.unique(catalog.genre_codes[rows], return_inverse=True)
+        popular = catalog.column('popularity')[rows] >= self.popular_threshold
+        selected = system.mmr_select(vectors, relevance, genre_codes, popular, k, self.diversity_weight,
+                                     self.max_genre_share, self.max_popular_share)
+        return np.asarray(selected, dtype=np.int64)
+
+
+class RecommendationPipeline:
+    """
+    Etapele: excludere (masca pe catalog, calculată o singură dată și transmisă surselor) ->
+    candidați (fiecare sursă, cu bugetul ei) -> re-ordonare (suma ponderată a scorurilor
+    normalizate, top `rerank_budget`) -> diversificare -> long tail -> rezultate
+    
+    prefer_user_genres: la scor egal câștigă piesele din genurile preferate, în ordinea preferințelor
+    long_tail_buckets: bucket-urile de popularitate (per gen) din care cota long tail a cererii
+    ia piese de nișă (0 = fără etapa long tail)
+    """
+
+    def __init__(self, name: str, sources: Sequence[CandidateSource], rerank_budget: int = 100,
+                 diversifier: Optional[Diversifier] = None, exclude_user_tracks: bool = True,
+                 prefer_user_genres: bool = False, long_tail_buckets: int = 0):
+        self.name = name
+        self.sources = list(sources)
+        self.rerank_budget = rerank_budget
+        self.diversifier = diversifier
+        self.exclude_user_tracks = exclude_user_tracks
+        self.prefer_user_genres = prefer_user_genres
+        self.long_tail_buckets = long_tail_buckets
+
+    def _stage(self, timings: Dict[str, float], stage: str, started: float):
+        elapsed = time.perf_counter() - started
+        timings[stage] = round(elapsed * 1000, 3)
+        metrics.registry.observe('pipeline_stage_duration_seconds', elapsed,
+                                 {'pipeline': self.name, 'stage': stage})
+
+    def _excluded_mask(self, system, request: PipelineRequest) -> np.ndarray:
+        """Masca rândurilor care nu pot fi recomandate (seed, piese excluse, văzute/apreciate/neapreciate)"""
+        excluded = set(request.exclude)
+        if request.seed_track_id:
+            excluded.add(request.seed_track_id)
+        if self.exclude_user_tracks and system.user_storage is not None:
+            mask = system.user_storage.get_exclusion_mask(request.user_id, system.catalog)
+        else:
+            mask = np.zeros(len(system.catalog), dtype=bool)
+        rows = system.catalog.row_of.rows_of(list(excluded))
+        mask[rows[rows >= 0]] = True
+        return mask
+
+    @staticmethod
+    def _genre_priority(system, request: PipelineRequest, rows: np.ndarray) -> np.ndarray:
+        """Prioritatea de departajare a rândurilor: indexul genului în preferințele utilizatorului (restul, la final)"""
+        catalog = system.catalog
+        user = system.users.get(request.user_id)
+        genres = [genre for genre in dict.fromkeys(user.preferred_genres) if genre in catalog.genre_code_of] \
+            if user and user.preferred_genres else []
+        lookup = np.full(len(catalog.genre_code_of), len(genres), dtype=np.int64)
+        for index, genre in enumerate(genres):
+            lookup[catalog.genre_code_of[genre]] = index
+        return lookup[catalog.genre_codes[rows]]
+
+    def _long_tail(self, system, request: PipelineRequest, top: np.ndarray, tail_count: int,
+                   scores: np.ndarray, excluded: np.ndarray) -> Tuple[Set[int], np.ndarray]:
+        """
+        Cota long tail: ultimele `tail_count` poziții sunt ocupate de cele mai bine scorate piese de
+        nișă din bucket-urile de popularitate ale genurilor relevante (aceleași pentru cereri
+        identice); dacă nu sunt destule, restul locurilor revin listei re-ordonate
+        """
+        user = system.users.get(request.user_id)
+        if user and user.preferred_genres:
+            genres = list(user.preferred_genres)
+        elif request.seed_track_id in system.tracks:
+            genres = [system.tracks[request.seed_track_id].track_genre]
+        else:
+            genres = []
+        head = top[:len(top) - tail_count]
+        excluded = excluded.copy()
+        excluded[head] = True
+        drawn = system.long_tail_candidates(genres, tail_count, scores, self.long_tail_buckets, excluded)
+        drawn = drawn[np.lexsort((drawn, -scores[drawn]))]
+        long_tail_rows = set(drawn.tolist())
+        fill = [row for row in top[len(head):] if row not in long_tail_rows]
+        top = np.concatenate([head, drawn, fill[:tail_count - len(drawn)]]).astype(np.int64)
+        return long_tail_rows, top
+
+    def run(self, system, request: PipelineRequest) -> PipelineResult:
+        timings: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        if request.num_results <= 0:
+            return PipelineResult([], timings, counts)
+        catalog = system.catalog
+
+        # Etapa 1: masca pieselor excluse, înaintea surselor (bugetele nu se consumă pe piese excluse)
+        started = time.perf_counter()
+        with span('exclude'):
+            excluded = self._excluded_mask(system, request)
+        self._stage(timings, 'exclude', started)
+
+        # Etapa 2: candidații fiecărei surse, normalizați
+        generated: List[Tuple[CandidateSource, np.ndarray, np.ndarray]] = []
+        for source in self.sources:
+            started = time.perf_counter()
+            with span(f'source:{source.name}'):
+                try:
+                    rows, scores = source.generate(system, request, excluded)
+                    rows = np.asarray(rows, dtype=np.int64)
+                    keep = ~excluded[rows]
+                    rows, scores = rows[keep], np.asarray(scores, dtype=np.float64)[keep]
+                except Exception as e:
+                    print(f"Eroare în sursa de candidați {source.name}: {e}")
+                    rows, scores = _EMPTY
+            self._stage(timings, f'source:{source.name}', started)
+            counts[source.name] = len(rows)
+            if len(rows):
+                generated.append((source, rows, _normalize(scores, source.normalize)))
+
+        # Etapa 3: reuniunea candidaților (mască pe catalog), matricea scorurilor (candidați x surse)
+        # și scorul final ponderat, acumulat sursă cu sursă
+        started = time.perf_counter()
+        with span('rerank'):
+            candidates = np.zeros(len(catalog), dtype=bool)
+            for _, rows, _ in generated:
+                candidates[rows] = True
+            candidate_rows = np.flatnonzero(candidates)
+            position_of = np.full(len(catalog), -1, dtype=np.int64)
+            position_of[candidate_rows] = np.arange(len(candidate_rows))
+            source_scores = np.full((len(candidate_rows), len(generated)), np.nan)
+            final = np.zeros(len(candidate_rows))
+            for column, (source, rows, normalized) in enumerate(generated):
+                positions = position_of[rows]
+                source_scores[positions, column] = normalized
+                final[positions] += source.weight * normalized
+
+            priority = self._genre_priority(system, request, candidate_rows) if self.prefer_user_genres else None
+            top, top_scores = _top_rows(candidate_rows, final, max(self.rerank_budget, request.num_results),
+                                        priority=priority)
+        self._stage(timings, 'rerank', started)
+        counts['candidates'] = len(candidate_rows)
+        counts['reranked'] = len(top)
+
+        # Etapa 4: diversificarea (opțională) a listei re-ordonate
+        started = time.perf_counter()
+        with span('diversify'):
+            if self.diversifier is not None and len(top):
+                relevance = _normalize(top_scores, 'minmax')
+                top = top[self.diversifier.order(system, top, relevance, request.num_results)]
+            else:
+                top = top[:request.num_results]
+        self._stage(timings, 'diversify', started)
+
+        # Etapa 5: cota long tail (doar pentru pipeline-urile cu long_tail_buckets)
+        long_tail_rows: Set[int] = set()
+        quota = max(0.0, min(1.0, request.long_tail_quota))
+        tail_count = min(len(top), int(round(quota * request.num_results)))
+        if self.long_tail_buckets and tail_count:
+            started = time.perf_counter()
+            with span('long_tail'):
+                scores = np.zeros(len(catalog))
+                scores[candidate_rows] = final
+                long_tail_rows, top = self._long_tail(system, request, top, tail_count, scores, excluded)
+            self._stage(timings, 'long_tail', started)
+
+        # Etapa 6: dicționarele rezultatelor, doar pentru piesele returnate
+        started = time.perf_counter()
+        with span('build'):
+            recommendations = []
+            for row in top:
+                position = position_of[row]
+                recommendation = system.track_to_dict(system.tracks.at(row))
+                if row in long_tail_rows:
+                    recommendation['long_tail'] = True
+                contributions = {}
+                if position >= 0:
+                    for (source, _, _), score in zip(generated, source_scores[position]):
+                        if np.isnan(score):
+                            continue
+                        contributions[source.name] = round(float(score), 4)
+                        if source.score_field:
+                            recommendation[source.score_field] = float(score)
+                recommendation['pipeline_scores'] = contributions
+                recommendation['final_score'] = float(final[position]) if position >= 0 else 0.0
+                if len(contributions) > 1:
+                    recommendation['source'] = 'hybrid'
+                else:
+                    # Piesele long tail fără semnal de la nicio sursă păstrează numele primei surse
+                    recommendation['source'] = next(iter(contributions), self.sources[0].name)
+                recommendations.append(recommendation)
+        self._stage(timings, 'build', started)
+
+        return PipelineResult(recommendations, timings, counts)
+
+
+def default_pipelines() -> Dict[str, RecommendationPipeline]:
+    """
+    Pipeline-urile predefinite, per caz de utilizare (sursele și bugetele sunt reglabile aici)
+
+    hybrid        - vecini acustici + genuri + colaborativ + bonus pentru nișă, diversificat
+    content       - doar vecinii acustici (piesa seed sau profilul de gust)
+    knowledge     - doar genurile preferate, cu dispoziția și durata
+    collaborative - factorii ALS + co-apariții (fără Recombee), cu diversificare ușoară
+    discovery     - Recombee + nișa genurilor preferate, diversificat puternic
+    """
+    return {
+        'hybrid': RecommendationPipeline('hybrid', [
+            SimilarTracksSource(budget=200, weight=0.6),
+            GenreSource(budget=300, weight=0.4),
+            CollaborativeSource(budget=100, weight=0.3),
+            PopularitySource(budget=100, weight=0.1, first_bucket=0, last_bucket=3)
+        ], rerank_budget=100, diversifier=Diversifier()),
+        'content': RecommendationPipeline('content', [
+            SimilarTracksSource(budget=100)
+        ], rerank_budget=50),
+        'knowledge': RecommendationPipeline('knowledge', [
+            GenreSource(budget=500)
+        ], rerank_budget=50),
+        'collaborative': RecommendationPipeline('collaborative', [
+            FactorizationSource(budget=200, weight=0.6),
+            CollaborativeSource(budget=200, weight=0.4)
+        ], rerank_budget=50, diversifier=Diversifier(diversity_weight=0.15)),
+        'discovery': RecommendationPipeline('discovery', [
+            RecombeeSource(budget=50, weight=0.5),
+            PopularitySource(budget=200, weight=0.5, first_bucket=0, last_bucket=3),
+            SimilarTracksSource(budget=200, weight=0.3)
+        ], rerank_budget=100, diversifier=Diversifier(diversity_weight=0.5))
+    }
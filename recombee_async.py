@@ -0,0 +1,120 @@
+"""
+Client Recombee asincron
+Trimite aceleași obiecte de cerere ca SDK-ul oficial (RecommendItemsToUser, Batch etc.),
+semnate HMAC la fel ca RecombeeClient, dar printr-un client HTTP non-blocant (httpx),
+astfel încât un singur proces să poată avea multe cereri în curs fără fire blocate.
+"""
+
+import hmac
+import json
+import time
+from hashlib import sha1
+from typing import Optional
+from urllib.parse import quote
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    print("httpx nu este instalat. Modul asincron folosește clientul Recombee sincron.")
+
+try:
+    from recombee_api_client.api_client import RecombeeClient
+    from recombee_api_client.api_requests import Batch
+    from recombee_api_client.exceptions import ResponseException, ApiTimeoutException
+    from recombee_api_client.utils.serialize_to_json import serialize_to_json
+    RECOMBEE_AVAILABLE = True
+except ImportError:
+    RECOMBEE_AVAILABLE = False
+
+
+class AsyncRecombeeClient:
+    """Variantă asincronă a RecombeeClient (aceeași semnare, același format al răspunsurilor)"""
+
+    def __init__(self, database_id: str, token: str, base_uri: str = 'rapi.recombee.com',
+                 protocol: str = 'https', max_connections: int = 200):
+        self.database_id = database_id
+        self.token = token
+        self.base_uri = base_uri
+        self.protocol = protocol
+        self.max_connections = max_connections
+        self._http: Optional['httpx.AsyncClient'] = None
+
+    @classmethod
+    def from_sync_client(cls, client, **kwargs) -> 'AsyncRecombeeClient':
+        """Construiește clientul asincron cu aceeași bază de date, token și regiune ca `client`"""
+        return cls(client.database_id, client.token, base_uri=client.base_uri,
+                   protocol=client.protocol, **kwargs)
+
+    def _http_client(self) -> 'httpx.AsyncClient':
+        # Creat la prima cerere, ca să aparțină buclei de evenimente a serverului
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                headers={'User-Agent': 'recombee-python-api-client (async)'}
+            )
+        return self._http
+
+    async def send(self, request):
+        """Trimite o cerere Recombee și returnează răspunsul JSON decodat"""
+        batch_max_size = RecombeeClient.BATCH_MAX_SIZE
+        if isinstance(request, Batch) and len(request.requests) > batch_max_size:
+            responses = []
+            for start in range(0, len(request.requests), batch_max_size):
+                responses.extend(await self.send(Batch(request.requests[start:start + batch_max_size])))
+            return responses
+
+        uri = self._sign_url(request.path + self._query_string(request))
+        protocol = 'https' if request.ensure_https else self.protocol
+        url = f'{protocol}://{self.base_uri}{uri}'
+
+        kwargs = {'timeout': request.timeout / 1000}
+        if request.method != 'get':
+            kwargs['content'] = json.dumps(self._body_parameters(request))
+            kwargs['headers'] = {'Content-Type': 'application/json'}
+
+        try:
+            response = await self._http_client().request(request.method.upper(), url, **kwargs)
+        except httpx.TimeoutException:
+            raise ApiTimeoutException(request)
+
+        if response.status_code not in (200, 201):
+            raise ResponseException(request, response.status_code, response.text)
+        return response.json()
+
+    async def aclose(self):
+        """Închide conexiunile HTTP păstrate deschise"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    @staticmethod
+    def _body_parameters(request) -> dict:
+        params = request.get_body_parameters()
+        for name, value in request.additional_body_parameters.items():
+            params[name] = serialize_to_json(value)
+        return params
+
+    @staticmethod
+    def _query_string(request) -> str:
+        query_params = request.get_query_parameters()
+        for name, value in request.additional_query_parameters.items():
+            query_params[name] = serialize_to_json(value)
+
+        parts = []
+        for name, value in query_params.items():
+            if isinstance(value, list):
+                formatted = ','.join(quote(str(v)) for v in value)
+            else:
+                formatted = quote(str(value))
+            parts.append(f'{name}={formatted}')
+        return '?' + '&'.join(parts) if parts else ''
+
+    def _sign_url(self, request_part: str) -> str:
+        """Semnătura HMAC-SHA1 a URI-ului, ca în RecombeeClient (valabilă 30 de secunde)"""
+        uri = '/' + self.database_id + request_part
+        uri += ('&' if '?' in uri else '?') + f'hmac_timestamp={int(time.time())}'
+        sign = hmac.new(self.token.encode(), uri.encode(), sha1).hexdigest()
+        return f'{uri}&hmac_sign={sign}'
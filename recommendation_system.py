@@ -3,12 +3,31 @@ Sistem de Recomandare Muzică - Spotify Dataset
 Integrare cu Recombee pentru Content-Based și Knowledge-Based Filtering
 """
 
+import os
 import csv
+import asyncio
 import json
 import math
-from typing import List, Dict, Optional
+import time
+import threading
+from typing import List, Dict, Optional, Set
 from dataclasses import dataclass
 from collections import defaultdict
+from collections.abc import Mapping
+
+import numpy as np
+
+from catalog_index import CatalogIndex, GenreTracks, POPULARITY_BUCKETS, FEATURE_NAMES
+from als import ALSFactors, DEFAULT_FACTORS_DIR
+from pipeline import (
+    CollaborativeSource, FactorizationSource, GenreSource, PipelineRequest, PipelineResult,
+    RecommendationPipeline, SessionSource, SimilarTracksSource, default_pipelines
+)
+from dataset_summary import DatasetSummary
+from recombee_async import AsyncRecombeeClient, HTTPX_AVAILABLE
+import metrics
+from tracing import span, traced
+from startup import report as startup_report
 
 # Pentru integrarea cu Recombee (necesită instalarea: pip install recombee)
 try:
@@ -17,13 +36,44 @@ try:
         AddItem, SetItemValues, AddUser, SetUserValues, RecommendItemsToUser,
         AddUserProperty, ListUserProperties, DeleteUserProperty,
         AddDetailView, AddPurchase, AddRating, AddBookmark, MergeUsers,
-        RecommendItemsToItem, AddItemProperty, ListItemProperties
+        RecommendItemsToItem, AddItemProperty, ListItemProperties, Batch
     )
     RECOMBEE_AVAILABLE = True
 except ImportError:
     RECOMBEE_AVAILABLE = False
     print("Recombee nu este instalat. Folosim implementare locală.")
 
+# Ponderile componentelor în recomandarea hibridă locală
+HYBRID_CONTENT_WEIGHT = 0.6
+HYBRID_KNOWLEDGE_WEIGHT = 0.4
+# Componenta colaborativă locală (scoruri normalizate la [0, 1]), adăugată când există semnal
+HYBRID_COLLABORATIVE_WEIGHT = 0.3
+# Câți candidați colaborativi intră în scorarea hibridă locală
+HYBRID_COLLABORATIVE_CANDIDATES = 100
+
+# Cât de mult îndepărtează media pieselor neapreciate interogarea profilului de gust
+TASTE_DISLIKE_WEIGHT = 0.5
+
+# Recomandarea de sesiune (autoplay): câte ascultări recente intră în interogare și timpul de
+# înjumătățire al ponderii lor (o ascultare de acum 15 minute contează pe jumătate)
+SESSION_HISTORY_LENGTH = 20
+SESSION_HALF_LIFE_SECONDS = 15 * 60
+
+# Câte piese se cer în plus de la Recombee pentru utilizatorii ale căror excluderi nu încap în
+# filtrul ReQL (RECOMBEE_FILTER_MAX_TRACKS); cele rămase în afara filtrului sunt eliminate local
+RECOMBEE_OVERFETCH_MAX = 50
+
+# Bucket-urile de popularitate (per gen) considerate long tail: cele mai puțin populare 30%
+LONG_TAIL_BUCKETS = 3
+
+# Condițiile pe caracteristici pentru fiecare dispoziție (min_/max_ + numele caracteristicii)
+MOOD_CONDITIONS = {
+    'happy': {'min_valence': 0.6, 'min_energy': 0.5},
+    'sad': {'max_valence': 0.4, 'max_energy': 0.6},
+    'energetic': {'min_energy': 0.7, 'min_tempo': 120},
+    'calm': {'max_energy': 0.4, 'min_acousticness': 0.5}
+}
+
 
 @dataclass
 class Track:
@@ -50,6 +100,33 @@ class Track:
     track_genre: str
 
 
+class TrackTable(Mapping):
+    """
+    ID piesă -> Track, citit la cerere din rândul catalogului (coloanele memory-mapped)
+    Piesele nu sunt ținute ca obiecte în memoria fiecărui worker; un Track este creat doar
+    pentru piesa cerută.
+    """
+
+    def __init__(self, catalog: CatalogIndex):
+        self._catalog = catalog
+
+    def __getitem__(self, track_id: str) -> Track:
+        return Track(**self._catalog.record(self._catalog.row_of[track_id]))
+
+    def __contains__(self, track_id) -> bool:
+        return track_id in self._catalog.row_of
+
+    def __len__(self) -> int:
+        return len(self._catalog)
+
+    def __iter__(self):
+        return iter(self._catalog.row_of)
+
+    def at(self, row: int) -> Track:
+        """Piesa de pe un rând din catalog"""
+        return Track(**self._catalog.record(row))
+
+
 @dataclass
 class UserProfile:
     """Profilul utilizatorului cu preferințe"""
@@ -67,7 +144,9 @@ class SpotifyRecommendationSystem:
     def __init__(self, csv_file: str, recombee_db: Optional[str] = None, 
                  recombee_private_token: Optional[str] = None,
                  recombee_public_token: Optional[str] = None,
-                 recombee_region: Optional[str] = None):
+                 recombee_region: Optional[str] = None,
+                 catalog_cache_dir: Optional[str] = '.catalog_cache',
+                 als_factors_dir: Optional[str] = DEFAULT_FACTORS_DIR):
         """
         Inițializează sistemul de recomandare
         
@@ -77,59 +156,119 @@ class SpotifyRecommendationSystem:
             recombee_private_token: Token privat Recombee (opțional, pentru server-side)
             recombee_public_token: Token public Recombee (opțional, pentru client-side)
             recombee_region: Regiunea Recombee (opțional, ex: 'eu-west')
+            catalog_cache_dir: Directorul cu indexul numeric memory-mapped al catalogului
+                (None = indexul este ținut doar în memoria procesului)
+            als_factors_dir: Directorul cu factorii ALS antrenați offline (`python als.py train`)
         """
-        self.tracks: Dict[str, Track] = {}
+        # Vederi peste catalog (ID -> Track, gen -> ID-uri), create la încărcarea dataset-ului
+        self.tracks: Mapping = {}
         self.users: Dict[str, UserProfile] = {}
-        self.genre_tracks: defaultdict = defaultdict(list)
+        self.genre_tracks: Mapping = {}
         self.csv_file = csv_file
-        
-        # Inițializare Recombee (dacă este disponibil)
-        self.recombee_client = None
-        if RECOMBEE_AVAILABLE and recombee_db:
-            try:
-                from recombee_api_client.api_client import Region
-                
-                # Pentru operațiuni server-side, folosim private token
-                # Public token este doar pentru citire/recomandări client-side
-                # Private token poate face toate operațiunile
-                token = recombee_private_token or recombee_public_token
-                
-                if token:
-                    # Convertim regiunea string în enum Region dacă este necesar
-                    region_enum = None
-                    if recombee_region:
-                        region_upper = recombee_region.upper().replace('-', '_')
-                        if hasattr(Region, region_upper):
-                            region_enum = getattr(Region, region_upper)
-                        else:
-                            # Încearcă să găsească regiunea similară
-                            for attr in dir(Region):
-                                if not attr.startswith('_') and region_upper in attr.upper():
-                                    region_enum = getattr(Region, attr)
-                                    break
-                    
-                    # Inițializează clientul
-                    if region_enum:
-                        self.recombee_client = RecombeeClient(
-                            database_id=recombee_db,
-                            token=token,
-                            region=region_enum
-                        )
-                    else:
-                        self.recombee_client = RecombeeClient(
-                            database_id=recombee_db,
-                            token=token
-                        )
-                    print(f"✓ Conectat la Recombee: {recombee_db} (region: {recombee_region or 'default'})")
-            except Exception as e:
-                print(f"Eroare la conectarea la Recombee: {e}")
-                import traceback
-                traceback.print_exc()
+        self.catalog_cache_dir = catalog_cache_dir
+        self.catalog: Optional[CatalogIndex] = None
+        self.dataset_summary = DatasetSummary()
+        self.catalog_version = 0  # Crește la fiecare modificare a catalogului (pentru validatori de cache)
+        self._catalog_token = ''
+        self._diversity_cache = None  # (catalog, vectori) pentru solve_long_tail_problem
+        self.user_storage = None  # Stocarea utilizatorilor (profilurile de gust), setată de aplicație
+        # Măștile dispoziție/durată, aliniate cu catalog.genre_order (genul g = o felie contiguă)
+        self._mood_masks: Dict[str, np.ndarray] = {}
+        self._duration_masks: Dict[str, np.ndarray] = {}
+        # Factorii ALS și rândurile lor din catalog: (factori, catalog, rânduri), încărcați la prima utilizare
+        self.als_factors_dir = als_factors_dir
+        self._als_state = None
+        # Pipeline-urile de recomandare (surse de candidați + re-ordonare), per caz de utilizare,
+        # inclusiv cele ale căilor implicite (hibridul local, ALS, sesiunea)
+        self.pipelines = default_pipelines()
+        self.pipelines.update(self._builtin_pipelines())
+        
+        # Clientul Recombee este creat la primul acces (vezi proprietatea recombee_client)
+        self._recombee_settings = (recombee_db, recombee_private_token, recombee_public_token, recombee_region)
+        self._recombee_client = None
+        self._recombee_connected = False
+        self._recombee_lock = threading.Lock()
+        self._async_recombee_client = None
         
         self._load_dataset()
     
+    @property
+    def recombee_client(self):
+        """Clientul Recombee sincron (creat la primul acces), sau None dacă nu este configurat"""
+        if not self._recombee_connected:
+            with self._recombee_lock:
+                if not self._recombee_connected:
+                    started = time.perf_counter()
+                    self._recombee_client = self._connect_recombee(*self._recombee_settings)
+                    self._recombee_connected = True
+                    if self._recombee_client is not None:
+                        startup_report.record('recombee_client', time.perf_counter() - started)
+        return self._recombee_client
+    
+    def _connect_recombee(self, recombee_db, recombee_private_token, recombee_public_token, recombee_region):
+        """Creează clientul Recombee din configurație (None dacă SDK-ul sau credențialele lipsesc)"""
+        if not (RECOMBEE_AVAILABLE and recombee_db):
+            return None
+        try:
+            from recombee_api_client.api_client import Region
+            
+            # Pentru operațiuni server-side, folosim private token
+            # Public token este doar pentru citire/recomandări client-side
+            # Private token poate face toate operațiunile
+            token = recombee_private_token or recombee_public_token
+            
+            if token:
+                # Convertim regiunea string în enum Region dacă este necesar
+                region_enum = None
+                if recombee_region:
+                    region_upper = recombee_region.upper().replace('-', '_')
+                    if hasattr(Region, region_upper):
+                        region_enum = getattr(Region, region_upper)
+                    else:
+                        # Încearcă să găsească regiunea similară
+                        for attr in dir(Region):
+                            if not attr.startswith('_') and region_upper in attr.upper():
+                                region_enum = getattr(Region, attr)
+                                break
+                
+                # Inițializează clientul
+                if region_enum:
+                    client = RecombeeClient(
+                        database_id=recombee_db,
+                        token=token,
+                        region=region_enum
+                    )
+                else:
+                    client = RecombeeClient(
+                        database_id=recombee_db,
+                        token=token
+                    )
+                print(f"✓ Conectat la Recombee: {recombee_db} (region: {recombee_region or 'default'})")
+                # Fiecare apel send() este măsurat (număr, erori, latență per tip de cerere)
+                return metrics.InstrumentedRecombeeClient(client, metrics.registry)
+        except Exception as e:
+            print(f"Eroare la conectarea la Recombee: {e}")
+            import traceback
+            traceback.print_exc()
+        return None
+    
     def _load_dataset(self):
-        """Încarcă dataset-ul din CSV"""
+        """
+        Încarcă catalogul: din cache-ul memory-mapped dacă acesta corespunde fișierului CSV,
+        altfel din CSV (o singură dată, apoi cache-ul este scris pentru ceilalți workeri)
+        """
+        # Identifică fișierul sursă, ca validatorii să fie aceiași în toți workerii
+        stat = os.stat(self.csv_file)
+        self._catalog_token = f'{stat.st_size:x}{stat.st_mtime_ns:x}'
+        
+        # Caracteristicile, coloanele text și indexul pe genuri, partajate între workeri prin mmap
+        self._set_catalog(CatalogIndex.load_or_build(self._read_csv_tracks, self.csv_file,
+                                                     self.catalog_cache_dir))
+        self.dataset_summary.rebuild(self.catalog)
+    
+    def _read_csv_tracks(self) -> Dict[str, Track]:
+        """Piesele din fișierul CSV (folosite doar pentru construirea indexului)"""
+        tracks: Dict[str, Track] = {}
         with open(self.csv_file, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
@@ -155,9 +294,61 @@ class SpotifyRecommendationSystem:
                     time_signature=int(row['time_signature']),
                     track_genre=row['track_genre']
                 )
-                self.tracks[track.track_id] = track
-                self.genre_tracks[track.track_genre].append(track.track_id)
+                tracks[track.track_id] = track
+        return tracks
+    
+    def _set_catalog(self, catalog: CatalogIndex):
+        """Folosește un nou index al catalogului (vederile și măștile de filtrare sunt legate de el)"""
+        self.catalog = catalog
+        self.tracks = TrackTable(catalog)
+        self.genre_tracks = GenreTracks(catalog)
+        self._build_filter_masks()
+    
+    @property
+    def catalog_etag(self) -> str:
+        """Validator pentru răspunsurile care depind doar de catalog"""
+        return f'catalog-{self._catalog_token}-{self.catalog_version}'
+    
+    def add_track(self, track: Track):
+        """Adaugă (sau înlocuiește) o singură piesă în catalog; vezi add_tracks pentru cost"""
+        self.add_tracks([track])
+    
+    def add_tracks(self, tracks: List[Track]):
+        """
+        Adaugă (sau înlocuiește) piese în catalog la runtime: operație rară, de administrare
+        
+        Indexul numeric (CatalogIndex) și măștile de filtrare sunt reconstruite o singură dată
+        pentru tot lotul, în O(N) pentru întregul catalog, deci importurile se fac în loturi, nu
+        piesă cu piesă. Noul obiect catalog invalidează tot ce este legat de cel vechi (vectorii
+        de diversitate, rândurile factorilor ALS, bitset-urile de excludere ale utilizatorilor),
+        care se reconstruiesc la prima utilizare. Doar extremele din rezumatul dataset-ului se
+        actualizează incremental pentru piesele noi.
+        """
+        if not tracks:
+            return
+        
+        # Catalogul memory-mapped este doar pentru citire: piesele existente sunt citite din
+        # rândurile lui, iar noul index rămâne în memoria procesului
+        merged = {track_id: self.tracks.at(row) for row, track_id in enumerate(self.catalog.track_ids.tolist())}
+        added, replaced = [], False
+        for track in tracks:
+            if track.track_id in merged:
+                replaced = True
+            else:
+                added.append(track)
+            merged[track.track_id] = track
+        
+        self._set_catalog(CatalogIndex.build(merged))
+        
+        if replaced:
+            # O piesă înlocuită putea fi un extrem, deci extremele se recalculează
+            self.dataset_summary.rebuild(self.catalog)
+        else:
+            for track in added:
+                self.dataset_summary.add_track(track, self.catalog)
+        self.catalog_version += 1
     
+    @traced('create_user_profile')
     def create_user_profile(self, user_id: str, preferred_genres: List[str],
                           mood: str, listening_time: str,
                           energy_level: float = 0.5, danceability: float = 0.5):
@@ -185,17 +376,19 @@ class SpotifyRecommendationSystem:
         # Adaugă utilizatorul în Recombee (dacă este disponibil)
         if self.recombee_client:
             try:
-                self.recombee_client.send(AddUser(user_id))
-                self.recombee_client.send(SetUserValues(
-                    user_id,
-                    {
-                        'preferred_genres': json.dumps(preferred_genres),
-                        'mood': mood,
-                        'listening_time': listening_time,
-                        'energy_level': energy_level,
-                        'danceability': danceability
-                    }
-                ))
+                with span('recombee_add_user'):
+                    self.recombee_client.send(AddUser(user_id))
+                with span('recombee_set_user_values'):
+                    self.recombee_client.send(SetUserValues(
+                        user_id,
+                        {
+                            'preferred_genres': json.dumps(preferred_genres),
+                            'mood': mood,
+                            'listening_time': listening_time,
+                            'energy_level': energy_level,
+                            'danceability': danceability
+                        }
+                    ))
             except Exception as e:
                 print(f"Eroare la adăugarea utilizatorului în Recombee: {e}")
     
@@ -320,7 +513,7 @@ class SpotifyRecommendationSystem:
         interactions = user_data.get('interactions', [])
         if interactions:
             user_properties['last_interaction'] = interactions[-1].get('timestamp')
-            user_properties['interaction_count'] = len(interactions)
+            user_properties['interaction_count'] = stats.get('total_interactions', len(interactions))
         
         # Determine recommendation type based on liked tracks
         liked_count = len(user_data.get('liked_tracks', []))
@@ -331,10 +524,15 @@ class SpotifyRecommendationSystem:
         else:
             user_properties['recommendation_type'] = 'content-based'
         
-        # Calculate average music characteristics from liked tracks
-        if user_data.get('liked_tracks'):
-            # This would require access to track data to calculate averages
-            # For now, use the user's preferences
+        # Media caracteristicilor pieselor apreciate, din profilul de gust ținut la zi incremental
+        liked_taste = (user_data.get('taste') or {}).get('liked') or {}
+        if liked_taste.get('count'):
+            mean = liked_taste['mean']
+            user_properties['avg_energy'] = mean[FEATURE_NAMES.index('energy')]
+            user_properties['avg_danceability'] = mean[FEATURE_NAMES.index('danceability')]
+            user_properties['avg_popularity'] = mean[FEATURE_NAMES.index('popularity')] * 100.0
+        elif user_data.get('liked_tracks'):
+            # Piesele apreciate nu sunt în catalogul local: folosim preferințele declarate
             user_properties['avg_energy'] = user_properties.get('energy_level', 0.5)
             user_properties['avg_danceability'] = user_properties.get('danceability', 0.5)
             user_properties['avg_popularity'] = 50.0  # Default
@@ -494,6 +692,79 @@ class SpotifyRecommendationSystem:
             recomm_id=recomm_id
         )
     
+    def _build_interaction_request(self, user_id: str, track_id: str, interaction_type: str,
+                                   recomm_id: str = None, metadata: Dict = None):
+        """
+        Construiește cererea Recombee pentru o interacțiune (aceeași corespondență ca în
+        send_interaction_to_recombee), sau None pentru tipurile care nu se trimit
+        """
+        common_params = {'cascade_create': True}  # Creează utilizatorul/piesa dacă nu există
+        if recomm_id:
+            common_params['recomm_id'] = recomm_id
+        
+        if interaction_type in ('detail_view', 'listen'):
+            duration = (metadata or {}).get('duration', 30)
+            return AddDetailView(user_id, track_id, duration=duration, **common_params)
+        if interaction_type == 'like':
+            return AddPurchase(user_id, track_id, **common_params)
+        if interaction_type == 'dislike':
+            return AddRating(user_id, track_id, rating=-1.0, **common_params)
+        if interaction_type == 'bookmark':
+            return AddBookmark(user_id, track_id, **common_params)
+        return None
+    
+    def _interaction_batch(self, user_id: str, interactions: List[Dict]):
+        """Lotul Batch cu cererile Recombee ale interacțiunilor, sau None dacă nu e nimic de trimis"""
+        requests = []
+        for interaction in interactions:
+            recombee_request = self._build_interaction_request(
+                user_id, interaction['track_id'], interaction['interaction_type'],
+                recomm_id=interaction.get('recomm_id'), metadata=interaction.get('metadata')
+            )
+            if recombee_request is not None:
+                requests.append(recombee_request)
+        # cascade_create pe fiecare interacțiune face inutile apelurile AddUser/AddItem
+        # (clientul împarte singur loturile mai mari decât limita Recombee)
+        return Batch(requests) if requests else None
+    
+    @staticmethod
+    def _count_accepted(user_id: str, responses: List[Dict]) -> int:
+        """Numărul de cereri acceptate dintr-un răspuns Batch (le raportează pe cele respinse)"""
+        accepted = 0
+        for response in responses:
+            if 200 <= response.get('code', 0) < 300:
+                accepted += 1
+            else:
+                print(f"✗ Interacțiune respinsă în lot: {response.get('json')}")
+        print(f"✓ Lot de interacțiuni trimis: {user_id} -> {accepted}/{len(responses)} acceptate")
+        return accepted
+    
+    def send_interactions_batch(self, user_id: str, interactions: List[Dict]) -> int:
+        """
+        Trimite mai multe interacțiuni către Recombee într-o singură cerere Batch
+        
+        Args:
+            user_id: ID-ul utilizatorului
+            interactions: Listă de dicționare cu track_id, interaction_type,
+                          recomm_id și metadata (opționale)
+        
+        Returns:
+            Numărul de interacțiuni acceptate de Recombee
+        """
+        if not self.recombee_client:
+            print("Recombee nu este disponibil pentru lotul de interacțiuni")
+            return 0
+        
+        batch = self._interaction_batch(user_id, interactions)
+        if batch is None:
+            return 0
+        
+        try:
+            return self._count_accepted(user_id, self.recombee_client.send(batch))
+        except Exception as e:
+            print(f"✗ Eroare la trimiterea lotului de interacțiuni: {e}")
+            return 0
+    
     def merge_anonymous_user(self, anonymous_user_id: str, logged_in_user_id: str):
         """
         Îmbină un utilizator anonim cu unul autentificat
@@ -512,6 +783,37 @@ class SpotifyRecommendationSystem:
         except Exception as e:
             print(f"✗ Eroare la îmbinarea utilizatorilor: {e}")
     
+    def _similar_tracks_request(self, track_id: str, user_id: str = None,
+                                num_recommendations: int = 10, scenario: str = 'similar-tracks'):
+        """
+        Cererea RecommendItemsToItem pentru o piesă; cascade_create creează piesa și utilizatorul
+        dacă lipsesc, deci nu mai sunt necesare apelurile AddItem/AddUser separate
+        """
+        recommend_params = {
+            'item_id': track_id,
+            'count': num_recommendations + (self._overfetch_count(user_id) if user_id else 0),
+            'scenario': scenario,
+            'return_properties': True,
+            'cascade_create': True
+        }
+        
+        # Adaugă utilizatorul pentru personalizare dacă este disponibil; piesele deja văzute,
+        # apreciate sau neapreciate de el sunt filtrate direct de Recombee
+        if user_id:
+            recommend_params['target_user_id'] = user_id
+            filter_expr = self._user_exclusion_filter(user_id)
+            if filter_expr:
+                recommend_params['filter'] = filter_expr
+        
+        return RecommendItemsToItem(**recommend_params)
+    
+    def _parse_similar_tracks_response(self, response: Dict, seed_track_id: str) -> List[Dict]:
+        """Transformă răspunsul RecommendItemsToItem în lista de recomandări"""
+        return self._parse_recomms(
+            response, 'recombee_similar', 'Similar to liked track',
+            extra={'based_on_track': seed_track_id}  # Piesa pe care se bazează recomandarea
+        )
+    
     def recombee_recommend_similar_tracks(self, track_id: str, user_id: str = None, 
                                         num_recommendations: int = 10, scenario: str = 'similar-tracks') -> List[Dict]:
         """
@@ -529,110 +831,18 @@ class SpotifyRecommendationSystem:
             return []
         
         try:
-            # Asigură-te că piesa există în Recombee
-            try:
-                self.recombee_client.send(AddItem(track_id))
-                print(f"✓ Piesă adăugată în Recombee: {track_id}")
-            except Exception as e:
-                if "already exists" not in str(e):
-                    print(f"Eroare la adăugarea piesei în Recombee: {e}")
-            
-            # Parametri pentru recomandări similare
-            recommend_params = {
-                'item_id': track_id,
-                'count': num_recommendations,
-                'scenario': scenario,
-                'return_properties': True,
-                'cascade_create': True
-            }
-            
-            # Adaugă utilizatorul pentru personalizare dacă este disponibil
-            if user_id:
-                recommend_params['target_user_id'] = user_id
-                # Asigură-te că utilizatorul există
-                try:
-                    self.recombee_client.send(AddUser(user_id))
-                except Exception as e:
-                    if "already exists" not in str(e):
-                        print(f"Eroare la adăugarea utilizatorului: {e}")
-            
             print(f"🎵 Cerere recomandări similare cu {track_id} pentru {user_id or 'anonim'}")
             
             # Obține recomandări similare de la Recombee
-            response = self.recombee_client.send(RecommendItemsToItem(**recommend_params))
+            response = self.recombee_client.send(
+                self._similar_tracks_request(track_id, user_id, num_recommendations, scenario)
+            )
             
-            recommendations = []
-            recomm_id = response.get('recommId')  # ID-ul recomandării pentru tracking
+            print(f"📦 Recombee răspuns similare: {len(response.get('recomms', []))} recomandări, recommId: {response.get('recommId')}")
             
-            print(f"📦 Recombee răspuns similare: {len(response.get('recomms', []))} recomandări, recommId: {recomm_id}")
-            
-            for rec in response.get('recomms', []):
-                similar_track_id = rec['id']
-                rec_values = rec.get('values', {})
-                
-                # Încearcă să obții detalii din cache local mai întâi
-                if similar_track_id in self.tracks:
-                    track = self.tracks[similar_track_id]
-                    recommendation = {
-                        'track_id': track.track_id,
-                        'track_name': track.track_name,
-                        'artists': track.artists,
-                        'album_name': track.album_name,
-                        'track_genre': track.track_genre,
-                        'popularity': track.popularity,
-                        'duration_ms': track.duration_ms,
-                        'explicit': track.explicit,
-                        'danceability': track.danceability,
-                        'energy': track.energy,
-                        'key': track.key,
-                        'loudness': track.loudness,
-                        'mode': track.mode,
-                        'speechiness': track.speechiness,
-                        'acousticness': track.acousticness,
-                        'instrumentalness': track.instrumentalness,
-                        'liveness': track.liveness,
-                        'valence': track.valence,
-                        'tempo': track.tempo,
-                        'time_signature': track.time_signature,
-                        'source': 'recombee_similar',
-                        'source_label': f'Similar to liked track',
-                        'final_score': rec_values.get('rating', 0.8),
-                        'recomm_id': recomm_id,
-                        'recombee_score': rec_values.get('score', 0.0),
-                        'based_on_track': track_id  # Piesa pe care se bazează recomandarea
-                    }
-                else:
-                    # Folosește proprietățile returnate de Recombee sau valori default
-                    recommendation = {
-                        'track_id': similar_track_id,
-                        'track_name': rec_values.get('track_name', f'Track {similar_track_id}'),
-                        'artists': rec_values.get('artists', 'Unknown Artist'),
-                        'album_name': rec_values.get('album_name', 'Unknown Album'),
-                        'track_genre': rec_values.get('track_genre', 'Unknown'),
-                        'popularity': rec_values.get('popularity', 50),
-                        'duration_ms': rec_values.get('duration_ms', 180000),
-                        'explicit': rec_values.get('explicit', False),
-                        'danceability': rec_values.get('danceability', 0.5),
-                        'energy': rec_values.get('energy', 0.5),
-                        'key': rec_values.get('key', 0),
-                        'loudness': rec_values.get('loudness', -10.0),
-                        'mode': rec_values.get('mode', 1),
-                        'speechiness': rec_values.get('speechiness', 0.1),
-                        'acousticness': rec_values.get('acousticness', 0.5),
-                        'instrumentalness': rec_values.get('instrumentalness', 0.0),
-                        'liveness': rec_values.get('liveness', 0.1),
-                        'valence': rec_values.get('valence', 0.5),
-                        'tempo': rec_values.get('tempo', 120.0),
-                        'time_signature': rec_values.get('time_signature', 4),
-                        'source': 'recombee_similar',
-                        'source_label': f'Similar to liked track',
-                        'final_score': rec_values.get('rating', 0.8),
-                        'recomm_id': recomm_id,
-                        'recombee_score': rec_values.get('score', 0.0),
-                        'based_on_track': track_id
-                    }
-                
-                recommendations.append(recommendation)
+            recommendations = self._drop_filter_overflow(
+                user_id, self._parse_similar_tracks_response(response, track_id), num_recommendations
+            )
             
             print(f"✅ Recombee similare: {len(recommendations)} recomandări procesate pentru {track_id}")
             return recommendations
@@ -643,6 +853,77 @@ class SpotifyRecommendationSystem:
             print("❌ Nu s-au putut obține recomandări similare de la Recombee")
             return []
     
+    def recombee_recommend_similar_to_tracks(self, track_ids: List[str], user_id: str = None,
+                                             num_recommendations: int = 10,
+                                             scenario: str = 'similar-tracks') -> List[Dict]:
+        """
+        Recomandări similare cu mai multe piese, obținute într-un singur Batch Recombee
+        
+        Rezultatele sunt intercalate (câte una de la fiecare piesă sursă, pe rând), fără
+        duplicate și fără piesele sursă
+        
+        Args:
+            track_ids: ID-urile pieselor sursă
+            user_id: ID-ul utilizatorului (opțional, pentru personalizare)
+            num_recommendations: Numărul total de recomandări
+            scenario: Scenariul Recombee
+        """
+        if not self.recombee_client:
+            print("Recombee client nu este disponibil pentru recomandări similare")
+            return []
+        
+        seeds = list(dict.fromkeys(track_ids))
+        if not seeds:
+            return []
+        
+        try:
+            responses = self.recombee_client.send(
+                self._similar_to_tracks_batch(seeds, user_id, num_recommendations, scenario)
+            )
+        except Exception as e:
+            print(f"❌ Eroare la obținerea recomandărilor similare Recombee: {e}")
+            return []
+        
+        return self._merge_similar_responses(seeds, responses, num_recommendations, user_id)
+    
+    def _similar_to_tracks_batch(self, seeds: List[str], user_id: str,
+                                 num_recommendations: int, scenario: str):
+        """Lotul cu câte o cerere RecommendItemsToItem pentru fiecare piesă sursă"""
+        # Fiecare sursă cere numărul total, ca deduplicarea să poată completa lista
+        return Batch([
+            self._similar_tracks_request(seed, user_id, num_recommendations, scenario)
+            for seed in seeds
+        ])
+    
+    def _merge_similar_responses(self, seeds: List[str], responses: List[Dict],
+                                 num_recommendations: int, user_id: str = None) -> List[Dict]:
+        """
+        Intercalează rezultatele per sursă, fără duplicate, fără piesele sursă și fără
+        piesele excluse ale utilizatorului care nu au încăput în filtrul ReQL
+        """
+        per_seed = []
+        for seed, response in zip(seeds, responses):
+            if 200 <= response.get('code', 0) < 300:
+                per_seed.append(self._parse_similar_tracks_response(response['json'], seed))
+            else:
+                print(f"✗ Recomandări similare eșuate pentru {seed}: {response.get('json')}")
+        
+        excluded = set(seeds) | self._user_exclusion_overflow(user_id)
+        recommendations = []
+        # Răspunsurile pot conține piese cerute în plus (vezi _similar_tracks_request)
+        for position in range(max((len(r) for r in per_seed), default=0)):
+            for seed_recommendations in per_seed:
+                if position >= len(seed_recommendations):
+                    continue
+                recommendation = seed_recommendations[position]
+                if recommendation['track_id'] in excluded:
+                    continue
+                excluded.add(recommendation['track_id'])
+                recommendations.append(recommendation)
+        
+        print(f"✅ Recombee similare: {len(recommendations)} recomandări pentru {len(seeds)} piese sursă")
+        return recommendations[:num_recommendations]
+    
     def _calculate_acoustic_similarity(self, track1: Track, track2: Track) -> float:
         """
         Calculează similaritatea acustică între două piese folosind Cosine Similarity
@@ -727,23 +1008,17 @@ class SpotifyRecommendationSystem:
         if track_id not in self.tracks:
             return []
         
-        target_track = self.tracks[track_id]
-        similarities = []
-        
-        for other_id, other_track in self.tracks.items():
-            if other_id != track_id:
-                similarity = self._calculate_acoustic_similarity(target_track, other_track)
-                similarities.append({
-                    'track': other_track,
-                    'similarity': similarity
-                })
+        # Similaritatea cu toate piesele, calculată vectorizat pe matricea catalogului
+        target_row = self.catalog.row_of[track_id]
+        similarities = self.catalog.cosine_similarities(self.catalog.features[target_row])
         
-        # Sortează după similaritate
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
+        # Sortare stabilă descrescătoare (egalitățile păstrează ordinea din catalog)
+        order = np.argsort(-similarities, kind='stable')
+        order = order[order != target_row][:num_recommendations]
         
         recommendations = []
-        for item in similarities[:num_recommendations]:
-            track = item['track']
+        for row in order:
+            track = self.tracks.at(row)
             recommendations.append({
                 'track_id': track.track_id,
                 'track_name': track.track_name,
@@ -765,51 +1040,118 @@ class SpotifyRecommendationSystem:
                 'valence': track.valence,
                 'tempo': track.tempo,
                 'time_signature': track.time_signature,
-                'similarity_score': item['similarity']
+                'similarity_score': float(similarities[row])
             })
         
         return recommendations
     
+    def track_feature_vector(self, track_id: str) -> Optional[List[float]]:
+        """Caracteristicile normalizate ale piesei (ordinea FEATURE_NAMES), sau None dacă nu există"""
+        row = self.catalog.row_of.get(track_id)
+        if row is None:
+            return None
+        return self.catalog.features[row].tolist()
+    
     def content_based_recommend_for_user(self, user_id: str, num_recommendations: int = 10) -> List[Dict]:
         """
         Recomandări Content-Based pentru un utilizator specific
-        Bazate pe piesele pe care le-a apreciat
+        Bazate pe piesele pe care le-a apreciat: o singură interogare a catalogului cu
+        profilul de gust (media caracteristicilor pieselor apreciate, îndepărtată de media
+        celor neapreciate), ținut la zi incremental de stocarea utilizatorilor
         """
-        if user_id not in self.users:
+        if self.user_storage is None:
             return []
         
-        # Importăm user_storage pentru a obține piesele apreciate
-        from user_storage import UserStorage
-        user_storage = UserStorage()
-        
-        liked_tracks = user_storage.get_user_liked_tracks(user_id)
-        if not liked_tracks:
+        taste = self.user_storage.get_taste(user_id) or {}
+        liked = taste.get('liked') or {}
+        if not liked.get('count'):
             return []
         
-        # Calculează recomandări bazate pe toate piesele apreciate
-        all_recommendations = []
+        query = np.asarray(liked['mean'], dtype=np.float64)
+        query = query / (np.linalg.norm(query) or 1.0)
+        disliked = taste.get('disliked') or {}
+        if disliked.get('count'):
+            disliked_mean = np.asarray(disliked['mean'], dtype=np.float64)
+            query = query - TASTE_DISLIKE_WEIGHT * disliked_mean / (np.linalg.norm(disliked_mean) or 1.0)
         
-        for liked_track_id in liked_tracks[-10:]:  # Ultimele 10 piese apreciate
-            if liked_track_id in self.tracks:
-                recs = self.content_based_recommend(liked_track_id, num_recommendations=5)
-                for rec in recs:
-                    rec['seed_track'] = liked_track_id
-                all_recommendations.extend(recs)
+        similarities = self.catalog.cosine_similarities(query)
         
-        # Elimină duplicatele și sortează după similaritate
-        seen_tracks = set()
-        unique_recommendations = []
+        # Piesele deja văzute, apreciate sau neapreciate nu sunt recomandate
+        rows = np.flatnonzero(~self.user_storage.get_exclusion_mask(user_id, self.catalog))
+        order = rows[np.argsort(-similarities[rows], kind='stable')][:num_recommendations]
         
-        for rec in all_recommendations:
-            track_id = rec['track_id']
-            if track_id not in seen_tracks and track_id not in liked_tracks:
-                seen_tracks.add(track_id)
-                unique_recommendations.append(rec)
-        
-        # Sortează după similaritate
-        unique_recommendations.sort(key=lambda x: x.get('similarity_score', 0), reverse=True)
+        recommendations = []
+        for row in order:
+            recommendation = self.track_to_dict(self.tracks.at(row))
+            recommendation['similarity_score'] = float(similarities[row])
+            recommendations.append(recommendation)
+        return recommendations
+    
+    def collaborative_recommend(self, user_id: str, num_recommendations: int = 10) -> List[Dict]:
+        """
+        Recomandări colaborative locale (item-item): piesele care apar împreună cu cele
+        ascultate/apreciate de utilizator în istoricul celorlalți utilizatori
+        Folosite când Recombee nu este disponibil sau nu returnează rezultate
+        """
+        if self.user_storage is None:
+            return []
         
-        return unique_recommendations[:num_recommendations]
+        recommendations = []
+        for track_id, score in self.user_storage.collaborative_scores(user_id, num_recommendations):
+            track = self.tracks.get(track_id)
+            if track is None:
+                continue
+            recommendation = self.track_to_dict(track)
+            recommendation['collaborative_score'] = float(score)
+            recommendation['source'] = 'local-cf'
+            recommendations.append(recommendation)
+        return recommendations
+    
+    def als_model(self):
+        """
+        Factorii ALS memory-mapped și, pentru fiecare piesă a modelului, rândul din catalog (-1 dacă
+        lipsește); reîncărcați când job-ul de antrenare scrie factori noi sau catalogul se schimbă
+        Returnează None fără factori antrenați (sursa ALS din pipeline.py nu produce candidați)
+        """
+        if not self.als_factors_dir:
+            return None
+        try:
+            mtime_ns = os.stat(os.path.join(self.als_factors_dir, 'meta.json')).st_mtime_ns
+        except OSError:
+            return None
+        state = self._als_state
+        if state is None or state[0].meta.get('mtime_ns') != mtime_ns or state[1] is not self.catalog:
+            factors = ALSFactors.load(self.als_factors_dir)
+            if factors is None:
+                return None
+            catalog_rows = self.catalog.row_of.rows_of(factors.track_ids)
+            state = self._als_state = (factors, self.catalog, catalog_rows)
+            print(f"✅ Factori ALS încărcați: {len(factors.user_row)} utilizatori, {len(catalog_rows)} piese")
+        return state[0], state[2]
+    
+    def als_recommend(self, user_id: str, num_recommendations: int = 10) -> List[Dict]:
+        """
+        Recomandări din factorii ALS antrenați offline: scorurile tuturor pieselor sunt un singur
+        produs între factorii pieselor și vectorul utilizatorului (gol dacă utilizatorul lipsește
+        din model, ex. s-a înregistrat după ultima antrenare); rulează pipeline-ul 'als'
+        """
+        return self.pipeline_recommend('als', user_id, num_recommendations=num_recommendations).recommendations
+    
+    def session_recommend(self, user_id: str, num_recommendations: int = 5,
+                          current_track_id: Optional[str] = None,
+                          exclude: Optional[set] = None) -> List[Dict]:
+        """
+        Următoarele piese pentru redarea continuă (autoplay), din sesiunea curentă de ascultare
+        
+        Ultimele SESSION_HISTORY_LENGTH ascultări (plus piesa care tocmai rulează, ca cea mai
+        recentă) sunt combinate într-un singur vector de interogare: media caracteristicilor
+        normalizate, ponderată cu 0.5 ** (vechime / SESSION_HALF_LIFE_SECONDS). Catalogul este
+        scorat o singură dată față de acest vector (pipeline.SessionSource, prin pipeline-ul
+        'session'); piesele deja văzute, apreciate sau neapreciate și cele din `exclude`
+        (ex. coada clientului) nu sunt recomandate.
+        """
+        return self.pipeline_recommend('session', user_id, current_track_id, num_recommendations,
+                                       exclude=exclude).recommendations
     
     def knowledge_based_recommend(self, user_id: str, num_recommendations: int = 10, offset: int = 0) -> List[Dict]:
         """
@@ -836,78 +1178,24 @@ class SpotifyRecommendationSystem:
             return []
         
         user = self.users[user_id]
-        recommendations = []
         
         # Caută piese din genurile preferate
         # Dacă nu există genuri preferate, returnează lista goală
         if not user.preferred_genres:
             return []
         
-        for genre in user.preferred_genres:
-            if genre in self.genre_tracks:
-                for track_id in self.genre_tracks[genre]:
-                    track = self.tracks[track_id]
-                    score = self._calculate_user_match_score(user, track)
-                    recommendations.append({
-                        'track': track,
-                        'score': score,
-                        'genre': genre  # Păstrează genul pentru sortare
-                    })
-        
-        # Filtrare după mood și durată
-        filtered_recommendations = []
-        for item in recommendations:
-            track = item['track']
-            if self._matches_mood(user.mood, track) and \
-               self._matches_listening_time(user.listening_time_preference, track.duration_ms):
-                filtered_recommendations.append(item)
-        
-        # Dacă nu există recomandări după filtrare, relaxează condițiile
-        if not filtered_recommendations:
-            # Relaxează doar filtrarea mood (păstrează durata)
-            for item in recommendations:
-                track = item['track']
-                if self._matches_listening_time(user.listening_time_preference, track.duration_ms):
-                    filtered_recommendations.append(item)
-        
-        # Dacă încă nu există, folosește toate recomandările
-        if not filtered_recommendations:
-            filtered_recommendations = recommendations
+        # Candidații filtrați după mood și durată (cu relaxarea condițiilor), din măștile precalculate
+        rows, scores, priority = self.knowledge_candidates(user)
         
         # Sortează: mai întâi după genuri preferate (prioritate), apoi după scor
         # Genurile preferate primele în listă au prioritate mai mare
-        genre_priority = {genre: idx for idx, genre in enumerate(user.preferred_genres)}
-        filtered_recommendations.sort(key=lambda x: (
-            genre_priority.get(x.get('genre', ''), 999),  # Genuri preferate primele
-            -x['score']  # Apoi după scor descrescător
-        ))
+        order = np.lexsort((np.arange(len(rows)), -scores, priority))[:num_recommendations]
         
         result = []
-        for item in filtered_recommendations[:num_recommendations]:
-            track = item['track']
-            result.append({
-                'track_id': track.track_id,
-                'track_name': track.track_name,
-                'artists': track.artists,
-                'album_name': track.album_name,
-                'track_genre': track.track_genre,
-                'popularity': track.popularity,
-                'duration_ms': track.duration_ms,
-                'explicit': track.explicit,
-                'danceability': track.danceability,
-                'energy': track.energy,
-                'key': track.key,
-                'loudness': track.loudness,
-                'mode': track.mode,
-                'speechiness': track.speechiness,
-                'acousticness': track.acousticness,
-                'instrumentalness': track.instrumentalness,
-                'liveness': track.liveness,
-                'valence': track.valence,
-                'tempo': track.tempo,
-                'time_signature': track.time_signature,
-                'match_score': item['score']
-            })
+        for position in order:
+            recommendation = self.track_to_dict(self.tracks.at(rows[position]))
+            recommendation['match_score'] = float(scores[position])
+            result.append(recommendation)
         
         # Apply offset for variety in recommendations
         if offset > 0 and len(result) > offset:
@@ -915,106 +1203,259 @@ class SpotifyRecommendationSystem:
         
         return result
     
-    def _calculate_user_match_score(self, user: UserProfile, track: Track) -> float:
-        """
-        Calculează scorul de potrivire între utilizator și piesă
-        Folosește Cosine Similarity pentru a calcula potrivirea bazată pe preferințe
-        """
-        # Vector de preferințe utilizator (normalizat)
-        user_vector = [
-            user.preferred_energy_level,      # [0, 1]
-            user.preferred_danceability,      # [0, 1]
-            0.5,                              # Valence (nu avem preferință explicită, folosim medie)
-            0.5,                              # Speechiness (nu avem preferință)
-            0.5,                              # Acousticness (nu avem preferință)
-            0.0,                              # Instrumentalness (nu avem preferință)
-            0.5,                              # Liveness (nu avem preferință)
-            0.5,                              # Tempo (nu avem preferință explicită)
-            0.5,                              # Loudness (nu avem preferință)
-            0.5,                              # Key (nu avem preferință)
-            0.5,                              # Mode (nu avem preferință)
-            0.5,                              # Time signature (nu avem preferință)
-            0.5                              # Popularity (nu avem preferință explicită)
-        ]
+    def _build_filter_masks(self):
+        """
+        Precalculează, pentru fiecare dispoziție și fiecare preferință de durată, masca
+        pieselor care trec filtrul; măștile sunt în ordinea catalog.genre_order, deci
+        filtrele unui gen sunt o felie din fiecare mască
+        """
+        rows = self.catalog.genre_order
+        self._mood_masks = {mood: self._mood_mask(mood, rows) for mood in MOOD_CONDITIONS}
+        self._duration_masks = {
+            preference: self._listening_time_mask(preference, rows)
+            for preference in ('short', 'medium', 'long')
+        }
+    
+    def _mood_mask(self, mood: str, rows: np.ndarray) -> np.ndarray:
+        """
+        Piesele din `rows` care se potrivesc cu dispoziția (toate condițiile min_/max_ din
+        MOOD_CONDITIONS); o dispoziție necunoscută nu filtrează nimic
+        """
+        mask = np.ones(len(rows), dtype=bool)
+        for condition, threshold in MOOD_CONDITIONS.get(mood, {}).items():
+            bound, feature = condition.split('_', 1)
+            values = self.catalog.column(feature)[rows]
+            mask &= values >= threshold if bound == 'min' else values <= threshold
+        return mask
+    
+    def _listening_time_mask(self, preference: str, rows: np.ndarray) -> np.ndarray:
+        """
+        Piesele din `rows` a căror durată se potrivește cu preferința: short <= 3 min,
+        medium între 3 și 5 min, long > 5 min; o preferință necunoscută nu filtrează nimic
+        """
+        duration_minutes = self.catalog.column('duration_ms')[rows] / 60000.0
+        if preference == 'short':
+            return duration_minutes <= 3.0
+        elif preference == 'medium':
+            return (duration_minutes > 3.0) & (duration_minutes <= 5.0)
+        elif preference == 'long':
+            return duration_minutes > 5.0
+        return np.ones(len(rows), dtype=bool)
+    
+    @staticmethod
+    def _user_preference_vector(user: UserProfile) -> np.ndarray:
+        """
+        Vectorul de preferințe al utilizatorului, în ordinea caracteristicilor din catalog
+        (FEATURE_NAMES): energia și dansabilitatea preferate, valori neutre pentru restul
+        """
+        return np.array([
+            user.preferred_energy_level, user.preferred_danceability,
+            0.5, 0.5, 0.5, 0.0, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5
+        ])
+    
+    def knowledge_candidates(self, user: UserProfile):
+        """
+        Piesele eligibile Knowledge-Based pentru un utilizator, cu scorurile de potrivire
+        (și sursa pe genuri din pipeline.py)
         
-        # Vector de caracteristici piesă (normalizat, la fel ca în _calculate_acoustic_similarity)
-        track_vector = [
-            track.energy,
-            track.danceability,
-            track.valence,
-            track.speechiness,
-            track.acousticness,
-            track.instrumentalness,
-            track.liveness,
-            (track.tempo / 200.0),
-            ((track.loudness + 60) / 60.0),
-            (track.key / 11.0),
-            (track.mode / 1.0),
-            (track.time_signature / 5.0),
-            (track.popularity / 100.0)
+        Aceleași reguli ca knowledge_based_recommend: piese din genurile preferate, filtrate după
+        dispoziție și durată, cu relaxarea filtrului de dispoziție și apoi a celui de durată dacă
+        nu rămâne nimic. Returnează (rânduri, scoruri, prioritatea genului per rând).
+        """
+        genres = [genre for genre in dict.fromkeys(user.preferred_genres) if genre in self.genre_tracks]
+        if not genres:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, np.zeros(0), empty
+        
+        # Feliile genurilor preferate din indexul pe genuri și din măștile precalculate
+        offsets = self.catalog.genre_offsets
+        slices = [
+            slice(offsets[code], offsets[code + 1])
+            for code in (self.catalog.genre_code_of[genre] for genre in genres)
         ]
-        
-        # Cosine Similarity între preferințele utilizatorului și caracteristicile piesei
-        dot_product = sum(a * b for a, b in zip(user_vector, track_vector))
-        magnitude_user = math.sqrt(sum(a * a for a in user_vector))
-        magnitude_track = math.sqrt(sum(b * b for b in track_vector))
-        
-        if magnitude_user == 0 or magnitude_track == 0:
-            cosine_score = 0.0
-        else:
-            cosine_score = dot_product / (magnitude_user * magnitude_track)
-        
-        # Bonus pentru potrivire gen (nu poate fi exprimat în cosine similarity)
-        genre_bonus = 0.0
-        if track.track_genre in user.preferred_genres:
-            genre_bonus = 0.3
-        
-        # Scor final: combină cosine similarity cu bonus-ul pentru gen
-        final_score = max(0.0, cosine_score) * 0.7 + genre_bonus
-        
-        return min(1.0, final_score)  # Asigură că scorul este în [0, 1]
+        rows = np.concatenate([self.catalog.genre_order[part] for part in slices]).astype(np.int64)
+        priority = np.repeat(np.arange(len(genres)), [part.stop - part.start for part in slices])
+        
+        mood_mask = self._mood_masks.get(user.mood)
+        duration_mask = self._duration_masks.get(user.listening_time_preference)
+        duration = (np.concatenate([duration_mask[part] for part in slices])
+                    if duration_mask is not None else np.ones(len(rows), dtype=bool))
+        mask = (duration & np.concatenate([mood_mask[part] for part in slices])
+                if mood_mask is not None else duration)
+        
+        # Relaxare: fără filtrul de dispoziție, apoi fără niciun filtru
+        if not mask.any():
+            mask = duration
+        if mask.any():
+            rows, priority = rows[mask], priority[mask]
+        
+        # Toate piesele sunt din genurile preferate, deci bonusul de gen (0.3) se aplică mereu
+        cosine = self.catalog.cosine_similarities(self._user_preference_vector(user), rows)
+        scores = np.minimum(1.0, cosine * 0.7 + 0.3)
+        return rows, scores, priority
     
-    def _matches_mood(self, mood: str, track: Track) -> bool:
-        """Verifică dacă piesa se potrivește cu dispoziția utilizatorului"""
-        mood_mapping = {
-            'happy': {'min_valence': 0.6, 'min_energy': 0.5},
-            'sad': {'max_valence': 0.4, 'max_energy': 0.6},
-            'energetic': {'min_energy': 0.7, 'min_tempo': 120},
-            'calm': {'max_energy': 0.4, 'min_acousticness': 0.5}
+    def track_to_dict(self, track: Track) -> Dict:
+        """Câmpurile unei piese în formatul recomandărilor locale"""
+        return {
+            'track_id': track.track_id,
+            'track_name': track.track_name,
+            'artists': track.artists,
+            'album_name': track.album_name,
+            'track_genre': track.track_genre,
+            'popularity': track.popularity,
+            'duration_ms': track.duration_ms,
+            'explicit': track.explicit,
+            'danceability': track.danceability,
+            'energy': track.energy,
+            'key': track.key,
+            'loudness': track.loudness,
+            'mode': track.mode,
+            'speechiness': track.speechiness,
+            'acousticness': track.acousticness,
+            'instrumentalness': track.instrumentalness,
+            'liveness': track.liveness,
+            'valence': track.valence,
+            'tempo': track.tempo,
+            'time_signature': track.time_signature
         }
+    
+    def _parse_recomms(self, response: Dict, source: str, source_label: str,
+                       extra: Optional[Dict] = None) -> List[Dict]:
+        """
+        Transformă un răspuns de recomandare Recombee (recomms + recommId) în lista de
+        recomandări, cu detaliile pieselor din cache-ul local când există
+        """
+        extra = extra or {}
+        recommendations = []
+        recomm_id = response.get('recommId')  # ID-ul recomandării pentru tracking
         
-        if mood not in mood_mapping:
-            return True
-        
-        conditions = mood_mapping[mood]
-        
-        if 'min_valence' in conditions and track.valence < conditions['min_valence']:
-            return False
-        if 'max_valence' in conditions and track.valence > conditions['max_valence']:
-            return False
-        if 'min_energy' in conditions and track.energy < conditions['min_energy']:
-            return False
-        if 'max_energy' in conditions and track.energy > conditions['max_energy']:
-            return False
-        if 'min_tempo' in conditions and track.tempo < conditions['min_tempo']:
-            return False
-        if 'min_acousticness' in conditions and track.acousticness < conditions['min_acousticness']:
-            return False
+        for rec in response.get('recomms', []):
+            track_id = rec['id']
+            rec_values = rec.get('values', {})
+            
+            # Încearcă să obții detalii din cache local mai întâi
+            if track_id in self.tracks:
+                track = self.tracks[track_id]
+                recommendation = {
+                    'track_id': track.track_id,
+                    'track_name': track.track_name,
+                    'artists': track.artists,
+                    'album_name': track.album_name,
+                    'track_genre': track.track_genre,
+                    'popularity': track.popularity,
+                    'duration_ms': track.duration_ms,
+                    'explicit': track.explicit,
+                    'danceability': track.danceability,
+                    'energy': track.energy,
+                    'key': track.key,
+                    'loudness': track.loudness,
+                    'mode': track.mode,
+                    'speechiness': track.speechiness,
+                    'acousticness': track.acousticness,
+                    'instrumentalness': track.instrumentalness,
+                    'liveness': track.liveness,
+                    'valence': track.valence,
+                    'tempo': track.tempo,
+                    'time_signature': track.time_signature,
+                    'source': source,
+                    'source_label': source_label,
+                    'recomm_id': recomm_id,  # Pentru tracking succesului
+                    'recombee_score': rec_values.get('score', 0.0),
+                    'final_score': rec_values.get('rating', 0.8),
+                    **extra
+                }
+            else:
+                # Folosește proprietățile returnate de Recombee sau valori default
+                recommendation = {
+                    'track_id': track_id,
+                    'track_name': rec_values.get('track_name', f'Track {track_id}'),
+                    'artists': rec_values.get('artists', 'Unknown Artist'),
+                    'album_name': rec_values.get('album_name', 'Unknown Album'),
+                    'track_genre': rec_values.get('track_genre', 'Unknown'),
+                    'popularity': rec_values.get('popularity', 50),
+                    'duration_ms': rec_values.get('duration_ms', 180000),
+                    'explicit': rec_values.get('explicit', False),
+                    'danceability': rec_values.get('danceability', 0.5),
+                    'energy': rec_values.get('energy', 0.5),
+                    'key': rec_values.get('key', 0),
+                    'loudness': rec_values.get('loudness', -10.0),
+                    'mode': rec_values.get('mode', 1),
+                    'speechiness': rec_values.get('speechiness', 0.1),
+                    'acousticness': rec_values.get('acousticness', 0.5),
+                    'instrumentalness': rec_values.get('instrumentalness', 0.0),
+                    'liveness': rec_values.get('liveness', 0.1),
+                    'valence': rec_values.get('valence', 0.5),
+                    'tempo': rec_values.get('tempo', 120.0),
+                    'time_signature': rec_values.get('time_signature', 4),
+                    'source': source,
+                    'source_label': source_label,
+                    'recomm_id': recomm_id,
+                    'recombee_score': rec_values.get('score', 0.0),
+                    'final_score': rec_values.get('rating', 0.8),
+                    **extra
+                }
+            
+            recommendations.append(recommendation)
         
-        return True
+        return recommendations
+    
+    def _user_exclusion_filter(self, user_id: str) -> Optional[str]:
+        """Filtrul ReQL cu piesele de exclus pentru utilizator (None fără stocare sau excluderi)"""
+        if self.user_storage is None:
+            return None
+        return self.user_storage.get_recombee_filter(user_id)
     
-    def _matches_listening_time(self, preference: str, duration_ms: int) -> bool:
-        """Verifică dacă durata piesei se potrivește cu preferința utilizatorului"""
-        duration_minutes = duration_ms / 60000.0
+    def _user_exclusion_overflow(self, user_id: Optional[str]) -> Set[str]:
+        """Piesele excluse ale utilizatorului care nu au încăput în filtrul ReQL"""
+        if self.user_storage is None or not user_id:
+            return frozenset()
+        return self.user_storage.get_recombee_filter_overflow(user_id)
+    
+    def _overfetch_count(self, user_id: str) -> int:
+        """Câte piese în plus se cer de la Recombee, ca eliminarea locală să nu scurteze lista"""
+        return min(len(self._user_exclusion_overflow(user_id)), RECOMBEE_OVERFETCH_MAX)
+    
+    def _drop_filter_overflow(self, user_id: Optional[str], recommendations: List[Dict],
+                              num_recommendations: int) -> List[Dict]:
+        """Elimină piesele excluse rămase în afara filtrului ReQL și păstrează primele num_recommendations"""
+        overflow = self._user_exclusion_overflow(user_id)
+        if overflow:
+            recommendations = [rec for rec in recommendations if rec['track_id'] not in overflow]
+        return recommendations[:num_recommendations]
+    
+    def _user_recommendations_request(self, user_id: str, num_recommendations: int = 10,
+                                      scenario: str = 'homepage', return_properties: bool = True,
+                                      filter_expr: str = None, booster_expr: str = None):
+        """
+        Cererea RecommendItemsToUser; cascade_create creează utilizatorul dacă nu există,
+        deci nu mai este necesar un apel AddUser separat
+        """
+        # Fără un filtru explicit se exclud piesele deja văzute, apreciate sau neapreciate,
+        # ca fiecare loc din răspuns să fie o piesă nouă; cele care nu încap în filtru sunt
+        # eliminate local, din piesele cerute în plus
+        count = num_recommendations
+        if filter_expr is None:
+            filter_expr = self._user_exclusion_filter(user_id)
+            count += self._overfetch_count(user_id)
+        
+        # Parametri pentru recomandări conform documentației Recombee
+        recommend_params = {
+            'user_id': user_id,
+            'count': count,
+            'scenario': scenario,
+            'return_properties': return_properties,
+            'cascade_create': True,  # Creează utilizatorul dacă nu există
+            'diversity': 0.1,  # Diversitate în recomandări
+            'min_relevance': 'low'  # Relevanta minimă
+        }
         
-        if preference == 'short':
-            return duration_minutes <= 3.0
-        elif preference == 'medium':
-            return 3.0 < duration_minutes <= 5.0
-        elif preference == 'long':
-            return duration_minutes > 5.0
+        # Adaugă filtre și boostere dacă sunt specificate
+        if filter_expr:
+            recommend_params['filter'] = filter_expr
+        if booster_expr:
+            recommend_params['booster'] = booster_expr
         
-        return True
+        return RecommendItemsToUser(**recommend_params)
     
     def recombee_recommend(self, user_id: str, num_recommendations: int = 10,
                           scenario: str = 'homepage', return_properties: bool = True,
@@ -1036,107 +1477,18 @@ class SpotifyRecommendationSystem:
             return []
         
         try:
-            from recombee_api_client.api_requests import RecommendItemsToUser, AddUser
-            
-            # Asigură-te că utilizatorul există în Recombee
-            try:
-                self.recombee_client.send(AddUser(user_id))
-            except Exception as e:
-                if "already exists" not in str(e):
-                    print(f"Eroare la adăugarea utilizatorului: {e}")
-            
-            # Parametri pentru recomandări conform documentației Recombee
-            recommend_params = {
-                'user_id': user_id,
-                'count': num_recommendations,
-                'scenario': scenario,
-                'return_properties': return_properties,
-                'cascade_create': True,  # Creează utilizatorul dacă nu există
-                'diversity': 0.1,  # Diversitate în recomandări
-                'min_relevance': 'low'  # Relevanta minimă
-            }
-            
-            # Adaugă filtre și boostere dacă sunt specificate
-            if filter_expr:
-                recommend_params['filter'] = filter_expr
-            if booster_expr:
-                recommend_params['booster'] = booster_expr
-            
             print(f"🔍 Cerere recomandări Recombee pentru {user_id} (scenario: {scenario})")
             
             # Obține recomandări de la Recombee
-            response = self.recombee_client.send(RecommendItemsToUser(**recommend_params))
-            
-            recommendations = []
-            recomm_id = response.get('recommId')  # ID-ul recomandării pentru tracking
+            response = self.recombee_client.send(self._user_recommendations_request(
+                user_id, num_recommendations, scenario, return_properties, filter_expr, booster_expr
+            ))
             
-            print(f"📦 Recombee răspuns: {len(response.get('recomms', []))} recomandări, recommId: {recomm_id}")
+            print(f"📦 Recombee răspuns: {len(response.get('recomms', []))} recomandări, recommId: {response.get('recommId')}")
             
-            for rec in response.get('recomms', []):
-                track_id = rec['id']
-                rec_values = rec.get('values', {})
-                
-                # Încearcă să obții detalii din cache local mai întâi
-                if track_id in self.tracks:
-                    track = self.tracks[track_id]
-                    recommendation = {
-                        'track_id': track.track_id,
-                        'track_name': track.track_name,
-                        'artists': track.artists,
-                        'album_name': track.album_name,
-                        'track_genre': track.track_genre,
-                        'popularity': track.popularity,
-                        'duration_ms': track.duration_ms,
-                        'explicit': track.explicit,
-                        'danceability': track.danceability,
-                        'energy': track.energy,
-                        'key': track.key,
-                        'loudness': track.loudness,
-                        'mode': track.mode,
-                        'speechiness': track.speechiness,
-                        'acousticness': track.acousticness,
-                        'instrumentalness': track.instrumentalness,
-                        'liveness': track.liveness,
-                        'valence': track.valence,
-                        'tempo': track.tempo,
-                        'time_signature': track.time_signature,
-                        'source': 'recombee',
-                        'source_label': f'Recombee ({scenario})',
-                        'final_score': rec_values.get('rating', 0.8),
-                        'recomm_id': recomm_id,  # Pentru tracking succesului
-                        'recombee_score': rec_values.get('score', 0.0)
-                    }
-                else:
-                    # Folosește proprietățile returnate de Recombee sau valori default
-                    recommendation = {
-                        'track_id': track_id,
-                        'track_name': rec_values.get('track_name', f'Track {track_id}'),
-                        'artists': rec_values.get('artists', 'Unknown Artist'),
-                        'album_name': rec_values.get('album_name', 'Unknown Album'),
-                        'track_genre': rec_values.get('track_genre', 'Unknown'),
-                        'popularity': rec_values.get('popularity', 50),
-                        'duration_ms': rec_values.get('duration_ms', 180000),
-                        'explicit': rec_values.get('explicit', False),
-                        'danceability': rec_values.get('danceability', 0.5),
-                        'energy': rec_values.get('energy', 0.5),
-                        'key': rec_values.get('key', 0),
-                        'loudness': rec_values.get('loudness', -10.0),
-                        'mode': rec_values.get('mode', 1),
-                        'speechiness': rec_values.get('speechiness', 0.1),
-                        'acousticness': rec_values.get('acousticness', 0.5),
-                        'instrumentalness': rec_values.get('instrumentalness', 0.0),
-                        'liveness': rec_values.get('liveness', 0.1),
-                        'valence': rec_values.get('valence', 0.5),
-                        'tempo': rec_values.get('tempo', 120.0),
-                        'time_signature': rec_values.get('time_signature', 4),
-                        'source': 'recombee',
-                        'source_label': f'Recombee ({scenario})',
-                        'final_score': rec_values.get('rating', 0.8),
-                        'recomm_id': recomm_id,
-                        'recombee_score': rec_values.get('score', 0.0)
-                    }
-                
-                recommendations.append(recommendation)
+            recommendations = self._parse_recomms(response, 'recombee', f'Recombee ({scenario})')
+            if filter_expr is None:
+                recommendations = self._drop_filter_overflow(user_id, recommendations, num_recommendations)
             
             print(f"✅ Recombee: {len(recommendations)} recomandări procesate pentru {user_id}")
             return recommendations
@@ -1147,153 +1499,375 @@ class SpotifyRecommendationSystem:
             print("❌ Nu s-au putut obține recomandări de la Recombee")
             return []
     
+    @traced('hybrid_recommend')
     def hybrid_recommend(self, user_id: str, seed_track_id: Optional[str] = None,
-                        num_recommendations: int = 10, use_recombee: bool = True) -> List[Dict]:
+                        num_recommendations: int = 10, use_recombee: bool = True,
+                        long_tail_quota: float = 0.0) -> List[Dict]:
         """
         Recomandări hibrid: combină Content-Based și Knowledge-Based
         Dacă Recombee este disponibil, îl folosește pentru recomandări
         
+        long_tail_quota: fracțiunea din recomandările locale rezervată pieselor de nișă
+        (bucket-urile de popularitate LONG_TAIL_BUCKETS din genurile relevante)
+        
         Pseudocod:
         FUNCTION hybrid_recommend(user_id, seed_track_id, num_recommendations):
             IF recombee_available:
                 RETURN recombee_recommend(user_id, num_recommendations)
             ELSE:
-                content_recs = content_based_recommend(seed_track_id, num_recommendations * 2)
-                knowledge_recs = knowledge_based_recommend(user_id, num_recommendations * 2)
-                combined = merge_and_rank(content_recs, knowledge_recs)
-                RETURN top num_recommendations from combined
+                FOR EACH track IN catalog (vectorizat):
+                    score = 0.6 * similarity(seed_track, track) + 0.4 * user_match(user, track)
+                RETURN top num_recommendations tracks BY score
         """
         # Dacă Recombee este disponibil și este activat, folosește-l
         if use_recombee and self.recombee_client:
-            recombee_recs = self.recombee_recommend(user_id, num_recommendations)
+            with span('recombee_recommend'):
+                recombee_recs = self.recombee_recommend(user_id, num_recommendations)
             if recombee_recs:
                 return recombee_recs
             # Fallback la metoda locală dacă Recombee nu returnează rezultate
         
-        recommendations = []
+        return self._local_hybrid_recommend(user_id, seed_track_id, num_recommendations, long_tail_quota)
+    
+    def _local_hybrid_recommend(self, user_id: str, seed_track_id: Optional[str],
+                                num_recommendations: int, long_tail_quota: float = 0.0) -> List[Dict]:
+        """
+        Combinația locală Content-Based + Knowledge-Based + colaborativă într-o singură trecere vectorizată
         
-        # Recomandări Content-Based (dacă există track seed)
-        if seed_track_id and seed_track_id in self.tracks:
-            content_recs = self.content_based_recommend(seed_track_id, num_recommendations * 2)
-            for rec in content_recs:
-                recommendations.append({
-                    **rec,
-                    'source': 'content-based',
-                    'final_score': rec['similarity_score'] * 0.6
-                })
-        
-        # Recomandări Knowledge-Based
-        knowledge_recs = self.knowledge_based_recommend(user_id, num_recommendations * 2)
-        for rec in knowledge_recs:
-            recommendations.append({
-                **rec,
-                'source': 'knowledge-based',
-                'final_score': rec['match_score'] * 0.4
-            })
+        Fiecare piesă primește 0.6 * similaritatea cu piesa seed + 0.4 * potrivirea cu profilul
+        (pentru piesele eligibile Knowledge-Based) + 0.3 * scorul colaborativ normalizat (pentru
+        vecinii pieselor utilizatorului din indexul de co-apariții); rulează pipeline-ul
+        'local-hybrid', deci excluderea, top-k-ul și cota long tail sunt etapele comune
+        """
+        return self.pipeline_recommend('local-hybrid', user_id, seed_track_id, num_recommendations,
+                                       long_tail_quota=long_tail_quota).recommendations
+    
+    def pipeline_recommend(self, pipeline_name: str, user_id: str, seed_track_id: Optional[str] = None,
+                           num_recommendations: int = 10, exclude: Optional[set] = None,
+                           long_tail_quota: float = 0.0) -> PipelineResult:
+        """
+        Recomandări printr-un pipeline din self.pipelines (generare de candidați, excludere,
+        re-ordonare, diversificare); rezultatul conține și durata și numărul de candidați per etapă
+        """
+        pipeline = self.pipelines.get(pipeline_name)
+        if pipeline is None:
+            raise ValueError(f'Pipeline necunoscut: {pipeline_name}')
+        request = PipelineRequest(user_id=user_id, seed_track_id=seed_track_id,
+                                  num_results=num_recommendations, exclude=set(exclude or ()),
+                                  long_tail_quota=long_tail_quota)
+        with span(f'pipeline:{pipeline_name}'):
+            return pipeline.run(self, request)
+    
+    @staticmethod
+    def _builtin_pipelines() -> Dict[str, RecommendationPipeline]:
+        """
+        Pipeline-urile căilor implicite (scorurile brute ale surselor, fără limită de candidați)
         
-        # Elimină duplicatele și sortează
-        seen_tracks = set()
-        unique_recommendations = []
-        for rec in recommendations:
-            if rec['track_id'] not in seen_tracks:
-                seen_tracks.add(rec['track_id'])
-                unique_recommendations.append(rec)
+        local-hybrid - hybrid_recommend fără Recombee: seed + genuri + co-apariții, cu long tail
+        als          - als_recommend (factorii ALS antrenați offline)
+        session      - session_recommend (autoplay din ascultările recente)
+        """
+        return {
+            'local-hybrid': RecommendationPipeline('local-hybrid', [
+                SimilarTracksSource(budget=None, weight=HYBRID_CONTENT_WEIGHT, use_taste=False, normalize=None,
+                                    name='content-based', score_field='similarity_score'),
+                GenreSource(budget=None, weight=HYBRID_KNOWLEDGE_WEIGHT, normalize=None,
+                            name='knowledge-based', score_field='match_score'),
+                CollaborativeSource(budget=HYBRID_COLLABORATIVE_CANDIDATES, weight=HYBRID_COLLABORATIVE_WEIGHT,
+                                    normalize='max', name='local-cf', score_field='collaborative_score')
+            ], rerank_budget=0, prefer_user_genres=True, long_tail_buckets=LONG_TAIL_BUCKETS),
+            'als': RecommendationPipeline('als', [
+                FactorizationSource(budget=None, normalize=None, score_field='als_score')
+            ], rerank_budget=0),
+            'session': RecommendationPipeline('session', [
+                SessionSource(SESSION_HISTORY_LENGTH, SESSION_HALF_LIFE_SECONDS, budget=None, normalize=None,
+                              score_field='session_score')
+            ], rerank_budget=0)
+        }
+    
+    def long_tail_candidates(self, genres: List[str], count: int, scores: np.ndarray,
+                             niche_buckets: int = LONG_TAIL_BUCKETS,
+                             excluded: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Cele mai bune până la `count` piese de nișă (rânduri din catalog), distribuite egal pe genuri
         
-        unique_recommendations.sort(key=lambda x: x['final_score'], reverse=True)
+        Piesele provin din primele `niche_buckets` bucket-uri de popularitate ale fiecărui gen
+        (index precalculat la încărcare) și sunt alese după `scores` (la egalitate, ordinea din
+        catalog), deci rezultatul este determinist; costul este proporțional doar cu aceste
+        felii, nu cu mărimea catalogului. `excluded` este masca rândurilor care nu pot fi alese.
+        """
+        genres = [genre for genre in dict.fromkeys(genres) if genre in self.genre_tracks]
+        if not genres or count <= 0:
+            return np.zeros(0, dtype=np.int64)
+        
+        niche_buckets = max(1, min(POPULARITY_BUCKETS, niche_buckets))
+        per_genre = math.ceil(count / len(genres))
+        
+        drawn = []
+        for genre in genres:
+            segment = self.catalog.popularity_bucket_rows(genre, 0, niche_buckets)
+            if excluded is not None:
+                segment = segment[~excluded[segment]]
+            if len(segment) == 0:
+                continue
+            best = segment[np.lexsort((segment, -scores[segment]))][:per_genre]
+            drawn.extend(best.tolist())
+        
+        return np.array(drawn[:count], dtype=np.int64)
+    
+    # ==================== VARIANTE ASINCRONE ====================
+    
+    @property
+    def async_recombee_client(self):
+        """
+        Clientul Recombee non-blocant (creat la prima utilizare, cu aceleași credențiale ca
+        clientul sincron), sau None dacă Recombee ori httpx nu sunt disponibile
+        """
+        if self._async_recombee_client is None and self.recombee_client and HTTPX_AVAILABLE:
+            self._async_recombee_client = AsyncRecombeeClient.from_sync_client(self.recombee_client)
+        return self._async_recombee_client
+    
+    async def _send_async(self, request):
+        """Trimite cererea prin clientul asincron; fără httpx, clientul sincron rulează într-un fir"""
+        if self.async_recombee_client is not None:
+            with metrics.registry.track_upstream(type(request).__name__):
+                return await self.async_recombee_client.send(request)
+        return await asyncio.get_running_loop().run_in_executor(None, self.recombee_client.send, request)
+    
+    async def recombee_recommend_async(self, user_id: str, num_recommendations: int = 10,
+                                       scenario: str = 'homepage', return_properties: bool = True,
+                                       filter_expr: str = None, booster_expr: str = None) -> List[Dict]:
+        """Varianta non-blocantă a recombee_recommend (aceiași parametri, același rezultat)"""
+        if not self.recombee_client:
+            print("Recombee client nu este disponibil")
+            return []
         
-        return unique_recommendations[:num_recommendations]
+        try:
+            response = await self._send_async(self._user_recommendations_request(
+                user_id, num_recommendations, scenario, return_properties, filter_expr, booster_expr
+            ))
+            recommendations = self._parse_recomms(response, 'recombee', f'Recombee ({scenario})')
+            if filter_expr is None:
+                recommendations = self._drop_filter_overflow(user_id, recommendations, num_recommendations)
+            return recommendations
+        except Exception as e:
+            print(f"❌ Eroare la obținerea recomandărilor Recombee: {e}")
+            return []
     
-    def get_dataset_examples(self) -> Dict:
-        """Returnează exemple specifice din dataset pentru prezentare"""
-        examples = {
-            'short_description_track': None,
-            'long_description_track': None,
-            'high_energy_track': None,
-            'low_energy_track': None,
-            'popular_track': None,
-            'niche_track': None
-        }
+    async def recombee_recommend_similar_tracks_async(self, track_id: str, user_id: str = None,
+                                                      num_recommendations: int = 10,
+                                                      scenario: str = 'similar-tracks') -> List[Dict]:
+        """Varianta non-blocantă a recombee_recommend_similar_tracks"""
+        if not self.recombee_client:
+            print("Recombee client nu este disponibil pentru recomandări similare")
+            return []
         
-        min_duration = float('inf')
-        max_duration = 0
-        max_energy = 0
-        min_energy = float('inf')
-        max_popularity = 0
-        min_popularity = float('inf')
-        
-        for track in self.tracks.values():
-            # Cea mai scurtă piesă
-            if track.duration_ms < min_duration:
-                min_duration = track.duration_ms
-                examples['short_description_track'] = track
-            
-            # Cea mai lungă piesă
-            if track.duration_ms > max_duration:
-                max_duration = track.duration_ms
-                examples['long_description_track'] = track
-            
-            # Cea mai energetică piesă
-            if track.energy > max_energy:
-                max_energy = track.energy
-                examples['high_energy_track'] = track
-            
-            # Cea mai puțin energetică piesă
-            if track.energy < min_energy:
-                min_energy = track.energy
-                examples['low_energy_track'] = track
-            
-            # Cea mai populară piesă
-            if track.popularity > max_popularity:
-                max_popularity = track.popularity
-                examples['popular_track'] = track
-            
-            # Piesă de nișă (popularitate mică)
-            if track.popularity < min_popularity:
-                min_popularity = track.popularity
-                examples['niche_track'] = track
+        try:
+            response = await self._send_async(
+                self._similar_tracks_request(track_id, user_id, num_recommendations, scenario)
+            )
+            return self._drop_filter_overflow(
+                user_id, self._parse_similar_tracks_response(response, track_id), num_recommendations
+            )
+        except Exception as e:
+            print(f"❌ Eroare la obținerea recomandărilor similare Recombee: {e}")
+            return []
+    
+    async def recombee_recommend_similar_to_tracks_async(self, track_ids: List[str], user_id: str = None,
+                                                         num_recommendations: int = 10,
+                                                         scenario: str = 'similar-tracks') -> List[Dict]:
+        """Varianta non-blocantă a recombee_recommend_similar_to_tracks"""
+        if not self.recombee_client:
+            print("Recombee client nu este disponibil pentru recomandări similare")
+            return []
+        
+        seeds = list(dict.fromkeys(track_ids))
+        if not seeds:
+            return []
         
-        return examples
+        try:
+            responses = await self._send_async(
+                self._similar_to_tracks_batch(seeds, user_id, num_recommendations, scenario)
+            )
+        except Exception as e:
+            print(f"❌ Eroare la obținerea recomandărilor similare Recombee: {e}")
+            return []
+        
+        return self._merge_similar_responses(seeds, responses, num_recommendations, user_id)
+    
+    async def send_interactions_batch_async(self, user_id: str, interactions: List[Dict]) -> int:
+        """Varianta non-blocantă a send_interactions_batch"""
+        if not self.recombee_client:
+            print("Recombee nu este disponibil pentru lotul de interacțiuni")
+            return 0
+        
+        batch = self._interaction_batch(user_id, interactions)
+        if batch is None:
+            return 0
+        
+        try:
+            return self._count_accepted(user_id, await self._send_async(batch))
+        except Exception as e:
+            print(f"✗ Eroare la trimiterea lotului de interacțiuni: {e}")
+            return 0
     
+    async def hybrid_recommend_async(self, user_id: str, seed_track_id: Optional[str] = None,
+                                     num_recommendations: int = 10, use_recombee: bool = True,
+                                     long_tail_quota: float = 0.0) -> List[Dict]:
+        """
+        Varianta non-blocantă a hybrid_recommend: Recombee prin clientul asincron, iar scorarea
+        locală (CPU) într-un executor, ca bucla de evenimente să nu fie blocată
+        """
+        if use_recombee and self.recombee_client:
+            recombee_recs = await self.recombee_recommend_async(user_id, num_recommendations)
+            if recombee_recs:
+                return recombee_recs
+        
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._local_hybrid_recommend, user_id, seed_track_id, num_recommendations, long_tail_quota
+        )
+    
+    def get_dataset_examples(self) -> Dict:
+        """Returnează exemple specifice din dataset pentru prezentare (din rezumatul precalculat)"""
+        return {
+            key: self.tracks.get(track_id) if track_id else None
+            for key, track_id in self.dataset_summary.extremes.items()
+        }
+    
+    @traced('solve_long_tail_problem')
     def solve_long_tail_problem(self, recommendations: List[Dict], 
-                               diversity_weight: float = 0.3) -> List[Dict]:
+                               diversity_weight: float = 0.3,
+                               max_genre_share: float = 0.4,
+                               popular_threshold: int = 70,
+                               max_popular_share: float = 0.5,
+                               num_results: Optional[int] = None) -> List[Dict]:
         """
-        Rezolvă problema long tail prin diversificare
+        Rezolvă problema long tail prin diversificare (Maximal Marginal Relevance)
         
         Strategie:
-        1. Include piese din genuri diverse
-        2. Include piese cu popularitate variabilă
-        3. Balansează între popularitate și diversitate
+        1. Piesele sunt alese greedy după (1 - diversity_weight) * relevanță
+           - diversity_weight * similaritatea acustică maximă cu piesele deja alese
+        2. Cel mult max_genre_share din listă poate fi din același gen
+        3. Cel mult max_popular_share din listă poate avea popularitate >= popular_threshold
+        
+        Constrângerile se relaxează doar când niciun candidat nu le mai respectă. Similaritatea
+        folosește vectorii normalizați din catalog (centrați); după fiecare alegere, similaritatea maximă
+        a tuturor candidaților este actualizată printr-un singur produs matrice-vector,
+        deci costul total este O(k * n).
+        
+        Args:
+            recommendations: Candidații, în ordinea relevanței
+            diversity_weight: 0 = doar relevanță, 1 = doar diversitate
+            num_results: Câte piese se returnează (implicit toți candidații, reordonați)
         """
-        if not recommendations:
+        # Deduplicare (prima apariție rămâne, în ordinea inițială)
+        unique = {}
+        for rec in recommendations:
+            unique.setdefault(rec['track_id'], rec)
+        candidates = list(unique.values())
+        if not candidates:
             return []
         
-        # Grupează după gen
-        genre_groups = defaultdict(list)
-        for rec in recommendations:
-            genre = rec.get('track_genre') or rec.get('genre', 'unknown')
-            genre_groups[genre].append(rec)
-        
-        # Diversifică: ia câte o piesă din fiecare gen
-        diversified = []
-        used_tracks = set()
-        
-        # Runde de diversificare
-        max_rounds = max(len(group) for group in genre_groups.values())
-        for round_num in range(max_rounds):
-            for genre, tracks in genre_groups.items():
-                if round_num < len(tracks):
-                    track = tracks[round_num]
-                    if track['track_id'] not in used_tracks:
-                        diversified.append(track)
-                        used_tracks.add(track['track_id'])
-        
-        # Completează cu restul dacă nu sunt suficiente
-        for rec in recommendations:
-            if rec['track_id'] not in used_tracks and len(diversified) < len(recommendations):
-                diversified.append(rec)
-                used_tracks.add(rec['track_id'])
+        count = len(candidates)
+        k = count if num_results is None else max(0, min(count, num_results))
+        relevance = self._relevance_scores(candidates)
+        
+        # Vectori unitari centrați (piesele necunoscute local rămân pe zero: nu seamănă cu nimic)
+        rows = np.array([self.catalog.row_of.get(rec['track_id'], -1) for rec in candidates])
+        known = rows >= 0
+        vectors = np.zeros((count, self.catalog.features.shape[1]))
+        vectors[known] = self.diversity_vectors()[rows[known]]
+        
+        genre_code_of = {}
+        genre_codes = np.array([
+            genre_code_of.setdefault(rec.get('track_genre') or rec.get('genre', 'unknown'), len(genre_code_of))
+            for rec in candidates
+        ])
+        popular = np.array([rec.get('popularity', 0) >= popular_threshold for rec in candidates])
+        
+        selected = self.mmr_select(vectors, relevance, genre_codes, popular, k,
+                                   diversity_weight, max_genre_share, max_popular_share)
+        return [candidates[position] for position in selected]
+    
+    @staticmethod
+    def mmr_select(vectors: np.ndarray, relevance: np.ndarray, genre_codes: np.ndarray,
+                   popular: np.ndarray, k: int, diversity_weight: float = 0.3,
+                   max_genre_share: float = 0.4, max_popular_share: float = 0.5) -> List[int]:
+        """
+        Selecția MMR comună (folosită și de pipeline.Diversifier): pozițiile alese, în ordine
+        
+        vectors: vectorii unitari ai candidaților (similaritatea = produs scalar)
+        relevance: relevanța în [0, 1]; genre_codes: coduri de gen întregi (0..G-1)
+        popular: True pentru piesele peste pragul de popularitate
+        """
+        count = len(relevance)
+        k = max(0, min(count, k))
+        genre_cap = max(1, math.ceil(max_genre_share * k))
+        popular_cap = max(1, math.ceil(max_popular_share * k))
+        genre_counts = np.zeros(int(genre_codes.max()) + 1 if count else 0, dtype=np.int64)
+        popular_count = 0
+        
+        available = np.ones(count, dtype=bool)
+        max_similarity = np.zeros(count)
+        selected = []
+        for _ in range(k):
+            allowed = available & (genre_counts[genre_codes] < genre_cap)
+            if popular_count >= popular_cap:
+                allowed &= ~popular
+            if not allowed.any():
+                allowed = available
+            
+            mmr = (1.0 - diversity_weight) * relevance - diversity_weight * max_similarity
+            pick = int(np.argmax(np.where(allowed, mmr, -np.inf)))
+            
+            selected.append(pick)
+            available[pick] = False
+            genre_counts[genre_codes[pick]] += 1
+            popular_count += int(popular[pick])
+            np.maximum(max_similarity, vectors @ vectors[pick], out=max_similarity)
+        
+        return selected
+    
+    def diversity_vectors(self) -> np.ndarray:
+        """
+        Caracteristicile normalizate, centrate pe media catalogului și aduse la normă 1 (folosite
+        de diversificarea MMR, aici și în pipeline.py)
         
-        return diversified[:len(recommendations)]
+        Caracteristicile sunt toate pozitive, deci cosinusul dintre vectorii necentrați este
+        aproape 1 pentru orice pereche; după centrare, similaritatea deosebește piesele
+        redundante de cele diferite. Se recalculează doar când catalogul se schimbă.
+        """
+        cached = self._diversity_cache
+        if cached is None or cached[0] is not self.catalog:
+            centered = self.catalog.features - self.catalog.features.mean(axis=0)
+            norms = np.linalg.norm(centered, axis=1, keepdims=True)
+            vectors = np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 0)
+            cached = self._diversity_cache = (self.catalog, vectors)
+        return cached[1]
+    
+    @staticmethod
+    def _relevance_scores(recommendations: List[Dict]) -> np.ndarray:
+        """
+        Relevanța candidaților în [0, 1]: primul scor comun tuturor care îi deosebește
+        (final_score, similarity_score sau match_score), altfel poziția în listă; un scor
+        identic pentru toți nu spune nimic despre ordine. final_score-ul pieselor de la
+        Recombee este valoarea implicită 0.8 (catalogul nu are `rating`), deci pentru ele
+        contează ordinea în care le-a returnat Recombee.
+        """
+        count = len(recommendations)
+        keys = ('final_score', 'similarity_score', 'match_score')
+        if any(str(rec.get('source', '')).startswith('recombee') for rec in recommendations):
+            keys = keys[1:]
+        for key in keys:
+            if all(rec.get(key) is not None for rec in recommendations):
+                scores = np.array([float(rec[key]) for rec in recommendations])
+                spread = scores.max() - scores.min()
+                if spread > 0:
+                    return (scores - scores.min()) / spread
+        
+        if count == 1:
+            return np.ones(1)
+        return 1.0 - np.arange(count, dtype=np.float64) / (count - 1)
 
 
 # Exemplu de utilizare
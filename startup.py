@@ -0,0 +1,122 @@
+"""
+Inițializare leneșă și raportul timpilor de pornire
+Componentele scumpe (catalogul, clientul Recombee, stocarea utilizatorilor) sunt create
+la prima utilizare sau de un fir de încălzire, nu la importul aplicației, astfel încât
+un worker nou poate răspunde la health check imediat după pornire.
+"""
+
+import time
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+
+class StartupReport:
+    """Duratele etapelor de pornire (secunde), în ordinea în care s-au terminat"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases: Dict[str, float] = {}
+        self.created_at = time.time()
+
+    def record(self, phase: str, seconds: float):
+        with self._lock:
+            self._phases[phase] = seconds
+        print(f"⏱️ Pornire: {phase} în {seconds * 1000:.0f} ms")
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            phases = dict(self._phases)
+        return {
+            'phases_ms': {phase: round(seconds * 1000, 1) for phase, seconds in phases.items()},
+            'since_start_seconds': round(time.time() - self.created_at, 1)
+        }
+
+
+# Raportul procesului curent
+report = StartupReport()
+
+
+class LazyService:
+    """
+    Proxy care construiește obiectul la primul acces la un atribut (sigur pentru mai multe fire)
+
+    Codul existent folosește proxy-ul exact ca obiectul real (system.tracks,
+    user_storage.get_user_profile(...)); durata construcției apare în raportul de pornire.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], object]):
+        # Atributele proprii sunt setate direct, ca __getattr__ să nu fie apelat pentru ele
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+        object.__setattr__(self, '_error', None)
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    @property
+    def error(self) -> Optional[str]:
+        """Eroarea ultimei încercări de inițializare (dacă a eșuat)"""
+        return self._error
+
+    def get(self):
+        """Returnează obiectul real, construindu-l la primul apel"""
+        instance = self._instance
+        if instance is not None:
+            return instance
+        with self._lock:
+            if self._instance is None:
+                started = time.perf_counter()
+                try:
+                    instance = self._factory()
+                except Exception as e:
+                    object.__setattr__(self, '_error', str(e))
+                    raise
+                object.__setattr__(self, '_instance', instance)
+                object.__setattr__(self, '_error', None)
+                report.record(self._name, time.perf_counter() - started)
+            return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get(), name, value)
+
+    def __repr__(self):
+        state = 'inițializat' if self.initialized else 'neinițializat'
+        return f'<LazyService {self._name} ({state})>'
+
+
+class WarmUp:
+    """Firul de încălzire: inițializează serviciile în fundal, în ordinea dată"""
+
+    def __init__(self, services: Iterable[LazyService], warmers: Iterable[Callable[[], None]] = ()):
+        self.services = list(services)
+        self.warmers = list(warmers)
+        self.done = threading.Event()
+        self.errors: Dict[str, str] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'WarmUp':
+        self._thread = threading.Thread(target=self._run, name='warm-up', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        started = time.perf_counter()
+        for service in self.services:
+            try:
+                service.get()
+            except Exception as e:
+                self.errors[service._name] = str(e)
+                print(f"Eroare la inițializarea {service._name}: {e}")
+        for warmer in self.warmers:
+            try:
+                warmer()
+            except Exception as e:
+                self.errors[getattr(warmer, '__name__', 'warmer')] = str(e)
+        report.record('warm_up_total', time.perf_counter() - started)
+        self.done.set()
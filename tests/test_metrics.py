@@ -0,0 +1,44 @@
+"""
+Teste pentru MetricsRegistry: bucket-urile specifice etapelor de pipeline
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsRegistry, DEFAULT_BUCKETS, STAGE_BUCKETS
+
+
+class StageBucketsTest(unittest.TestCase):
+    """Duratele sub o milisecundă ale etapelor nu sunt raportate ca primul bucket implicit (5 ms)"""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_sub_millisecond_stages_have_their_own_quantiles(self):
+        for _ in range(100):
+            self.registry.observe('pipeline_stage_duration_seconds', 0.00006,
+                                  {'pipeline': 'local-hybrid', 'stage': 'rerank'})
+
+        row, = self.registry.summary()['pipelines']
+        self.assertEqual(row['avg_ms'], 0.06)
+        self.assertEqual(row['p50_ms'], 0.1)
+        self.assertEqual(row['p99_ms'], 0.1)
+
+        text = self.registry.render_prometheus()
+        self.assertEqual(text.count('pipeline_stage_duration_seconds_bucket{'), len(STAGE_BUCKETS) + 1)
+        self.assertIn('le="0.0001"} 100', text)
+
+    def test_other_histograms_keep_the_default_buckets(self):
+        self.registry.record_request('/api/tracks', 'GET', 200, 0.00006)
+
+        row, = self.registry.summary()['routes']
+        self.assertEqual(row['p50_ms'], DEFAULT_BUCKETS[0] * 1000)
+        self.assertEqual(self.registry.render_prometheus().count('http_request_duration_seconds_bucket{'),
+                         len(DEFAULT_BUCKETS) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
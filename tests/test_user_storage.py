@@ -0,0 +1,126 @@
+"""
+Teste pentru UserStorage: salvarea concurentă în modul 'fsync' și excluderile pentru Recombee
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_storage import UserStorage, DURABILITY_FSYNC, RECOMBEE_FILTER_MAX_TRACKS
+
+
+class FsyncConcurrencyTest(unittest.TestCase):
+    """Modificările concurente cu arhivarea activă nu trebuie să blocheze firele (ordinea lock-urilor)"""
+
+    EVENTS = 400
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = UserStorage(
+            storage_file=os.path.join(self.tmp.name, 'users.json'),
+            archive_dir=os.path.join(self.tmp.name, 'archive'),
+            history_limit=20, archive_batch=5, durability=DURABILITY_FSYNC
+        )
+        self.deadlocked = False
+
+    def tearDown(self):
+        # După un deadlock, close() ar aștepta aceleași lock-uri
+        if not self.deadlocked:
+            self.storage.close()
+        self.tmp.cleanup()
+
+    def _run_threads(self, *targets):
+        errors = []
+
+        def guarded(target):
+            try:
+                target()
+            except Exception as e:  # eroarea este raportată de test, nu pierdută în fir
+                errors.append(e)
+
+        threads = [threading.Thread(target=guarded, args=(target,), daemon=True) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+        self.deadlocked = any(thread.is_alive() for thread in threads)
+        self.assertFalse(self.deadlocked, 'firele s-au blocat (deadlock)')
+        self.assertEqual(errors, [])
+
+    def test_likes_and_interactions_do_not_deadlock(self):
+        def like():
+            for i in range(self.EVENTS):
+                self.storage.add_liked_track(f'liker{i % 3}', f'track{i}')
+                self.storage.add_disliked_track(f'liker{i % 3}', f'other{i}')
+
+        def listen():
+            for i in range(self.EVENTS):
+                self.storage.add_interaction(f'listener{i % 3}', f'track{i}', 'listen')
+
+        def batch():
+            for i in range(self.EVENTS // 10):
+                self.storage.add_interactions_batch(f'batch{i % 3}', [
+                    {'track_id': f'track{i}-{j}', 'interaction_type': 'listen'} for j in range(10)
+                ], send_to_recombee=False)
+
+        self._run_threads(like, listen, batch)
+
+        self.assertEqual(len(self.storage.get_user_liked_tracks('liker0')), -(-self.EVENTS // 3))
+        history = self.storage.get_full_history('listener0')
+        self.assertEqual(len(history), -(-self.EVENTS // 3))
+
+
+class ExclusionTest(unittest.TestCase):
+    """Piesele arhivate și cele care nu încap în filtrul ReQL rămân excluse"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = self._open()
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp.cleanup()
+
+    def _open(self):
+        return UserStorage(
+            storage_file=os.path.join(self.tmp.name, 'users.json'),
+            archive_dir=os.path.join(self.tmp.name, 'archive'),
+            history_limit=20, archive_batch=5, durability=DURABILITY_FSYNC
+        )
+
+    def test_archived_tracks_stay_excluded_after_restart(self):
+        for i in range(60):
+            self.storage.add_interaction('user', f'track{i}', 'listen')
+        self.storage.flush()
+        self.assertTrue(self.storage.get_archived_history('user'))
+
+        self.storage.close()
+        self.storage = self._open()
+
+        self.assertEqual(len(self.storage.get_recombee_filter_overflow('user')), 0)
+        expression = self.storage.get_recombee_filter('user')
+        for i in range(60):
+            self.assertIn(f'"track{i}"', expression)
+
+    def test_filter_overflow_holds_the_remaining_exclusions(self):
+        total = RECOMBEE_FILTER_MAX_TRACKS + 30
+        self.storage.add_interactions_batch('user', [
+            {'track_id': f'track{i}', 'interaction_type': 'listen'} for i in range(total)
+        ], send_to_recombee=False)
+        self.storage.flush()
+
+        expression = self.storage.get_recombee_filter('user')
+        overflow = self.storage.get_recombee_filter_overflow('user')
+        self.assertEqual(expression.count('"track'), RECOMBEE_FILTER_MAX_TRACKS)
+        self.assertEqual(len(overflow), 30)
+        self.assertTrue(all(f'"{track_id}"' not in expression for track_id in overflow))
+        # Cele mai recente ascultări au prioritate în filtru
+        self.assertIn(f'"track{total - 1}"', expression)
+
+
+if __name__ == '__main__':
+    unittest.main()
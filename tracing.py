@@ -0,0 +1,177 @@
+"""
+Trasare pe etape a căii critice (span-uri imbricate)
+Măsoară cât durează fiecare etapă a unei cereri (crearea profilului, scorarea, sortarea,
+diversificarea, serializarea JSON). Când cererea nu este trasată, span() și @traced
+costă o singură citire de ContextVar.
+
+Activare:
+    - per cerere: antetul `X-Debug-Trace: 1` sau `?debug=trace` (rezultatul în antetul Server-Timing)
+    - eșantionat: TRACE_SAMPLE_RATE=0.01 scrie 1% din cereri în TRACE_LOG_FILE (JSONL)
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from typing import Dict, List, Optional
+
+# Fracțiunea cererilor scrise în fișierul de trasări (0 = dezactivat)
+try:
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+except ValueError:
+    TRACE_SAMPLE_RATE = 0.0
+TRACE_LOG_FILE = os.getenv('TRACE_LOG_FILE', 'traces.jsonl')
+
+# Span-ul deschis în contextul curent (None = cererea nu este trasată)
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+_log_lock = threading.Lock()
+
+
+class Span:
+    """O etapă măsurată; copiii sunt etapele deschise în interiorul ei"""
+
+    __slots__ = ('name', 'started', 'duration', 'children')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.children: List['Span'] = []
+
+    def close(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.started
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'duration_ms': round((self.duration or 0.0) * 1000, 3),
+            'children': [child.to_dict() for child in self.children]
+        }
+
+
+class _SpanContext:
+    __slots__ = ('parent', 'name', 'span', 'token')
+
+    def __init__(self, parent: Span, name: str):
+        self.parent = parent
+        self.name = name
+
+    def __enter__(self) -> Span:
+        self.span = Span(self.name)
+        self.parent.children.append(self.span)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.close()
+        _current_span.reset(self.token)
+        return False
+
+
+class _NoopContext:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopContext()
+
+
+def span(name: str):
+    """Context manager pentru o etapă; fără efect dacă cererea curentă nu este trasată"""
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return _SpanContext(parent, name)
+
+
+def traced(name: str):
+    """Decorator: întreaga funcție devine un span (apel direct când trasarea este inactivă)"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            parent = _current_span.get()
+            if parent is None:
+                return func(*args, **kwargs)
+            with _SpanContext(parent, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def should_sample() -> bool:
+    """Decide dacă cererea curentă intră în eșantionul scris pe disc"""
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+
+class Trace:
+    """Trasarea unei cereri: span-ul rădăcină și metadatele pentru export"""
+
+    def __init__(self, name: str, sampled: bool = False):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.sampled = sampled
+        self.timestamp = datetime.now().isoformat()
+        self.root = Span(name)
+        self._token = _current_span.set(self.root)
+        self.finished = False
+
+    def finish(self):
+        """Închide trasarea și o scoate din context (idempotent)"""
+        if self.finished:
+            return
+        self.finished = True
+        self.root.close()
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Închisă din alt context (ex. teardown după o excepție)
+            _current_span.set(None)
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'timestamp': self.timestamp,
+            **self.root.to_dict()
+        }
+
+    def server_timing(self) -> str:
+        """Valoarea antetului Server-Timing: câte o intrare per span, cu calea în descriere"""
+        entries = []
+
+        def visit(node: Span, path: str, index: List[int]):
+            for child in node.children:
+                index[0] += 1
+                child_path = f'{path} > {child.name}' if path else child.name
+                duration_ms = (child.duration or 0.0) * 1000
+                entries.append(f'{child.name.replace(" ", "_")}-{index[0]};dur={duration_ms:.2f};'
+                               f'desc="{child_path}"')
+                visit(child, child_path, index)
+
+        entries.append(f'total;dur={(self.root.duration or 0.0) * 1000:.2f}')
+        visit(self.root, '', [0])
+        return ', '.join(entries)
+
+    def write(self, path: str = None):
+        """Adaugă trasarea ca o linie JSON în fișierul de trasări"""
+        line = json.dumps(self.to_dict(), ensure_ascii=False)
+        try:
+            with _log_lock, open(path or TRACE_LOG_FILE, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            print(f"Eroare la scrierea trasării: {e}")
+
+
+def start_trace(name: str, sampled: bool = False) -> Trace:
+    """Pornește trasarea în contextul curent; span-urile deschise ulterior devin copiii ei"""
+    return Trace(name, sampled=sampled)
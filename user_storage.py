@@ -5,19 +5,136 @@ Salvează datele utilizatorilor și interacțiunile lor
 
 import json
 import os
+import re
+import gzip
+import time
+import atexit
 import hashlib
+import bisect
+import heapq
+import secrets
+import threading
 from datetime import datetime
-from typing import Dict, List, Optional
-from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+from collections import defaultdict, deque
+
+import numpy as np
+
+from cooccurrence import CooccurrenceIndex
+
+# Câmpurile din înregistrarea utilizatorului care cresc cu fiecare eveniment
+HISTORY_FIELDS = ('interactions', 'listening_history')
+
+# Moduri de durabilitate pentru salvarea datelor utilizatorilor
+DURABILITY_FSYNC = 'fsync'              # Scriere sincronă + fsync la fiecare modificare
+DURABILITY_GROUP = 'group'              # Modificările sunt grupate, fsync la fiecare scriere de grup
+DURABILITY_BEST_EFFORT = 'best_effort'  # Modificările sunt grupate, fără fsync (cache-ul OS)
+DURABILITY_MODES = (DURABILITY_FSYNC, DURABILITY_GROUP, DURABILITY_BEST_EFFORT)
+
+# Listele de piese care contribuie la profilul de gust și cheia mediei lor în `taste`
+TASTE_FIELDS = {'liked_tracks': 'liked', 'disliked_tracks': 'disliked'}
+
+# Câte piese intră cel mult în filtrul ReQL de excludere trimis către Recombee (limita ține
+# cererea sub dimensiunea acceptată de API): toate cele apreciate/neapreciate întâi, apoi cele
+# ascultate, cele mai recente întâi. Restul sunt returnate de get_recombee_filter_overflow și
+# filtrate local de apelant (care cere de la Recombee câteva piese în plus).
+RECOMBEE_FILTER_MAX_TRACKS = 500
+
+
+def get_recommendation_type(liked_tracks_count: int) -> str:
+    """Tipul de recomandări potrivit pentru un utilizator, după numărul de piese apreciate"""
+    if liked_tracks_count < 10:
+        return 'knowledge-based'
+    elif liked_tracks_count < 25:
+        return 'mixed'
+    return 'content-based'
+
 
 class UserStorage:
     """Gestionează stocarea datelor utilizatorilor"""
     
-    def __init__(self, storage_file: str = 'users_data.json', recommendation_system=None):
+    def __init__(self, storage_file: str = 'users_data.json', recommendation_system=None,
+                 history_limit: Optional[int] = 500, archive_batch: int = 50,
+                 archive_dir: str = 'users_archive', flush_interval_ms: int = 200,
+                 durability: str = DURABILITY_GROUP, recent_interactions_limit: int = 1000):
+        """
+        Args:
+            storage_file: Fișierul JSON cu datele utilizatorilor
+            recommendation_system: Sistemul de recomandare (pentru sincronizare cu Recombee)
+            history_limit: Numărul de evenimente recente păstrate în înregistrare pentru
+                `interactions` și `listening_history` (None = fără limită)
+            archive_batch: Câte evenimente peste limită se acumulează înainte de arhivare,
+                pentru ca arhiva să nu fie scrisă la fiecare eveniment
+            archive_dir: Directorul cu arhivele comprimate (gzip JSONL, câte una per utilizator)
+            flush_interval_ms: Intervalul minim dintre două scrieri pe disc făcute de
+                firul de salvare în fundal
+            durability: Modul de durabilitate ('fsync', 'group' sau 'best_effort')
+            recent_interactions_limit: Câte interacțiuni recente (din toți utilizatorii)
+                sunt păstrate în indexul global ordonat după timp
+        """
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'Mod de durabilitate necunoscut: {durability}')
+        
         self.storage_file = storage_file
+        self.history_limit = history_limit
+        self.archive_batch = max(0, archive_batch)
+        self.archive_dir = archive_dir
+        self.flush_interval = max(0, flush_interval_ms) / 1000.0
+        self.durability = durability
+        
+        # Starea firului de salvare: modificările marchează datele ca „dirty”,
+        # iar firul le scrie grupat, cel mult o dată la `flush_interval`
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._flush_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher_thread = None
+        self._last_flush = 0.0
+        # Câmpurile de istoric (user_id, câmp) care au depășit pragul și așteaptă arhivarea,
+        # făcută de firul de salvare după scrierea atomică a fișierului JSON
+        self._archive_due: Set[Tuple[str, str]] = set()
+        
         self.users = self._load_users()
         self.auth_data = self._load_auth_data()  # Stochează datele de autentificare
         self.recommendation_system = recommendation_system  # Pentru sincronizare cu Recombee
+        
+        # Indecși set pentru verificarea în O(1) a pieselor apreciate/neapreciate.
+        # Listele din înregistrarea utilizatorului rămân sursa persistată (ordinea inserării),
+        # seturile sunt construite la prima utilizare și ținute sincronizate cu listele.
+        self._liked_index: Dict[str, Set[str]] = {}
+        self._disliked_index: Dict[str, Set[str]] = {}
+        
+        # Agregate pentru administrare, ținute la zi la fiecare modificare
+        self._aggregates = {
+            'total_interactions': 0,
+            'interaction_types': defaultdict(int),
+            'user_interactions': defaultdict(int),
+            'recommendation_types': defaultdict(int)
+        }
+        
+        # Versiunea fiecărei înregistrări (crește la fiecare modificare), pentru validatori HTTP;
+        # tokenul instanței face versiunile distincte între procese și reporniri
+        self._user_versions: Dict[str, int] = defaultdict(int)
+        self._instance_token = secrets.token_hex(4)
+        
+        # Index global al interacțiunilor recente, ordonat după timp (cele mai noi la dreapta)
+        self._recent_interactions = deque(maxlen=max(1, recent_interactions_limit))
+        
+        # Matricea de co-apariții pentru filtrarea colaborativă locală (construită la prima utilizare)
+        self._cooccurrence: Optional[CooccurrenceIndex] = None
+        
+        # Piesele pe care utilizatorul nu trebuie să le mai primească (văzute, apreciate,
+        # neapreciate): setul de ID-uri, bitset-ul pe rândurile catalogului (catalog, octeți)
+        # și filtrul ReQL pentru Recombee, toate construite la prima utilizare
+        self._excluded_index: Dict[str, Set[str]] = {}
+        self._exclusion_bits: Dict[str, tuple] = {}
+        self._recombee_filters: Dict[str, Tuple[Optional[str], frozenset]] = {}
+        
+        # Aduce înregistrările existente în limitele de retenție
+        if self._prepare_loaded_users():
+            self._save_users()
+        self._build_recent_interactions()
     
     def _load_users(self) -> Dict:
         """Încarcă datele utilizatorilor din fișier"""
@@ -29,17 +146,362 @@ class UserStorage:
                 return {}
         return {}
     
+    def _prepare_loaded_users(self) -> bool:
+        """
+        Completează contoarele și piesele arhivate lipsă și programează arhivarea istoricului
+        peste limită. Returnează True dacă datele trebuie salvate
+        """
+        changed = False
+        for user_id, user_data in self.users.items():
+            stats = user_data.setdefault('stats', {})
+            if 'total_interactions' not in stats:
+                stats['total_interactions'] = len(user_data.get('interactions', []))
+                changed = True
+            if 'interaction_types' not in stats:
+                interaction_types = defaultdict(int)
+                for interaction in user_data.get('interactions', []):
+                    interaction_types[interaction.get('type', 'unknown')] += 1
+                stats['interaction_types'] = dict(interaction_types)
+                changed = True
+            if 'archive_offsets' in user_data and 'archived_track_ids' not in user_data:
+                # Arhivele scrise înainte de evidența pieselor arhivate sunt citite o singură dată
+                for field in HISTORY_FIELDS:
+                    self._remember_archived_tracks(user_data, self.get_archived_history(user_id, field))
+                changed = True
+            for field in HISTORY_FIELDS:
+                if self._trim_history(user_id, field, force=True):
+                    changed = True
+            self._add_user_to_aggregates(user_id)
+        return changed
+    
+    def _add_user_to_aggregates(self, user_id: str):
+        """Adaugă contribuția unui utilizator la agregatele de administrare"""
+        user_data = self.users[user_id]
+        stats = user_data.get('stats', {})
+        
+        self._aggregates['total_interactions'] += stats.get('total_interactions', 0)
+        self._aggregates['user_interactions'][user_id] = stats.get('total_interactions', 0)
+        for interaction_type, count in stats.get('interaction_types', {}).items():
+            self._aggregates['interaction_types'][interaction_type] += count
+        
+        liked_count = len(user_data.get('liked_tracks', []))
+        self._aggregates['recommendation_types'][get_recommendation_type(liked_count)] += 1
+    
+    def _record_interaction_in_aggregates(self, user_id: str, interaction_type: str):
+        """Actualizează contoarele utilizatorului și agregatele globale pentru o interacțiune"""
+        stats = self.users[user_id]['stats']
+        stats['total_interactions'] = stats.get('total_interactions', 0) + 1
+        interaction_types = stats.setdefault('interaction_types', {})
+        interaction_types[interaction_type] = interaction_types.get(interaction_type, 0) + 1
+        
+        self._aggregates['total_interactions'] += 1
+        self._aggregates['interaction_types'][interaction_type] += 1
+        self._aggregates['user_interactions'][user_id] += 1
+    
+    def _build_recent_interactions(self):
+        """
+        Populează indexul global cu cele mai noi interacțiuni la pornire
+        Listele fiecărui utilizator sunt deja ordonate după timp, așa că ultimele
+        `maxlen` din fiecare sunt interclasate cu heapq.merge.
+        """
+        limit = self._recent_interactions.maxlen
+        per_user = []
+        for user_id, user_data in self.users.items():
+            tail = user_data.get('interactions', [])[-limit:]
+            per_user.append([(i.get('timestamp') or '', user_id, i) for i in tail])
+        
+        merged = heapq.merge(*per_user, key=lambda entry: entry[0])
+        self._recent_interactions.clear()
+        self._recent_interactions.extend((user_id, i) for _, user_id, i in merged)
+    
+    @staticmethod
+    def _format_recent_interaction(user_id: str, interaction: Dict) -> Dict:
+        """Formatul unei interacțiuni returnate de interogările de recență"""
+        return {
+            'user_id': user_id,
+            'track_id': interaction.get('track_id'),
+            'type': interaction.get('type', 'unknown'),
+            'timestamp': interaction.get('timestamp'),
+            'recomm_id': interaction.get('recomm_id'),
+            'has_recomm_id': bool(interaction.get('recomm_id'))
+        }
+    
+    def get_recent_interactions(self, limit: int = 10, since: Optional[str] = None,
+                                user_id: Optional[str] = None) -> List[Dict]:
+        """
+        Returnează cele mai noi interacțiuni, descrescător după timp
+        
+        Args:
+            limit: Numărul maxim de interacțiuni returnate
+            since: Timestamp ISO; sunt returnate doar interacțiunile strict mai noi
+            user_id: Dacă este specificat, caută doar în interacțiunile utilizatorului
+        
+        Fără user_id se folosește indexul global (cel mult `recent_interactions_limit`
+        evenimente); cu user_id se folosește lista utilizatorului, deja ordonată după timp.
+        Costul este proporțional cu numărul de rezultate, nu cu dimensiunea datelor.
+        """
+        with self._lock:
+            if user_id is not None:
+                interactions = self.users.get(user_id, {}).get('interactions', [])
+                start = 0
+                if since is not None:
+                    start = bisect.bisect_right(
+                        interactions, since, key=lambda i: i.get('timestamp') or ''
+                    )
+                start = max(start, len(interactions) - limit)
+                return [self._format_recent_interaction(user_id, i)
+                        for i in reversed(interactions[start:])]
+            
+            result = []
+            for entry_user_id, interaction in reversed(self._recent_interactions):
+                if len(result) >= limit:
+                    break
+                if since is not None and (interaction.get('timestamp') or '') <= since:
+                    break
+                result.append(self._format_recent_interaction(entry_user_id, interaction))
+            return result
+    
+    def get_admin_summary(self) -> Dict:
+        """Returnează agregatele de administrare (fără a parcurge utilizatorii sau interacțiunile)"""
+        with self._lock:
+            return {
+                'total_users': len(self.users),
+                'total_interactions': self._aggregates['total_interactions'],
+                'interaction_types': dict(self._aggregates['interaction_types']),
+                'recommendation_types': dict(self._aggregates['recommendation_types'])
+            }
+    
+    def get_user_interaction_count(self, user_id: str) -> int:
+        """Numărul total de interacțiuni ale utilizatorului (inclusiv cele arhivate)"""
+        return self._aggregates['user_interactions'].get(user_id, 0)
+    
+    def _archive_path(self, user_id: str, field: str) -> str:
+        """Calea arhivei comprimate pentru un câmp de istoric al utilizatorului"""
+        safe_user_id = re.sub(r'[^A-Za-z0-9_.-]', '_', user_id)
+        return os.path.join(self.archive_dir, f'{safe_user_id}.{field}.jsonl.gz')
+    
+    def _trim_history(self, user_id: str, field: str, force: bool = False) -> bool:
+        """
+        Programează arhivarea evenimentelor din `field` peste ultimele `history_limit`
+        Arhivarea are loc doar când lista depășește limita cu `archive_batch` (sau oricând
+        depășește limita, dacă `force` este True) și este făcută de firul de salvare, după
+        scrierea fișierului JSON (apelantul deține lock-ul).
+        Returnează True dacă arhivarea a fost programată
+        """
+        if self.history_limit is None:
+            return False
+        
+        history = self.users[user_id].get(field, [])
+        threshold = self.history_limit if force else self.history_limit + self.archive_batch
+        if len(history) <= threshold:
+            return False
+        
+        self._archive_due.add((user_id, field))
+        return True
+    
+    def _collect_archive_jobs(self) -> List[Tuple[str, str, List[Dict], Optional[int]]]:
+        """
+        Evenimentele de arhivat (user_id, câmp, evenimente, dimensiunea confirmată a arhivei),
+        luate din același snapshot ca fișierul JSON care urmează să fie scris (apelantul deține lock-ul)
+        """
+        jobs = []
+        for user_id, field in self._archive_due:
+            user_data = self.users.get(user_id)
+            if user_data is None:
+                continue
+            history = user_data.get(field, [])
+            overflow = len(history) - self.history_limit
+            if overflow > 0:
+                offset = user_data.get('archive_offsets', {}).get(field)
+                jobs.append((user_id, field, history[:overflow], offset))
+        self._archive_due.clear()
+        return jobs
+    
+    def _append_archive(self, user_id: str, field: str, events: List[Dict], offset: Optional[int]) -> int:
+        """
+        Adaugă evenimentele în arhiva comprimată și returnează noua ei dimensiune
+        
+        `offset` este dimensiunea arhivei confirmată în fișierul JSON: dacă arhiva este mai mare,
+        o adăugare anterioară s-a întrerupt înainte ca scurtarea istoricului să fie salvată, deci
+        surplusul este tăiat și evenimentele (încă prezente în înregistrare) sunt scrise o singură dată.
+        Arhivele dinaintea acestei evidențe (fără `offset`) sunt doar continuate.
+        """
+        path = self._archive_path(user_id, field)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        if offset is not None and os.path.exists(path) and os.path.getsize(path) > offset:
+            os.truncate(path, offset)
+        
+        # Fiecare adăugare scrie un nou membru gzip; gzip citește membrii concatenați ca un flux
+        lines = ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+        with open(path, 'ab') as f:
+            f.write(gzip.compress(lines.encode('utf-8')))
+            if self.durability != DURABILITY_BEST_EFFORT:
+                f.flush()
+                os.fsync(f.fileno())
+            return f.tell()
+    
+    def _archive_events(self, jobs: List[Tuple[str, str, List[Dict], Optional[int]]]):
+        """Scrie arhivele și scoate din înregistrări evenimentele arhivate (după salvarea JSON)"""
+        for user_id, field, events, offset in jobs:
+            try:
+                size = self._append_archive(user_id, field, events, offset)
+            except Exception as e:
+                print(f"Eroare la arhivarea istoricului {field} pentru {user_id}: {e}")
+                with self._lock:
+                    self._archive_due.add((user_id, field))
+                continue
+            
+            with self._lock:
+                # Istoricul crește doar la final, deci primele evenimente sunt cele arhivate
+                user_data = self.users[user_id]
+                del user_data.get(field, [])[:len(events)]
+                user_data.setdefault('archive_offsets', {})[field] = size
+                # Piesele arhivate rămân excluse și după o repornire (excluderile se reconstruiesc
+                # din înregistrare, fără a citi arhiva)
+                self._remember_archived_tracks(user_data, events)
+                self._dirty = True
+    
+    @staticmethod
+    def _remember_archived_tracks(user_data: Dict, events: List[Dict]):
+        """Adaugă ID-urile pieselor din evenimentele arhivate în `archived_track_ids` (fără duplicate)"""
+        archived = user_data.setdefault('archived_track_ids', [])
+        known = set(archived)
+        for event in events:
+            track_id = event.get('track_id')
+            if track_id and track_id not in known:
+                known.add(track_id)
+                archived.append(track_id)
+    
+    def get_archived_history(self, user_id: str, field: str = 'interactions') -> List[Dict]:
+        """Citește evenimentele arhivate (cele mai vechi primele) pentru un câmp de istoric"""
+        if field not in HISTORY_FIELDS:
+            raise ValueError(f'Câmp de istoric necunoscut: {field}')
+        
+        archive_path = self._archive_path(user_id, field)
+        if not os.path.exists(archive_path):
+            return []
+        
+        with gzip.open(archive_path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    
+    def get_full_history(self, user_id: str, field: str = 'interactions') -> List[Dict]:
+        """Returnează istoricul complet: evenimentele arhivate urmate de cele din înregistrare"""
+        return self.get_archived_history(user_id, field) + \
+            list(self.users.get(user_id, {}).get(field, []))
+    
     def load_users_data(self) -> Dict:
         """Returnează toate datele utilizatorilor pentru sincronizare"""
+        for user_id in list(self.users):
+            self.get_taste(user_id)
+        self.flush()
         return self._load_users()
     
-    def _save_users(self):
-        """Salvează datele utilizatorilor în fișier"""
-        with open(self.storage_file, 'w', encoding='utf-8') as f:
-            json.dump(self.users, f, indent=2, ensure_ascii=False)
+    def _save_users(self, user_id: Optional[str] = None):
+        """
+        Marchează datele utilizatorilor ca modificate (și versiunea lui `user_id`, dacă este dat)
+        În modul 'fsync' scrie imediat pe disc; altfel scrierea este făcută grupat
+        de firul de salvare din fundal.
+        
+        Nu se apelează cu _lock deținut: flush() ia _write_lock și apoi _lock, deci ordinea
+        inversă ar bloca definitiv două fire (o modificare și o salvare în curs).
+        """
+        with self._lock:
+            self._dirty = True
+            if user_id is not None:
+                self._user_versions[user_id] += 1
+        
+        if self.durability == DURABILITY_FSYNC or self._stopped.is_set():
+            self.flush()
+            return
+        
+        self._ensure_flusher()
+        self._flush_requested.set()
+    
+    def _ensure_flusher(self):
+        """Pornește firul de salvare la prima modificare"""
+        with self._lock:
+            if self._flusher_thread is not None or self._stopped.is_set():
+                return
+            self._flusher_thread = threading.Thread(
+                target=self._flusher_loop, name='UserStorageFlusher', daemon=True
+            )
+            self._flusher_thread.start()
+            atexit.register(self.close)
+    
+    def _flusher_loop(self):
+        """Grupează modificările și le scrie pe disc cel mult o dată la `flush_interval`"""
+        while not self._stopped.is_set():
+            self._flush_requested.wait()
+            if self._stopped.is_set():
+                break
+            
+            # Așteaptă restul intervalului, ca modificările apropiate să fie scrise împreună
+            remaining = self._last_flush + self.flush_interval - time.monotonic()
+            if remaining > 0:
+                self._stopped.wait(remaining)
+            
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Eroare la salvarea datelor utilizatorilor: {e}")
+    
+    def flush(self):
+        """
+        Scrie imediat pe disc datele utilizatorilor, dacă au fost modificate
+        Istoricul peste limită este arhivat abia după scrierea atomică a fișierului JSON, iar
+        scurtarea listelor este salvată imediat după (o nouă scriere).
+        """
+        with self._write_lock:
+            jobs = self._write_snapshot()
+            while jobs:
+                self._archive_events(jobs)
+                jobs = self._write_snapshot()
+    
+    def _write_snapshot(self) -> List[Tuple[str, str, List[Dict], Optional[int]]]:
+        """Scrie snapshot-ul curent (dacă există modificări); returnează arhivările de făcut"""
+        with self._lock:
+            if not self._dirty:
+                return []
+            # Serializarea se face sub lock pentru un snapshot consistent
+            payload = json.dumps(self.users, indent=2, ensure_ascii=False)
+            self._dirty = False
+            jobs = self._collect_archive_jobs()
+        
+        try:
+            self._write_atomic(payload, fsync=self.durability != DURABILITY_BEST_EFFORT)
+        except Exception:
+            with self._lock:
+                self._dirty = True
+                self._archive_due.update((user_id, field) for user_id, field, _, _ in jobs)
+            raise
+        finally:
+            self._last_flush = time.monotonic()
+        return jobs
+    
+    def _write_atomic(self, payload: str, fsync: bool):
+        """Scrie fișierul printr-un fișier temporar, ca o scriere întreruptă să nu-l corupă"""
+        tmp_file = self.storage_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(payload)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_file, self.storage_file)
+    
+    def close(self):
+        """Oprește firul de salvare și scrie modificările rămase"""
+        self._stopped.set()
+        self._flush_requested.set()
+        thread = self._flusher_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
     
     def get_user_data_for_sync(self, user_id: str) -> Optional[Dict]:
         """Returnează datele unui utilizator pentru sincronizare cu Recombee"""
+        # Profilul de gust (mediile sincronizate) este construit dacă lipsește
+        self.get_taste(user_id)
         return self.users.get(user_id)
     
     def _load_auth_data(self) -> Dict:
@@ -59,12 +521,260 @@ class UserStorage:
         with open(auth_file, 'w', encoding='utf-8') as f:
             json.dump(self.auth_data, f, indent=2, ensure_ascii=False)
     
+    def _track_set(self, index: Dict[str, Set[str]], user_id: str, field: str) -> Set[str]:
+        """Returnează indexul set pentru lista `field` a utilizatorului (îl construiește la nevoie)"""
+        track_set = index.get(user_id)
+        if track_set is None:
+            track_set = set(self.users.get(user_id, {}).get(field, []))
+            index[user_id] = track_set
+        return track_set
+    
+    def _append_unique_track(self, index: Dict[str, Set[str]], user_id: str,
+                             field: str, track_id: str) -> bool:
+        """
+        Adaugă piesa în lista `field` dacă nu există deja
+        Returnează True dacă piesa a fost adăugată
+        """
+        track_set = self._track_set(index, user_id, field)
+        if track_id in track_set:
+            return False
+        tracks = self.users[user_id].setdefault(field, [])
+        tracks.append(track_id)
+        track_set.add(track_id)
+        self._update_taste(user_id, field, track_id)
+        self._update_cooccurrence(user_id, track_id, 'like' if field == 'liked_tracks' else 'dislike')
+        self._mark_excluded(user_id, track_id)
+        
+        if field == 'liked_tracks':
+            # Mută utilizatorul în alt tip de recomandări dacă a trecut un prag
+            previous_type = get_recommendation_type(len(tracks) - 1)
+            current_type = get_recommendation_type(len(tracks))
+            if previous_type != current_type:
+                self._aggregates['recommendation_types'][previous_type] -= 1
+                self._aggregates['recommendation_types'][current_type] += 1
+        return True
+    
+    # ==================== PROFIL DE GUST ====================
+    
+    def _track_features(self, track_id: str) -> Optional[List[float]]:
+        """Caracteristicile normalizate ale piesei din catalog (None dacă nu sunt disponibile)"""
+        if not self.recommendation_system:
+            return None
+        return self.recommendation_system.track_feature_vector(track_id)
+    
+    @staticmethod
+    def _add_to_mean(entry: Dict, features: List[float]):
+        """Actualizează în O(1) media curentă {'count', 'mean'} cu un vector nou"""
+        entry['count'] += 1
+        count = entry['count']
+        entry['mean'] = [mean + (value - mean) / count for mean, value in zip(entry['mean'], features)]
+    
+    def _update_taste(self, user_id: str, field: str, track_id: str):
+        """Adaugă piesa nou apreciată/neapreciată la profilul de gust (apelantul deține lock-ul)"""
+        taste = self.users[user_id].get('taste')
+        if field not in TASTE_FIELDS or taste is None:
+            # Profilul lipsă este construit din liste la prima citire
+            return
+        features = self._track_features(track_id)
+        if features is None:
+            return
+        entry = taste.setdefault(TASTE_FIELDS[field], {'count': 0, 'mean': [0.0] * len(features)})
+        self._add_to_mean(entry, features)
+    
+    def _build_taste(self, user_id: str) -> Optional[Dict]:
+        """Construiește profilul de gust din listele de piese (o singură dată per utilizator)"""
+        if not self.recommendation_system:
+            return None
+        taste = {}
+        for field, key in TASTE_FIELDS.items():
+            for track_id in self.users[user_id].get(field, []):
+                features = self._track_features(track_id)
+                if features is None:
+                    continue
+                entry = taste.setdefault(key, {'count': 0, 'mean': [0.0] * len(features)})
+                self._add_to_mean(entry, features)
+        self.users[user_id]['taste'] = taste
+        return taste
+    
+    def get_taste(self, user_id: str) -> Optional[Dict]:
+        """
+        Profilul de gust al utilizatorului: media curentă și numărul pieselor apreciate
+        ('liked') și neapreciate ('disliked'), pe caracteristicile normalizate din
+        catalog_index.FEATURE_NAMES; persistat în înregistrarea utilizatorului
+        """
+        with self._lock:
+            user_data = self.users.get(user_id)
+            if user_data is None:
+                return None
+            taste = user_data.get('taste')
+            if taste is not None:
+                return taste
+            taste = self._build_taste(user_id)
+            if taste is None:
+                return None
+        self._save_users(user_id)
+        return taste
+    
+    # ==================== FILTRARE COLABORATIVĂ ====================
+    
+    @property
+    def cooccurrence(self) -> CooccurrenceIndex:
+        """Indexul item-item construit din piesele apreciate și interacțiunile tuturor utilizatorilor"""
+        if self._cooccurrence is None:
+            with self._lock:
+                if self._cooccurrence is None:
+                    started = time.perf_counter()
+                    self._cooccurrence = CooccurrenceIndex.from_users(self.users)
+                    print(f"✅ Index de co-apariții construit în {(time.perf_counter() - started) * 1000:.0f} ms: "
+                          f"{self._cooccurrence.stats()}")
+        return self._cooccurrence
+    
+    def _update_cooccurrence(self, user_id: str, track_id: str, interaction_type: str):
+        """
+        Actualizează incremental indexul, dacă a fost deja construit (apelantul deține lock-ul)
+        Piesele neapreciate nu mai contribuie, oricâte interacțiuni pozitive ar urma, exact
+        ca la reconstruirea din înregistrări (CooccurrenceIndex.from_users)
+        """
+        if self._cooccurrence is None:
+            return
+        if interaction_type == 'dislike':
+            self._cooccurrence.remove(user_id, track_id)
+        elif track_id not in self._track_set(self._disliked_index, user_id, 'disliked_tracks'):
+            self._cooccurrence.add(user_id, track_id, interaction_type)
+    
+    def collaborative_scores(self, user_id: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Piesele recomandate colaborativ (piesă, scor), fără cele văzute, apreciate sau neapreciate deja
+        """
+        if user_id not in self.users:
+            return []
+        return self.cooccurrence.recommend(user_id, k, exclude=self.get_excluded_track_set(user_id))
+    
+    # ==================== EXCLUDERI ====================
+    
+    def _excluded_set(self, user_id: str) -> Set[str]:
+        """
+        Setul pieselor excluse (îl construiește din înregistrare la nevoie; apelantul deține lock-ul):
+        apreciate, neapreciate, istoricul păstrat și piesele din istoricul arhivat
+        """
+        excluded = self._excluded_index.get(user_id)
+        if excluded is None:
+            user_data = self.users.get(user_id, {})
+            excluded = set(user_data.get('liked_tracks', [])) | set(user_data.get('disliked_tracks', []))
+            excluded.update(user_data.get('archived_track_ids', []))
+            for field in HISTORY_FIELDS:
+                excluded.update(entry['track_id'] for entry in user_data.get(field, []) if entry.get('track_id'))
+            self._excluded_index[user_id] = excluded
+        return excluded
+    
+    def _mark_excluded(self, user_id: str, track_id: str):
+        """
+        Adaugă piesa la excluderile utilizatorului: setul și bitset-ul sunt actualizate pe loc,
+        filtrul ReQL este invalidat (apelantul deține lock-ul)
+        """
+        excluded = self._excluded_index.get(user_id)
+        if excluded is not None:
+            if track_id in excluded:
+                return
+            excluded.add(track_id)
+        self._recombee_filters.pop(user_id, None)
+        cached = self._exclusion_bits.get(user_id)
+        if cached is not None:
+            catalog, bits = cached
+            row = catalog.row_of.get(track_id)
+            if row is not None:
+                bits[row >> 3] |= np.uint8(0x80 >> (row & 7))  # ordinea biților din np.packbits
+    
+    def get_excluded_track_set(self, user_id: str) -> Set[str]:
+        """
+        Piesele văzute (istoricul păstrat), apreciate sau neapreciate; o copie luată sub lock,
+        ca apelantul să o poată parcurge în timp ce alte cereri adaugă excluderi
+        """
+        with self._lock:
+            if user_id not in self.users:
+                return set()
+            return set(self._excluded_set(user_id))
+    
+    def get_exclusion_mask(self, user_id: str, catalog) -> np.ndarray:
+        """
+        Masca booleană a rândurilor din catalog excluse pentru utilizator
+        Păstrată ca bitset (un bit per piesă) și actualizată incremental la fiecare interacțiune;
+        reconstruită doar când catalogul se schimbă
+        """
+        with self._lock:
+            if user_id not in self.users:
+                return np.zeros(len(catalog), dtype=bool)
+            cached = self._exclusion_bits.get(user_id)
+            if cached is None or cached[0] is not catalog:
+                mask = np.zeros(len(catalog), dtype=bool)
+                rows = catalog.row_of.rows_of(list(self._excluded_set(user_id)))
+                mask[rows[rows >= 0]] = True
+                cached = self._exclusion_bits[user_id] = (catalog, np.packbits(mask))
+            return np.unpackbits(cached[1], count=len(catalog)).view(bool)
+    
+    def get_recombee_filter(self, user_id: str) -> Optional[str]:
+        """
+        Filtrul ReQL care exclude piesele deja văzute, apreciate sau neapreciate (None dacă nu
+        există); păstrat per utilizator și reconstruit doar după o interacțiune nouă
+        
+        Filtrul conține cel mult RECOMBEE_FILTER_MAX_TRACKS piese; pentru utilizatorii cu mai
+        multe excluderi, restul sunt în get_recombee_filter_overflow.
+        """
+        with self._lock:
+            return self._recombee_filter_entry(user_id)[0]
+    
+    def get_recombee_filter_overflow(self, user_id: str) -> Set[str]:
+        """Piesele excluse care nu au încăput în filtrul ReQL (de filtrat local din răspunsul Recombee)"""
+        with self._lock:
+            return self._recombee_filter_entry(user_id)[1]
+    
+    def _recombee_filter_entry(self, user_id: str) -> Tuple[Optional[str], frozenset]:
+        """(filtrul ReQL, piesele excluse rămase în afara lui); apelantul deține lock-ul"""
+        if user_id not in self.users:
+            return None, frozenset()
+        cached = self._recombee_filters.get(user_id)
+        if cached is not None:
+            return cached
+        
+        # Ordinea de prioritate: apreciate/neapreciate, istoricul păstrat (cele mai recente
+        # întâi), apoi piesele din istoricul arhivat
+        user_data = self.users[user_id]
+        ordered = list(user_data.get('liked_tracks', [])) + list(user_data.get('disliked_tracks', []))
+        for field in HISTORY_FIELDS:
+            ordered.extend(entry['track_id'] for entry in reversed(user_data.get(field, []))
+                           if entry.get('track_id'))
+        ordered.extend(reversed(user_data.get('archived_track_ids', [])))
+        ordered.extend(self._excluded_set(user_id))
+        ordered = list(dict.fromkeys(ordered))
+        # Limita ține cererea sub dimensiunea acceptată de API; piesele rămase în afara
+        # filtrului sunt returnate separat, ca apelantul să le elimine din răspuns
+        track_ids = ordered[:RECOMBEE_FILTER_MAX_TRACKS]
+        overflow = frozenset(ordered[RECOMBEE_FILTER_MAX_TRACKS:])
+        
+        # Literalele de șir ReQL folosesc ghilimele duble și aceleași escape-uri ca JSON
+        expression = None
+        if track_ids:
+            expression = "not ('itemId' in {" + ','.join(json.dumps(track_id) for track_id in track_ids) + "})"
+        self._recombee_filters[user_id] = (expression, overflow)
+        return expression, overflow
+    
     def _hash_password(self, password: str) -> str:
         """Hash-uiește parola"""
         return hashlib.sha256(password.encode()).hexdigest()
     
     def register_user(self, user_id: str, email: str = None, name: str = None) -> bool:
         """Înregistrează un utilizator nou"""
+        with self._lock:
+            created = self._register_user_locked(user_id, email, name)
+        if created:
+            self._save_users(user_id)
+        return created
+    
+    def _register_user_locked(self, user_id: str, email: str = None, name: str = None) -> bool:
+        """
+        Creează înregistrarea în memorie, fără salvare (apelantul deține lock-ul și salvează după
+        eliberarea lui: în modul 'fsync' salvarea ia lock-ul de scriere, care se ia înaintea lui _lock)
+        """
         if user_id not in self.users:
             self.users[user_id] = {
                 'user_id': user_id,
@@ -80,11 +790,13 @@ class UserStorage:
                 'stats': {
                     'total_listens': 0,
                     'total_likes': 0,
+                    'total_interactions': 0,
+                    'interaction_types': {},
                     'favorite_genres': {},
                     'favorite_artists': {}
                 }
             }
-            self._save_users()
+            self._add_user_to_aggregates(user_id)
             return True
         return False
     
@@ -172,46 +884,46 @@ class UserStorage:
                                mood: str = None, listening_time: str = None,
                                energy_level: float = None, danceability: float = None):
         """Actualizează preferințele utilizatorului"""
-        if user_id not in self.users:
-            self.register_user(user_id)
-        
-        if preferred_genres:
-            # Adaugă genuri noi, fără duplicate
-            existing_genres = set(self.users[user_id].get('preferred_genres', []))
-            new_genres = [g for g in preferred_genres if g not in existing_genres]
-            self.users[user_id]['preferred_genres'].extend(new_genres)
+        with self._lock:
+            self._register_user_locked(user_id)
             
-            # Actualizează statistici
-            for genre in preferred_genres:
-                self.users[user_id]['stats']['favorite_genres'][genre] = \
-                    self.users[user_id]['stats']['favorite_genres'].get(genre, 0) + 1
-        
-        if preferred_artists:
-            existing_artists = set(self.users[user_id].get('preferred_artists', []))
-            new_artists = [a for a in preferred_artists if a not in existing_artists]
-            self.users[user_id]['preferred_artists'].extend(new_artists)
+            if preferred_genres:
+                # Adaugă genuri noi, fără duplicate
+                existing_genres = set(self.users[user_id].get('preferred_genres', []))
+                new_genres = [g for g in preferred_genres if g not in existing_genres]
+                self.users[user_id]['preferred_genres'].extend(new_genres)
             
-            for artist in preferred_artists:
-                self.users[user_id]['stats']['favorite_artists'][artist] = \
-                    self.users[user_id]['stats']['favorite_artists'].get(artist, 0) + 1
-        
-        if mood:
-            if mood not in self.users[user_id].get('mood_preferences', []):
-                self.users[user_id].setdefault('mood_preferences', []).append({
-                    'mood': mood,
-                    'timestamp': datetime.now().isoformat()
-                })
-        
-        if listening_time:
-            self.users[user_id]['listening_time_preference'] = listening_time
-        
-        if energy_level is not None:
-            self.users[user_id]['energy_level'] = energy_level
-        
-        if danceability is not None:
-            self.users[user_id]['danceability'] = danceability
+                # Actualizează statistici
+                for genre in preferred_genres:
+                    self.users[user_id]['stats']['favorite_genres'][genre] = \
+                        self.users[user_id]['stats']['favorite_genres'].get(genre, 0) + 1
+            
+            if preferred_artists:
+                existing_artists = set(self.users[user_id].get('preferred_artists', []))
+                new_artists = [a for a in preferred_artists if a not in existing_artists]
+                self.users[user_id]['preferred_artists'].extend(new_artists)
+            
+                for artist in preferred_artists:
+                    self.users[user_id]['stats']['favorite_artists'][artist] = \
+                        self.users[user_id]['stats']['favorite_artists'].get(artist, 0) + 1
+            
+            if mood:
+                if mood not in self.users[user_id].get('mood_preferences', []):
+                    self.users[user_id].setdefault('mood_preferences', []).append({
+                        'mood': mood,
+                        'timestamp': datetime.now().isoformat()
+                    })
+            
+            if listening_time:
+                self.users[user_id]['listening_time_preference'] = listening_time
+            
+            if energy_level is not None:
+                self.users[user_id]['energy_level'] = energy_level
+            
+            if danceability is not None:
+                self.users[user_id]['danceability'] = danceability
         
-        self._save_users()
+        self._save_users(user_id)
         
         # Sincronizează cu Recombee dacă este disponibil
         if self.recommendation_system:
@@ -222,17 +934,9 @@ class UserStorage:
             except Exception as e:
                 print(f"Eroare la sincronizarea preferințelor cu Recombee: {e}")
     
-    def add_interaction(self, user_id: str, track_id: str, interaction_type: str,
-                       metadata: Dict = None, recomm_id: str = None):
-        """
-        Adaugă o interacțiune (ascultare, like, skip, etc.)
-        
-        interaction_type: 'listen', 'like', 'skip', 'playlist_add', etc.
-        recomm_id: ID-ul recomandării (dacă interacțiunea provine dintr-o recomandare)
-        """
-        if user_id not in self.users:
-            self.register_user(user_id)
-        
+    def _apply_interaction(self, user_id: str, track_id: str, interaction_type: str,
+                           metadata: Dict = None, recomm_id: str = None):
+        """Aplică o interacțiune în memorie (apelantul deține lock-ul și salvează)"""
         interaction = {
             'track_id': track_id,
             'type': interaction_type,
@@ -242,8 +946,41 @@ class UserStorage:
         }
         
         self.users[user_id]['interactions'].append(interaction)
+        self._recent_interactions.append((user_id, interaction))
+        self._record_interaction_in_aggregates(user_id, interaction_type)
+        self._trim_history(user_id, 'interactions')
+        self._update_cooccurrence(user_id, track_id, interaction_type)
+        self._mark_excluded(user_id, track_id)
+        
+        # Actualizează istoricul
+        if interaction_type == 'listen':
+            self.users[user_id]['listening_history'].append({
+                'track_id': track_id,
+                'timestamp': datetime.now().isoformat()
+            })
+            self._trim_history(user_id, 'listening_history')
+            self.users[user_id]['stats']['total_listens'] += 1
         
-        # Trimite interacțiunea către Recombee
+        if interaction_type == 'like':
+            self._append_unique_track(self._liked_index, user_id, 'liked_tracks', track_id)
+            self.users[user_id]['stats']['total_likes'] += 1
+    
+    def add_interaction(self, user_id: str, track_id: str, interaction_type: str,
+                       metadata: Dict = None, recomm_id: str = None):
+        """
+        Adaugă o interacțiune (ascultare, like, skip, etc.)
+        
+        interaction_type: 'listen', 'like', 'skip', 'playlist_add', etc.
+        recomm_id: ID-ul recomandării (dacă interacțiunea provine dintr-o recomandare)
+        """
+        with self._lock:
+            self._register_user_locked(user_id)
+            
+            self._apply_interaction(user_id, track_id, interaction_type, metadata, recomm_id)
+        
+        self._save_users(user_id)
+        
+        # Trimite interacțiunea către Recombee (în afara lock-ului, ca salvarea să nu aștepte rețeaua)
         if self.recommendation_system:
             try:
                 if interaction_type == 'like':
@@ -257,21 +994,45 @@ class UserStorage:
                     self.recommendation_system.send_track_bookmark(user_id, track_id, recomm_id)
             except Exception as e:
                 print(f"Eroare la trimiterea interacțiunii către Recombee: {e}")
+    
+    def add_interactions_batch(self, user_id: str, interactions: List[Dict],
+                               send_to_recombee: bool = True) -> int:
+        """
+        Adaugă un lot de interacțiuni într-o singură tranzacție: un singur lock, o singură
+        salvare și o singură cerere Batch către Recombee
         
-        # Actualizează istoricul
-        if interaction_type == 'listen':
-            self.users[user_id]['listening_history'].append({
-                'track_id': track_id,
-                'timestamp': datetime.now().isoformat()
-            })
-            self.users[user_id]['stats']['total_listens'] += 1
+        interactions: listă de dicționare cu track_id, interaction_type și opțional
+                      metadata, recomm_id (validate de apelant)
+        send_to_recombee: False când apelantul trimite singur lotul (ex. varianta asincronă)
+        Returnează numărul de interacțiuni aplicate
+        """
+        if not interactions:
+            return 0
         
-        if interaction_type == 'like':
-            if track_id not in self.users[user_id]['liked_tracks']:
-                self.users[user_id]['liked_tracks'].append(track_id)
-            self.users[user_id]['stats']['total_likes'] += 1
+        with self._lock:
+            self._register_user_locked(user_id)
+            
+            for item in interactions:
+                track_id = item['track_id']
+                interaction_type = item['interaction_type']
+                self._apply_interaction(user_id, track_id, interaction_type,
+                                        item.get('metadata'), item.get('recomm_id'))
+                if interaction_type == 'dislike':
+                    self._append_unique_track(self._disliked_index, user_id, 'disliked_tracks', track_id)
+        
+        self._save_users(user_id)
         
-        self._save_users()
+        if self.recommendation_system and send_to_recombee:
+            try:
+                self.recommendation_system.send_interactions_batch(user_id, interactions)
+            except Exception as e:
+                print(f"Eroare la trimiterea lotului de interacțiuni către Recombee: {e}")
+        
+        return len(interactions)
+    
+    def get_user_version(self, user_id: str) -> str:
+        """Versiunea curentă a înregistrării utilizatorului (se schimbă la fiecare modificare)"""
+        return f'{self._instance_token}-{self._user_versions.get(user_id, 0)}'
     
     def get_user_profile(self, user_id: str) -> Optional[Dict]:
         """Obține profilul complet al utilizatorului"""
@@ -281,11 +1042,37 @@ class UserStorage:
         """Obține lista de piese apreciate de utilizator"""
         return self.users.get(user_id, {}).get('liked_tracks', [])
     
+    def get_user_liked_track_set(self, user_id: str) -> Set[str]:
+        """Obține setul de piese apreciate (doar pentru citire, verificare în O(1))"""
+        if user_id not in self.users:
+            return set()
+        return self._track_set(self._liked_index, user_id, 'liked_tracks')
+    
+    def is_track_liked(self, user_id: str, track_id: str) -> bool:
+        """Verifică dacă utilizatorul a apreciat piesa"""
+        return track_id in self.get_user_liked_track_set(user_id)
+    
     def get_user_listening_history(self, user_id: str, limit: int = 50) -> List[Dict]:
         """Obține istoricul de ascultare"""
         history = self.users.get(user_id, {}).get('listening_history', [])
         return history[-limit:]  # Ultimele N piese
-    
+
+    def get_recent_listens(self, user_id: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """
+        Ultimele `limit` ascultări ca perechi (track_id, timestamp Unix), de la cea mai veche
+        la cea mai recentă; intrările fără timestamp valid sunt ignorate
+        """
+        with self._lock:
+            history = self.users.get(user_id, {}).get('listening_history', [])[-limit:] if limit > 0 else []
+
+        listens = []
+        for entry in history:
+            try:
+                listens.append((entry['track_id'], datetime.fromisoformat(entry['timestamp']).timestamp()))
+            except (KeyError, TypeError, ValueError):
+                continue
+        return listens
+
     def get_user_stats(self, user_id: str) -> Dict:
         """Obține statisticile utilizatorului"""
         user_data = self.users.get(user_id, {})
@@ -299,26 +1086,32 @@ class UserStorage:
     
     def add_liked_track(self, user_id: str, track_id: str):
         """Adaugă o piesă la lista de favorite"""
-        if user_id not in self.users:
-            self.register_user(user_id)
-        
-        if track_id not in self.users[user_id]['liked_tracks']:
-            self.users[user_id]['liked_tracks'].append(track_id)
-            self._save_users()
+        with self._lock:
+            self._register_user_locked(user_id)
+            
+            added = self._append_unique_track(self._liked_index, user_id, 'liked_tracks', track_id)
+        if added:
+            self._save_users(user_id)
     
     def add_disliked_track(self, user_id: str, track_id: str):
         """Adaugă o piesă la lista de piese neapreciate"""
-        if user_id not in self.users:
-            self.register_user(user_id)
-        
-        if 'disliked_tracks' not in self.users[user_id]:
-            self.users[user_id]['disliked_tracks'] = []
-        
-        if track_id not in self.users[user_id]['disliked_tracks']:
-            self.users[user_id]['disliked_tracks'].append(track_id)
-            self._save_users()
+        with self._lock:
+            self._register_user_locked(user_id)
+            
+            added = self._append_unique_track(self._disliked_index, user_id, 'disliked_tracks', track_id)
+        if added:
+            self._save_users(user_id)
     
     def get_user_disliked_tracks(self, user_id: str) -> List[str]:
         """Returnează lista de piese neapreciate de utilizator"""
         return self.users.get(user_id, {}).get('disliked_tracks', [])
-
+    
+    def get_user_disliked_track_set(self, user_id: str) -> Set[str]:
+        """Obține setul de piese neapreciate (doar pentru citire, verificare în O(1))"""
+        if user_id not in self.users:
+            return set()
+        return self._track_set(self._disliked_index, user_id, 'disliked_tracks')
+    
+    def is_track_disliked(self, user_id: str, track_id: str) -> bool:
+        """Verifică dacă utilizatorul a marcat piesa ca neapreciată"""
+        return track_id in self.get_user_disliked_track_set(user_id)
\ No newline at end of file